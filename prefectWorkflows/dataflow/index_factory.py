@@ -0,0 +1,157 @@
+# FAISS index types for chunk_data and the search knobs the backend applies on load.
+# A copy lives in services/backend/src/dataflow/index_factory.py, keep both in sync.
+
+import json
+import math
+import os
+import re
+from urllib.parse import urlparse
+import faiss
+import numpy as np
+
+INDEX_PARAMS_FILE = "index_params.json"
+PARTITIONS_FILE = "partitions.json"
+# below this many vectors a partition is searched exactly, an IVF/HNSW/PQ build would not pay off
+MIN_PARTITION_FOR_INDEX_TYPE = 4096
+INDEX_TYPES = ("Flat", "IVF", "HNSW")
+# How vectors are stored inside the index: 4, 2, 1 and 1/8 bytes per dimension (PQ with 8-dim sub-vectors by default)
+VECTOR_STORAGES = ("float32", "fp16", "sq8", "pq")
+
+
+def default_nlist(n_vectors):
+    """~4*sqrt(n) inverted lists, but no more than the training set can fill (faiss wants 39 points per centroid)."""
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def vector_codec(storage, dimension, pq_m=None):
+    """faiss.index_factory component for one of VECTOR_STORAGES."""
+    if storage == "float32":
+        return "Flat"
+    if storage == "fp16":
+        return "SQfp16"
+    if storage == "sq8":
+        return "SQ8"
+    if storage == "pq":
+        pq_m = pq_m or max(1, dimension // 8)
+        if dimension % pq_m:
+            raise ValueError(f"PQ needs the dimension ({dimension}) to be a multiple of pq_m ({pq_m})")
+        return f"PQ{pq_m}x8"
+    raise ValueError(f"Unknown vector storage {storage}, expected one of {VECTOR_STORAGES}")
+
+
+def index_spec(index_type, n_vectors, nlist=None, hnsw_m=32, storage="float32", dimension=None, pq_m=None,
+               rerank=False):
+    """faiss.index_factory string for one of INDEX_TYPES over one of VECTOR_STORAGES.
+
+    rerank keeps the float32 vectors next to the compressed ones (IndexRefineFlat) and
+    re-scores the top k * k_factor_rf candidates exactly.
+    """
+    codec = vector_codec(storage, dimension, pq_m=pq_m)
+    if index_type == "Flat":
+        spec = codec
+    elif index_type == "IVF":
+        spec = f"IVF{nlist or default_nlist(n_vectors)},{codec}"
+    elif index_type == "HNSW":
+        spec = f"HNSW{hnsw_m}" if storage == "float32" else f"HNSW{hnsw_m},{codec}"
+    else:
+        raise ValueError(f"Unknown index type {index_type}, expected one of {INDEX_TYPES}")
+    if rerank and storage != "float32":
+        spec += ",RFlat"
+    return spec
+
+
+def apply_search_params(index, search_params):
+    """Set search-time knobs such as nprobe or efSearch; ParameterSpace finds them inside wrapped indexes."""
+    space = faiss.ParameterSpace()
+    for name, value in (search_params or {}).items():
+        space.set_index_parameter(index, name, value)
+
+
+def build_index(vectors, index_type="Flat", nlist=None, nprobe=16, hnsw_m=32, ef_construction=40, ef_search=64,
+                storage="float32", pq_m=None, rerank=False, k_factor=4):
+    """Train and fill an index over vectors (n x d float32). Returns (index, params to save next to it)."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    spec = index_spec(index_type, len(vectors), nlist=nlist, hnsw_m=hnsw_m, storage=storage,
+                      dimension=vectors.shape[1], pq_m=pq_m, rerank=rerank)
+    index = faiss.index_factory(vectors.shape[1], spec)
+    refine = isinstance(index, faiss.IndexRefine)
+    base = faiss.downcast_index(index.base_index) if refine else index
+    search_params = {}
+    if index_type == "IVF":
+        search_params["nprobe"] = nprobe
+    elif index_type == "HNSW":
+        base.hnsw.efConstruction = ef_construction
+        search_params["efSearch"] = ef_search
+    if refine:
+        search_params["k_factor_rf"] = k_factor
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    apply_search_params(index, search_params)
+    params = {"index_type": index_type, "factory": spec, "dimension": int(vectors.shape[1]),
+              "ntotal": int(index.ntotal), "storage": storage, "rerank": refine, "search": search_params}
+    return index, params
+
+
+def rebuild_vector_store_index(vector_store, index_type="Flat", **kwargs):
+    """Swap the flat index FAISS.from_documents built for one of INDEX_TYPES.
+
+    Vectors keep their positions, so index_to_docstore_id stays valid.
+    """
+    vectors = vector_store.index.reconstruct_n(0, vector_store.index.ntotal)
+    vector_store.index, params = build_index(vectors, index_type=index_type, **kwargs)
+    return params
+
+
+def site_of(url):
+    """Partition key of a chunk: the host of its source page."""
+    return urlparse(url or "").netloc.lower() or "unknown"
+
+
+def build_partitions(vector_store, folder, **index_kwargs):
+    """Write one sub-index per source site next to the full index, plus PARTITIONS_FILE describing them.
+
+    Each partition stores its vectors' positions in the full index
+    (partition-<site>.ids.npy), so hits map back to index_to_docstore_id.
+    The routing centroid is the normalized mean of the partition's vectors.
+    Call it while vector_store still has the flat index from_documents built
+    (IVF cannot reconstruct vectors without a direct map). Returns the
+    partitions metadata.
+    """
+    os.makedirs(folder, exist_ok=True)
+    positions_by_site = {}
+    for position, doc_id in vector_store.index_to_docstore_id.items():
+        doc = vector_store.docstore.search(doc_id)
+        positions_by_site.setdefault(site_of(doc.metadata.get("url")), []).append(position)
+    vectors = vector_store.index.reconstruct_n(0, vector_store.index.ntotal)
+    partitions = []
+    for site, positions in sorted(positions_by_site.items()):
+        positions = np.array(sorted(positions), dtype=np.int64)
+        slug = re.sub(r"[^a-z0-9]+", "-", site).strip("-")
+        kwargs = index_kwargs if len(positions) >= MIN_PARTITION_FOR_INDEX_TYPE else {}
+        index, params = build_index(vectors[positions], **kwargs)
+        faiss.write_index(index, os.path.join(folder, f"partition-{slug}.faiss"))
+        np.save(os.path.join(folder, f"partition-{slug}.ids.npy"), positions)
+        centroid = vectors[positions].mean(axis=0)
+        centroid /= np.linalg.norm(centroid) or 1
+        partitions.append({"site": site, "file": f"partition-{slug}.faiss", "ids": f"partition-{slug}.ids.npy",
+                           "ntotal": len(positions), "factory": params["factory"], "search": params["search"],
+                           "centroid": centroid.round(6).tolist()})
+    meta = {"metric": int(vector_store.index.metric_type), "partitions": partitions}
+    with open(os.path.join(folder, PARTITIONS_FILE), "w") as f:
+        json.dump(meta, f)
+    return meta
+
+
+def save_index_params(folder, params):
+    with open(os.path.join(folder, INDEX_PARAMS_FILE), "w") as f:
+        json.dump(params, f, indent=2, sort_keys=True)
+
+
+def read_index_params(folder):
+    """Params saved by chunk_data, {} for indexes built before they were recorded (plain Flat)."""
+    try:
+        with open(os.path.join(folder, INDEX_PARAMS_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
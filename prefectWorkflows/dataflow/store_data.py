@@ -1,10 +1,15 @@
 from google.cloud.storage import Client, transfer_manager
+import base64
+import hashlib
+import json
 import os
 from dotenv import load_dotenv
 load_dotenv(override=True)
 BUCKET_NAME= os.getenv('BUCKET_NAME')
 RAW_DATA_FOLDER= os.getenv('RAW_DATA_FOLDER')
 FAISS_INDEX_FOLDER= os.getenv('FAISS_INDEX_FOLDER')
+# same name as in the backend's index_store
+BUILD_MANIFEST_FILE = "build_manifest.json"
 from google.auth import default
 from google.oauth2 import service_account
 
@@ -78,14 +83,42 @@ def upload_many_blobs_with_transfer_manager(
 
 
 
-def upload_faiss_index_to_bucket():
+def file_md5(path):
+    """base64 MD5 of a file, the format GCS uses for Blob.md5_hash."""
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return base64.b64encode(digest.digest()).decode()
+
+
+def upload_faiss_index_to_bucket(counts=None):
+    """Upload every file in faiss_index, then a manifest of them, then delete the blobs of older builds.
+
+    The backend only loads a build once BUILD_MANIFEST_FILE lists every file
+    with the MD5 it finds in the bucket, so it never mixes files of this
+    upload with files of the previous one. counts (e.g. {"vectors": n}) go
+    into the manifest and are checked against the loaded index.
+    """
     storage_client = Client()
     bucket = storage_client.bucket(BUCKET_NAME)
     source_directory=os.path.join("faiss_index")
 
-    filenames = [f for f in os.listdir(source_directory) ]
+    filenames = [f for f in os.listdir(source_directory) if f != BUILD_MANIFEST_FILE]
+    files = {}
     for filename in filenames:
         file_path = os.path.join(source_directory, filename)
         blob = bucket.blob(f"{FAISS_INDEX_FOLDER}/{filename}")  # Create a blob (object) in the bucket
         blob.upload_from_filename(file_path)  # Upload the file
+        files[filename] = {"md5_hash": file_md5(file_path), "size": os.path.getsize(file_path)}
+    # last, so it only appears once every file it lists is in the bucket
+    manifest_path = os.path.join(source_directory, BUILD_MANIFEST_FILE)
+    with open(manifest_path, "w") as f:
+        json.dump({"files": files, "counts": counts or {}}, f, indent=2, sort_keys=True)
+    bucket.blob(f"{FAISS_INDEX_FOLDER}/{BUILD_MANIFEST_FILE}").upload_from_filename(manifest_path)
+    # blobs of older builds this one did not write, e.g. the partitions of a site that is gone
+    for blob in bucket.list_blobs(prefix=f"{FAISS_INDEX_FOLDER}/"):
+        filename = os.path.basename(blob.name)
+        if filename not in files and filename != BUILD_MANIFEST_FILE:
+            blob.delete()
 
@@ -0,0 +1,274 @@
+# Async serving mode: the routes of main.py on FastAPI, for an ASGI server.
+#   METRICS_DIR=/tmp/nubot-metrics uvicorn asgi:app --host 0.0.0.0 --port 8080 --workers 4
+# (METRICS_DIR lets any worker's /metrics add up all workers, as gunicorn.conf.py sets it up.)
+# A request waiting on the LLM holds no thread: the query and stream routes await the
+# LLM client on the event loop and run the blocking steps (encoder, FAISS, BM25, caches)
+# on the RETRIEVAL_THREADS pool, so one process serves hundreds of concurrent requests.
+# Request and response bodies, status codes and headers match main.py, except that a
+# body without a query string is a 400 like an empty query. Swagger UI is at / and the
+# OpenAPI document at /swagger.json, where flask_restx serves them.
+
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from src.dataflow.rag_model import (agenerateResponse, astreamResponse, batchResponse, cacheStats, init,
+                                    start_background_init, readiness, index_status, reload_index, start_index_watcher,
+                                    retrieval_executor, profiler, BATCH_MAX_QUERIES)
+from src.utils.aio import run_blocking
+from src.utils.deadline import set_deadline, reset_deadline, requested_timeout
+from src.utils.logger import logging
+from src.utils import metrics
+
+load_dotenv(override=True)
+# same settings as main.py
+INIT_ON_START = os.getenv('INIT_ON_START', 'background')
+WARM_UP = os.getenv('WARM_UP', 'true').lower() == 'true'
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+REQUEST_TIMEOUT = float(os.getenv('REQUEST_TIMEOUT', 60))
+
+
+class QueryModel(BaseModel):
+    query: str = Field(description="User's input query")
+    session_id: Optional[str] = Field(None, description="Chat session; follow-up questions may reuse its retrieval")
+
+
+class BatchModel(BaseModel):
+    queries: List[str] = Field(description=f"Up to {BATCH_MAX_QUERIES} queries")
+
+
+def json_body(model):
+    """OpenAPI request body for a route that reads and validates its JSON itself, to keep main.py's error bodies."""
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": model.model_json_schema()}}}}
+
+
+UNAUTHORIZED = {401: {"description": "Missing or wrong X-Admin-Token"}}
+
+
+class RequestContext:
+    """Per-request deadline and /metrics accounting, as main.py's before/after/teardown hooks.
+
+    Plain ASGI middleware: it wraps the whole response, so a stream is timed
+    until its last event and the deadline covers the LLM stream as well.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = set_deadline(requested_timeout(Headers(scope=scope).get("X-Request-Timeout"), REQUEST_TIMEOUT))
+        timed = scope["path"] != "/metrics"
+        if timed:
+            metrics.start_request(scope)
+        status, failed = 500, True
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+            failed = status >= 500
+        finally:
+            reset_deadline(token)
+            if timed:
+                metrics.finish_request(scope, request_endpoint(scope), failed=failed)
+
+
+def request_endpoint(scope):
+    """Route pattern of the request, a bounded label unlike the path."""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # only API routes are recorded in the scope; the Swagger routes have fixed paths
+    return scope["path"] if "endpoint" in scope else "unmatched"
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if INIT_ON_START == "eager":
+        await run_blocking(retrieval_executor(), init)
+    elif INIT_ON_START == "background":
+        start_background_init(warm=WARM_UP)
+    start_index_watcher()
+    yield
+
+
+app = FastAPI(title="NuBot Backend", version="1.0", description="Backend for NuBot", lifespan=lifespan,
+              docs_url="/", openapi_url="/swagger.json", redoc_url=None,
+              openapi_tags=[{"name": "NuBot", "description": "namespace for Backend"}])
+app.add_middleware(CORSMiddleware, allow_origins=["*"])
+app.add_middleware(RequestContext)
+
+
+async def json_field(request, name):
+    try:
+        body = await request.json()
+    except ValueError:
+        return None
+    return body.get(name) if isinstance(body, dict) else None
+
+
+async def session_field(request):
+    session_id = await json_field(request, "session_id")
+    return session_id if isinstance(session_id, str) and session_id else None
+
+
+def mark_request_failed(request):
+    """Count the request as an error on /metrics (for handlers that answer errors with a 200)."""
+    request.scope["nubot.failed"] = True
+
+
+def admin_authorized(request):
+    return not ADMIN_TOKEN or request.headers.get("X-Admin-Token") == ADMIN_TOKEN
+
+
+def profile_requested(request):
+    """X-Profile header set (by an admin, when ADMIN_TOKEN is configured)."""
+    return request.headers.get("X-Profile", "").lower() in ("1", "true") and admin_authorized(request)
+
+
+def format_sse(event, data):
+    """Encode one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/NuBot/", tags=["NuBot"], summary="Return a simple message", openapi_extra=json_body(QueryModel),
+          responses={400: {"description": "Query field is required"}})
+async def answer_query(request: Request):
+    # the stage breakdown of a profile is exact; its cProfile part also sees the other requests the loop serves meanwhile
+    with profiler.profile("asgi.query", enabled=profiler.wanted(profile_requested(request))) as request_profile:
+        headers = {"X-Profile-Id": request_profile.id} if request_profile is not None else {}
+        query = await json_field(request, "query")
+        if not isinstance(query, str) or not query:
+            return JSONResponse({"error": "Query field is required"}, 400, headers=headers)
+        if request_profile is not None:
+            request_profile.info["query"] = query
+        try:
+            answer = await agenerateResponse(query, session_id=await session_field(request))
+        except Exception as e:
+            logging.error("Custom exception occurred: %s", str(e))
+            mark_request_failed(request)
+            return JSONResponse({"error": "An internal server error occurred", "details": str(e)}, headers=headers)
+        return JSONResponse(answer, headers=headers)
+
+
+@app.post("/NuBot/batch", tags=["NuBot"], summary="Answer many queries with one batched encode and FAISS search",
+          openapi_extra=json_body(BatchModel),
+          responses={200: {"description": "One {query, answer} or {query, error} per query, in request order"},
+                     400: {"description": "queries must be a non-empty list of strings"}})
+async def answer_batch(request: Request):
+    queries = await json_field(request, "queries")
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q for q in queries):
+        return JSONResponse({"error": "queries must be a non-empty list of strings"}, 400)
+    if len(queries) > BATCH_MAX_QUERIES:
+        return JSONResponse({"error": f"At most {BATCH_MAX_QUERIES} queries per batch"}, 400)
+    logging.info("Batch api called with %d queries", len(queries))
+    try:
+        # one batched encode and search, then a few LLM calls at a time: a thread is fine for a whole batch
+        return {"results": await run_in_threadpool(batchResponse, queries)}
+    except Exception as e:
+        logging.error("Custom exception occurred: %s", str(e))
+        return JSONResponse({"error": "An internal server error occurred", "details": str(e)}, 500)
+
+
+@app.get("/NuBot/stats", tags=["NuBot"], summary="Cache sizes and hit ratios")
+def stats():
+    return cacheStats()
+
+
+@app.post("/NuBot/stream", tags=["NuBot"], summary="Stream the answer as Server-Sent Events",
+          openapi_extra=json_body(QueryModel),
+          responses={200: {"description": "text/event-stream: one metadata event, token events, then done"},
+                     400: {"description": "Query field is required"}})
+async def stream_answer(request: Request):
+    query = await json_field(request, "query")
+    if not isinstance(query, str) or not query:
+        return JSONResponse({"error": "Query field is required"}, 400)
+    session_id = await session_field(request)
+    logging.info("Stream api called")
+
+    async def events():
+        try:
+            async for event, data in astreamResponse(query, session_id=session_id):
+                yield format_sse(event, data)
+            yield format_sse("done", {})
+        except Exception as e:
+            logging.error("Custom exception occurred: %s", str(e))
+            mark_request_failed(request)
+            yield format_sse("error", {"error": "An internal server error occurred", "details": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/NuBot/admin/index", tags=["NuBot"], summary="Loaded index version", responses=UNAUTHORIZED)
+def admin_index(request: Request):
+    if not admin_authorized(request):
+        return JSONResponse({"error": "unauthorized"}, 401)
+    return index_status()
+
+
+@app.post("/NuBot/admin/index", tags=["NuBot"], summary="Force a reload of the index from the bucket",
+          responses={**UNAUTHORIZED, 500: {"description": "Reload failed, the previous index keeps serving"}})
+def admin_reload_index(request: Request):
+    if not admin_authorized(request):
+        return JSONResponse({"error": "unauthorized"}, 401)
+    try:
+        return reload_index(force=True)
+    except Exception as e:
+        logging.error("Custom exception occurred: %s", str(e))
+        return JSONResponse({"error": "Index reload failed", "details": str(e)}, 500)
+
+
+@app.get("/NuBot/admin/profiles", tags=["NuBot"], summary="Saved request profiles", responses=UNAUTHORIZED)
+def admin_profiles(request: Request):
+    if not admin_authorized(request):
+        return JSONResponse({"error": "unauthorized"}, 401)
+    return {"profiles": profiler.list(), **profiler.stats()}
+
+
+@app.get("/NuBot/admin/profiles/{profile_id}", tags=["NuBot"], summary="Stage breakdown of one profiled request",
+         responses={**UNAUTHORIZED, 404: {"description": "No such profile"}})
+def admin_profile(profile_id: str, request: Request):
+    if not admin_authorized(request):
+        return JSONResponse({"error": "unauthorized"}, 401)
+    path = profiler.path(profile_id, ".json")
+    if path is None:
+        return JSONResponse({"error": "profile not found"}, 404)
+    with open(path) as f:
+        return json.load(f)
+
+
+@app.get("/NuBot/admin/profiles/{profile_id}/download", tags=["NuBot"],
+         summary="Download the cProfile output of one profiled request",
+         responses={**UNAUTHORIZED, 404: {"description": "No such profile"}})
+def admin_profile_download(profile_id: str, request: Request):
+    if not admin_authorized(request):
+        return JSONResponse({"error": "unauthorized"}, 401)
+    path = profiler.path(profile_id, ".prof")
+    if path is None:
+        return JSONResponse({"error": "profile not found"}, 404)
+    return FileResponse(os.path.abspath(path), media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
+
+@app.get("/ready", summary="Readiness probe", responses={503: {"description": "Pipeline still loading or failed"}})
+def ready():
+    state = readiness()
+    return JSONResponse(state, 200 if state["status"] == "ready" else 503)
+
+
+@app.get("/metrics", summary="Prometheus metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,84 @@
+"""N queries through /NuBot/ one call at a time vs one /NuBot/batch call.
+
+Run from services/backend:
+    python -m benchmarks.bench_batch --queries 100 --llm-latency-ms 200
+
+Uses the synthetic encoder from bench_embedding_batcher, a random flat index
+and a chat model that sleeps --llm-latency-ms per call, so the numbers show
+the shape of the savings rather than production latencies.
+"""
+import argparse
+import os
+import time
+from unittest.mock import patch
+import numpy as np
+from langchain_core.language_models.chat_models import SimpleChatModel
+from benchmarks.bench_embedding_batcher import SyntheticEncoder
+
+DIM = 384
+
+
+class SleepyChatModel(SimpleChatModel):
+    latency: float = 0.2
+
+    @property
+    def _llm_type(self):
+        return "sleepy"
+
+    def _call(self, messages, *args, **kwargs):
+        time.sleep(self.latency)
+        return "Thanks for asking!"
+
+
+class RandomEncoder(SyntheticEncoder):
+    def embed_documents(self, texts):
+        super().embed_documents(texts)
+        return [np.random.default_rng(abs(hash(text))).standard_normal(self.size).tolist() for text in texts]
+
+
+def build_retriever(vectors):
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+    from src.dataflow.retrieval import Retriever
+    index = faiss.IndexFlatL2(DIM)
+    index.add(np.random.default_rng(0).standard_normal((vectors, DIM), dtype=np.float32))
+    docstore = InMemoryDocstore({str(i): Document(page_content=f"chunk {i}") for i in range(vectors)})
+    encoder = RandomEncoder(size=DIM)
+    vector_store = FAISS(encoder, index, docstore, {i: str(i) for i in range(vectors)})
+    return Retriever(vector_store, encoder, k=10, index_version="bench")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    with patch.dict(os.environ, {"INIT_ON_START": "lazy", "INDEX_POLL_SECONDS": "0"}):
+        import main
+    from src.dataflow import rag_model
+    rag_model.BATCH_LLM_CONCURRENCY = args.concurrency
+    rag_model.init(retriever=build_retriever(args.vectors), tracking_enabled=False,
+                   llm=SleepyChatModel(latency=args.llm_latency_ms / 1000))
+    rag_model.answer_cache = None
+    client = main.app.test_client()
+    queries = [f"what are the co-op rules for program {i}?" for i in range(args.queries)]
+
+    start = time.perf_counter()
+    for query in queries:
+        client.post("/NuBot/", json={"query": query})
+    serial = time.perf_counter() - start
+
+    rag_model.get_pipeline().retriever.cache.clear()
+    start = time.perf_counter()
+    results = client.post("/NuBot/batch", json={"queries": queries}).json["results"]
+    batch = time.perf_counter() - start
+    assert all("answer" in result for result in results)
+
+    print(f"{args.queries} queries, {args.vectors} vectors, LLM {args.llm_latency_ms:.0f} ms, concurrency {args.concurrency}")
+    print(f"one call per query  {serial * 1000:9.0f} ms")
+    print(f"/NuBot/batch        {batch * 1000:9.0f} ms  ({serial / batch:.1f}x)")
@@ -0,0 +1,108 @@
+"""Prompt tokens with and without context packing on a sample set.
+
+Run from services/backend:
+    python -m benchmarks.bench_context --queries 200
+
+Pages are the docstrings of standard-library modules, split exactly like
+chunk_data (1000 chars, overlap 200) and retrieved top-10 with a hashed
+bag-of-words encoder, so no model download is needed. Queries are sentences
+taken from those pages. Three setups:
+
+  joined      today's index (every chunk stored twice) joined as-is
+  packed      the same hits merged, deduplicated and capped at --budget
+  rebuilt     an index from the fixed chunk_data (no duplicates, start_index) packed
+
+LLM latency is a cost model, --base-ms plus --prefill-ms per prompt token;
+packing time is measured.
+"""
+import argparse
+import importlib
+import inspect
+import random
+import re
+import statistics
+import time
+import zlib
+import numpy as np
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from src.dataflow.context import estimate_tokens, pack_context
+
+DIM = 4096
+WORD = re.compile(r"\w+")
+MODULES = ["argparse", "asyncio", "collections", "concurrent.futures", "csv", "dataclasses", "datetime", "decimal",
+           "email.message", "enum", "fractions", "functools", "heapq", "http.client", "inspect", "itertools", "json",
+           "logging", "os", "pathlib", "pickle", "queue", "random", "re", "shutil", "socket", "sqlite3", "statistics",
+           "string", "subprocess", "tarfile", "tempfile", "textwrap", "threading", "typing", "unittest",
+           "urllib.request", "uuid", "xml.etree.ElementTree", "zipfile"]
+
+
+def encode(text):
+    vector = np.zeros(DIM, dtype=np.float32)
+    for word in WORD.findall(text.lower()):
+        vector[zlib.crc32(word.encode()) % DIM] += 1
+    return vector / (np.linalg.norm(vector) or 1)
+
+
+def load_pages():
+    pages = []
+    for name in MODULES:
+        module = importlib.import_module(name)
+        parts = [inspect.getdoc(module) or ""]
+        parts += [inspect.getdoc(obj) or "" for _, obj in inspect.getmembers(module, callable)]
+        text = "\n\n".join(part for part in parts if part)
+        pages.append(Document(page_content=text[:30000], metadata={"url": f"https://docs.python.org/3/library/{name}.html"}))
+    return pages
+
+
+def build(pages, start_index):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, add_start_index=start_index)
+    chunks = splitter.split_documents(pages)
+    for chunk in chunks:
+        chunk.metadata["token_count"] = estimate_tokens(chunk.page_content)
+    return chunks, np.vstack([encode(chunk.page_content) for chunk in chunks])
+
+
+def top_k(chunks, matrix, query, k=10):
+    scores = matrix @ encode(query)
+    return [chunks[i] for i in np.argsort(-scores)[:k]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=1500)
+    parser.add_argument("--base-ms", type=float, default=300)
+    parser.add_argument("--prefill-ms", type=float, default=0.25)
+    args = parser.parse_args()
+
+    pages = load_pages()
+    old_chunks, old_matrix = build(pages, start_index=False)
+    # chunk_data used to call add_documents after from_documents, storing every chunk twice
+    old_chunks, old_matrix = old_chunks * 2, np.vstack([old_matrix, old_matrix])
+    new_chunks, new_matrix = build(pages, start_index=True)
+
+    rng = random.Random(0)
+    sentences = [s.strip() for page in pages for s in re.split(r"(?<=\.)\s", page.page_content) if len(s.split()) >= 8]
+    queries = rng.sample(sentences, min(args.queries, len(sentences)))
+
+    results = {"joined": [], "packed": [], "rebuilt": []}
+    pack_ms = []
+    for query in queries:
+        hits = top_k(old_chunks, old_matrix, query)
+        results["joined"].append(estimate_tokens("\n\n".join(doc.page_content for doc in hits)))
+        start = time.perf_counter()
+        packed, _ = pack_context(hits, token_budget=args.budget)
+        pack_ms.append((time.perf_counter() - start) * 1000)
+        results["packed"].append(estimate_tokens("\n\n".join(doc.page_content for doc in packed)))
+        packed, _ = pack_context(top_k(new_chunks, new_matrix, query), token_budget=args.budget)
+        results["rebuilt"].append(estimate_tokens("\n\n".join(doc.page_content for doc in packed)))
+
+    print(f"{len(pages)} pages, {len(new_chunks)} chunks, {len(queries)} queries, budget {args.budget}")
+    print(f"packing: median {statistics.median(pack_ms):.2f} ms per query")
+    baseline = statistics.mean(results["joined"])
+    print(f"{'setup':<8} {'mean tokens':>12} {'p95 tokens':>11} {'reduction':>10} {'LLM ms (model)':>15}")
+    for name, tokens in results.items():
+        mean = statistics.mean(tokens)
+        p95 = sorted(tokens)[int(len(tokens) * 0.95) - 1]
+        print(f"{name:<8} {mean:>12.0f} {p95:>11} {1 - mean / baseline:>10.0%} {args.base_ms + args.prefill_ms * mean:>15.0f}")
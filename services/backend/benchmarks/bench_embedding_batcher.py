@@ -0,0 +1,74 @@
+"""Query-embedding throughput with and without micro-batching at 1/8/32 concurrent clients.
+
+Run from services/backend:
+    python -m benchmarks.bench_embedding_batcher          # MiniLM via HuggingFaceEmbeddings
+    python -m benchmarks.bench_embedding_batcher --synthetic
+
+--synthetic replaces the encoder with a cost model for machines without torch:
+a fixed per-call overhead plus a per-text cost, with one call running at a time
+(a CPU forward pass already uses every core through torch's intra-op threads).
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.embeddings import Embeddings
+from src.dataflow.embedding_batcher import BatchingEmbeddings
+
+
+class SyntheticEncoder(Embeddings):
+    def __init__(self, call_overhead_ms=6.0, per_text_ms=0.4, size=384):
+        self.call_overhead = call_overhead_ms / 1000
+        self.per_text = per_text_ms / 1000
+        self.size = size
+        self.cpu = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self.cpu:
+            time.sleep(self.call_overhead + self.per_text * len(texts))
+        return [[0.0] * self.size for _ in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def load_encoder(synthetic):
+    if synthetic:
+        return SyntheticEncoder()
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+
+
+def run(encoder, clients, queries_per_client=50):
+    latencies = []
+
+    def client(c):
+        for i in range(queries_per_client):
+            start = time.perf_counter()
+            encoder.embed_query(f"client {c} asks about co-op deadlines number {i}")
+            latencies.append(time.perf_counter() - start)
+
+    wall = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, range(clients)))
+    wall = time.perf_counter() - wall
+    return clients * queries_per_client / wall, statistics.median(latencies) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--synthetic", action="store_true")
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2)
+    args = parser.parse_args()
+
+    encoder = load_encoder(args.synthetic)
+    encoder.embed_query("warm up")
+    batcher = BatchingEmbeddings(encoder, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+    print(f"{'clients':>7} {'unbatched q/s':>14} {'p50 ms':>8} {'batched q/s':>12} {'p50 ms':>8} {'gain':>6}")
+    for clients in (1, 8, 32):
+        plain_qps, plain_p50 = run(encoder, clients)
+        batched_qps, batched_p50 = run(batcher, clients)
+        print(f"{clients:>7} {plain_qps:>14.0f} {plain_p50:>8.1f} {batched_qps:>12.0f} {batched_p50:>8.1f} {batched_qps / plain_qps:>5.1f}x")
+    print("batcher:", batcher.stats())
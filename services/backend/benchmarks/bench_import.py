@@ -0,0 +1,47 @@
+"""Import time of main.py, now that rag_model defers its heavy work to init().
+
+Run from services/backend:
+    python -m benchmarks.bench_import
+
+"eager imports" re-creates what importing main.py used to pay before any
+network call: importing every library rag_model loaded at module level.
+"eager + encoder" adds instantiating the MiniLM encoder (needs the model in
+the Hugging Face cache). The GCS download, MLflow server round trips and
+index load came on top of that.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+EAGER_IMPORTS = (
+    "import langchain_community.embeddings, langchain_community.vectorstores, langchain.chat_models, "
+    "langchain_core.prompts, langgraph.graph, mlflow, mlflow.langchain, google.cloud.storage, faiss, torch"
+)
+EAGER_WITH_ENCODER = EAGER_IMPORTS + (
+    "; from langchain_community.embeddings import HuggingFaceEmbeddings; "
+    "HuggingFaceEmbeddings(model_name='sentence-transformers/all-MiniLM-L6-v2')"
+)
+
+
+def timed(code, runs=5):
+    env = {**os.environ, "INIT_ON_START": "lazy", "MLFLOW_DISABLE_AGENT_HINT": "1"}
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True)
+        timings.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1]
+    return statistics.median(timings), None
+
+
+if __name__ == "__main__":
+    for label, code in (("interpreter only", "pass"), ("import main", "import main"), ("eager imports", EAGER_IMPORTS),
+                        ("eager + encoder", EAGER_WITH_ENCODER)):
+        seconds, error = timed(code)
+        if error:
+            print(f"{label:>16}: failed ({error})")
+        else:
+            print(f"{label:>16}: {seconds * 1000:8.0f} ms")
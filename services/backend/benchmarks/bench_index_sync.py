@@ -0,0 +1,72 @@
+"""Cold vs warm index sync against a fake bucket directory.
+
+Run from services/backend:
+    python -m benchmarks.bench_index_sync --latency-ms 150
+
+Each simulated blob download waits --latency-ms before copying (time to first
+byte from GCS). "serial" is the old startup loop: one download per blob,
+every start, whatever is on disk.
+"""
+import argparse
+import os
+import tempfile
+import time
+from src.dataflow.index_store import sync_index
+from src.utils.local_bucket import LocalBlob, LocalBucket
+
+
+class SlowBlob(LocalBlob):
+    latency = 0.0
+
+    def download_to_filename(self, filename):
+        time.sleep(self.latency)
+        super().download_to_filename(filename)
+
+
+class SlowBucket(LocalBucket):
+    def blob(self, name):
+        return SlowBlob(self, name)
+
+    def list_blobs(self, prefix=None):
+        return [SlowBlob(self, blob.name) for blob in super().list_blobs(prefix)]
+
+
+def serial_download(bucket, prefix, local_dir):
+    os.makedirs(local_dir, exist_ok=True)
+    for blob in bucket.list_blobs(prefix=prefix):
+        blob.download_to_filename(os.path.join(local_dir, os.path.basename(blob.name)))
+
+
+def make_bucket(root, files, size_mb):
+    folder = os.path.join(root, "faiss_index")
+    os.makedirs(folder)
+    for i in range(files):
+        with open(os.path.join(folder, f"part-{i}.bin"), "wb") as f:
+            f.write(os.urandom(int(size_mb * (1 << 20))))
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--size-mb", type=float, default=8)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    args = parser.parse_args()
+    SlowBlob.latency = args.latency_ms / 1000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        make_bucket(os.path.join(tmp, "bucket"), args.files, args.size_mb)
+        bucket = SlowBucket(os.path.join(tmp, "bucket"))
+        serial = timed(lambda: serial_download(bucket, "faiss_index", os.path.join(tmp, "serial")))
+        local_dir = os.path.join(tmp, "faiss_index")
+        cold = timed(lambda: sync_index(bucket, "faiss_index", local_dir))
+        warm = timed(lambda: sync_index(bucket, "faiss_index", local_dir))
+        print(f"{args.files} files x {args.size_mb} MB, {args.latency_ms:.0f} ms per download")
+        print(f"  serial download every start: {serial * 1000:8.0f} ms")
+        print(f"  manifest sync, cold:         {cold * 1000:8.0f} ms")
+        print(f"  manifest sync, warm:         {warm * 1000:8.0f} ms")
@@ -0,0 +1,62 @@
+"""recall@10 vs per-query latency for Flat, IVF (nprobe sweep) and HNSW (efSearch sweep).
+
+Run from services/backend:
+    python -m benchmarks.bench_index_types --vectors 100000
+
+The corpus is a synthetic 384-d Gaussian mixture (MiniLM-sized embeddings
+that cluster by topic); queries are held-out points from the same mixture.
+Ground truth is the exact Flat top-10. Latency is one query per search call
+on one thread, like a single request.
+"""
+import argparse
+import time
+import faiss
+import numpy as np
+from src.dataflow.index_factory import apply_search_params, build_index
+
+DIM = 384
+
+
+def synthetic_corpus(n, queries, clusters=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, DIM)).astype(np.float32)
+    labels = rng.integers(0, clusters, n + queries)
+    points = centers[labels] + rng.standard_normal((n + queries, DIM)).astype(np.float32)
+    return points[:n], points[n:]
+
+
+def measure(index, queries, truth, k=10):
+    found = np.empty_like(truth)
+    start = time.perf_counter()
+    for i, query in enumerate(queries):
+        found[i] = index.search(query[None, :], k)[1][0]
+    latency_ms = (time.perf_counter() - start) / len(queries) * 1000
+    recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(found, truth)])
+    return recall, latency_ms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+    faiss.omp_set_num_threads(1)
+
+    corpus, queries = synthetic_corpus(args.vectors, args.queries)
+    print(f"{args.vectors} x {DIM} vectors, {args.queries} queries")
+    print(f"{'index':<22} {'build s':>8} {'recall@10':>10} {'ms/query':>9}")
+    truth = None
+    for index_type, knob, values in (("Flat", None, [None]),
+                                     ("IVF", "nprobe", [1, 4, 16, 64]),
+                                     ("HNSW", "efSearch", [16, 32, 64, 128])):
+        start = time.perf_counter()
+        index, params = build_index(corpus, index_type=index_type)
+        build_seconds = time.perf_counter() - start
+        if truth is None:
+            truth = index.search(queries, 10)[1]
+        for value in values:
+            if knob:
+                apply_search_params(index, {knob: value})
+            recall, latency_ms = measure(index, queries, truth)
+            label = params["factory"] + (f" {knob}={value}" if knob else "")
+            print(f"{label:<22} {build_seconds:>8.1f} {recall:>10.3f} {latency_ms:>9.3f}", flush=True)
@@ -0,0 +1,90 @@
+"""BM25 index size, open time and lookup latency on a synthetic corpus.
+
+Run from services/backend:
+    python -m benchmarks.bench_lexical --chunks 50000
+
+Chunks are ~150 words drawn from a Zipf vocabulary (a few very common words,
+a long tail of rare ones) and each mentions one course code such as
+"CS 5200", like the scraped catalog pages. Queries mix course codes, rare
+terms and everyday words. Latency is one query per call, as in a request.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import numpy as np
+from src.dataflow.lexical import Bm25Index, build_bm25_index, reciprocal_rank_fusion
+
+SUBJECTS = ["CS", "DS", "CY", "IS", "EECE"]
+
+
+def word(rank):
+    """Letters-only token for a vocabulary rank (the tokenizer splits letters from digits)."""
+    letters = ""
+    rank += 1
+    while rank:
+        rank, digit = divmod(rank - 1, 26)
+        letters = chr(97 + digit) + letters
+    return "x" + letters
+
+
+def synthetic_chunks(n, words=150, vocabulary=50000, seed=0):
+    rng = np.random.default_rng(seed)
+    ranks = np.minimum(rng.zipf(1.2, size=(n, words)), vocabulary) - 1
+    chunks = []
+    for i, row in enumerate(ranks):
+        code = f"{SUBJECTS[i % len(SUBJECTS)]} {5000 + i % 1000}"
+        chunks.append(f"{code} " + " ".join(word(r) for r in row))
+    return chunks
+
+
+def percentile(values, p):
+    return sorted(values)[min(len(values) - 1, int(len(values) * p))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    chunks = synthetic_chunks(args.chunks)
+    rng = np.random.default_rng(1)
+    queries = []
+    for i in range(args.queries):
+        kind = i % 3
+        if kind == 0:
+            queries.append(f"prerequisites for {SUBJECTS[i % len(SUBJECTS)]}{5000 + rng.integers(1000)}")
+        elif kind == 1:
+            queries.append(" ".join(word(r) for r in rng.integers(100, 20000, 4)))
+        else:
+            queries.append(" ".join(word(r) for r in rng.integers(0, 20, 6)))
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "bm25.idx")
+        start = time.perf_counter()
+        build_bm25_index(chunks, path)
+        build_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        index = Bm25Index(path)
+        open_ms = (time.perf_counter() - start) * 1000
+        print(f"{args.chunks} chunks: build {build_seconds:.1f} s, file {os.path.getsize(path) / 2**20:.1f} MB, "
+              f"open {open_ms:.2f} ms, {len(index.term_hashes)} terms")
+
+        dense = [[f"d{j}" for j in range(10)] for _ in queries]
+        for label, subset in (("course code", queries[0::3]), ("rare terms", queries[1::3]),
+                              ("common terms", queries[2::3])):
+            timings, overlap = [], []
+            for query in subset:
+                start = time.perf_counter()
+                hits = index.search(query, 10)
+                timings.append((time.perf_counter() - start) * 1000)
+                exhaustive = index.search(query, 10, max_postings=args.chunks)
+                overlap.append(len(set(hits) & set(exhaustive)) / max(1, len(exhaustive)))
+            print(f"{label:<13} p50 {statistics.median(timings):.3f} ms  p99 {percentile(timings, 0.99):.3f} ms  "
+                  f"top-10 overlap with exhaustive scoring {statistics.mean(overlap):.3f}")
+        start = time.perf_counter()
+        for ranking, query in zip(dense, queries):
+            reciprocal_rank_fusion([ranking, index.search(query, 10)], k=10)
+        print(f"search + RRF  mean {(time.perf_counter() - start) / len(queries) * 1000:.3f} ms")
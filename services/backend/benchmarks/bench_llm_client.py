@@ -0,0 +1,75 @@
+"""Tail latency and success rate of the LLM client against a flaky fake server.
+
+Run from services/backend:
+    python -m benchmarks.bench_llm_client --calls 400
+
+The fake server answers in --latency-ms plus up to --jitter-ms. A --slow-rate
+share of requests stalls for --slow-ms and an --error-rate share fails with a
+503. Clients compared:
+
+  bare       HttpChatModel alone (pooled connections, no retries)
+  retries    ResilientChatModel with jittered retries and a --deadline-s deadline
+  hedged     the same plus a hedged request after the observed p95
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.fake_llm_server import FakeLLMServer
+from src.dataflow.llm_client import HttpChatModel, ResilientChatModel
+from src.utils.deadline import deadline
+
+
+def run(llm, calls, concurrency, deadline_s):
+    def one(i):
+        start = time.perf_counter()
+        try:
+            with deadline(deadline_s):
+                llm.invoke(f"question {i}")
+            ok = True
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(one, range(calls)))
+
+
+def percentile(values, p):
+    return sorted(values)[min(len(values) - 1, int(len(values) * p))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    parser.add_argument("--slow-ms", type=float, default=2000)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--deadline-s", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{args.calls} calls x {args.concurrency} threads; server {args.latency_ms:.0f}+{args.jitter_ms:.0f} ms, "
+          f"{args.slow_rate:.0%} stall {args.slow_ms:.0f} ms, {args.error_rate:.0%} errors")
+    print(f"{'client':<8} {'ok':>6} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'max ms':>7}  stats")
+    for name in ("bare", "retries", "hedged"):
+        server = FakeLLMServer(args.latency_ms, args.jitter_ms, args.slow_rate, args.slow_ms, args.error_rate,
+                               seed=0).start()
+        inner = HttpChatModel(endpoint=server.url, model="fake", timeout=args.deadline_s)
+        llm = inner if name == "bare" else ResilientChatModel(inner=inner, timeout=args.deadline_s,
+                                                               hedge=name == "hedged", backoff_base=0.05)
+        if name == "hedged":
+            # let the client observe the normal latency before measuring
+            server.slow_rate, server.error_rate = 0.0, 0.0
+            run(llm, 50, args.concurrency, args.deadline_s)
+            server.slow_rate, server.error_rate = args.slow_rate, args.error_rate
+        results = run(llm, args.calls, args.concurrency, args.deadline_s)
+        server.stop()
+        latencies = [seconds * 1000 for seconds, _ in results]
+        ok = sum(ok for _, ok in results) / len(results)
+        stats = llm.stats() if hasattr(llm, "stats") else {}
+        stats = {k: v for k, v in stats.items() if k in ("retries", "hedges", "hedge_wins")}
+        print(f"{name:<8} {ok:>6.1%} {statistics.median(latencies):>7.0f} {percentile(latencies, 0.95):>7.0f} "
+              f"{percentile(latencies, 0.99):>7.0f} {max(latencies):>7.0f}  {stats}", flush=True)
@@ -0,0 +1,61 @@
+"""Cost of the /metrics instrumentation on the request path.
+
+Run from services/backend:
+    python -m benchmarks.bench_metrics --ops 200000
+
+Times Histogram.observe, Histogram.time(), metrics.stage() with no request
+profile active, Counter.inc and a request's worth
+of updates (every stage timer, one counter, in-flight inc/dec) from 1 and 8
+threads, and how long rendering the page takes.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.utils.metrics import Counter, Gauge, Histogram, Registry, stage
+
+
+def per_op_ns(fn, ops, threads):
+    def work(n):
+        for _ in range(n):
+            fn()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(work, [ops // threads] * threads))
+    return (time.perf_counter() - start) / ops * 1e9
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=200000)
+    args = parser.parse_args()
+
+    registry = Registry()
+    stages = Histogram("stage_seconds", "Stage latency", ["stage"], registry=registry)
+    lookups = Counter("lookups_total", "Lookups", ["cache", "result"], registry=registry)
+    in_flight = Gauge("in_flight", "In flight", registry=registry)
+
+    def timed():
+        with stages.time("encode"):
+            pass
+
+    def request():
+        in_flight.inc()
+        for stage in ("encode", "search", "prompt", "llm", "total"):
+            stages.observe(0.01, stage)
+        lookups.inc("retrieval", "hit")
+        in_flight.dec()
+
+    def pipeline_stage():
+        # what the pipeline uses: the nubot_stage_seconds timer plus the (off) per-request profile check
+        with stage("encode"):
+            pass
+
+    cases = [("observe", lambda: stages.observe(0.003, "search")), ("time()", timed), ("stage()", pipeline_stage),
+             ("inc", lambda: lookups.inc("answer", "miss")), ("request", request)]
+    print(f"{'operation':<10} {'1 thread ns':>12} {'8 threads ns':>13}")
+    for name, fn in cases:
+        print(f"{name:<10} {per_op_ns(fn, args.ops, 1):>12.0f} {per_op_ns(fn, args.ops, 8):>13.0f}", flush=True)
+    start = time.perf_counter()
+    page = registry.render()
+    print(f"render: {(time.perf_counter() - start) * 1000:.2f} ms for {len(page.splitlines())} lines")
@@ -0,0 +1,89 @@
+"""Single index vs per-site partitions with routing: latency and recall@10.
+
+Run from services/backend:
+    python -m benchmarks.bench_partitions --vectors 100000 --sites 5
+
+Each synthetic site owns its own topic clusters (384-d Gaussian mixture as in
+bench_index_types) and sites differ in size like the scraped roots do;
+--separation sets how far apart sites sit (0 makes them indistinguishable).
+Queries are held-out points; a fraction of them name their site, the rest are
+routed by centroid. Recall is against the exact top-10 over all sites.
+"""
+import argparse
+import tempfile
+import time
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.dataflow.index_factory import build_index, build_partitions
+from src.dataflow.partitions import load_partitions
+
+DIM = 384
+SITE_NAMES = ["khoury", "catalog", "coop", "registrar", "graduate", "library", "housing", "studentfinance"]
+
+
+def synthetic_sites(n, queries, sites, separation, clusters=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, DIM)).astype(np.float32)
+    # a shared direction per site, so a site's clusters lean the same way
+    site_bias = rng.standard_normal((sites, DIM)).astype(np.float32) * separation
+    cluster_site = rng.integers(0, sites, clusters)
+    weights = rng.dirichlet(np.ones(sites) * 2)[cluster_site]
+    labels = rng.choice(clusters, n + queries, p=weights / weights.sum())
+    points = centers[labels] + site_bias[cluster_site[labels]] + rng.standard_normal((n + queries, DIM)).astype(np.float32)
+    return points[:n], cluster_site[labels[:n]], points[n:], cluster_site[labels[n:]]
+
+
+def vector_store_for(vectors, site_of_vector):
+    index = faiss.IndexFlatL2(DIM)
+    index.add(vectors)
+    docs = {str(i): Document(page_content=str(i), metadata={"url": f"https://{SITE_NAMES[s]}.northeastern.edu/{i}"})
+            for i, s in enumerate(site_of_vector)}
+    return FAISS(DeterministicFakeEmbedding(size=DIM), index, InMemoryDocstore(docs), {i: str(i) for i in range(len(vectors))})
+
+
+def measure(search, queries, truth, k=10):
+    found = np.empty_like(truth)
+    start = time.perf_counter()
+    for i, query in enumerate(queries):
+        found[i] = search(i, query[None, :], k)[1][0]
+    latency_ms = (time.perf_counter() - start) / len(queries) * 1000
+    recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(found, truth)])
+    return recall, latency_ms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--sites", type=int, default=5)
+    parser.add_argument("--index-type", default="Flat")
+    parser.add_argument("--separation", type=float, default=0.3, help="scale of each site's shared direction")
+    parser.add_argument("--named", type=float, default=0.2, help="share of queries that name their site")
+    args = parser.parse_args()
+    faiss.omp_set_num_threads(1)
+
+    corpus, sites, queries, query_sites = synthetic_sites(args.vectors, args.queries, args.sites, args.separation)
+    vector_store = vector_store_for(corpus, sites)
+    truth = vector_store.index.search(queries, 10)[1]
+    rng = np.random.default_rng(1)
+    questions = [f"{SITE_NAMES[s]} question" if rng.random() < args.named else None for s in query_sites]
+
+    single, params = build_index(corpus, index_type=args.index_type)
+    print(f"{args.vectors} x {DIM} vectors, {args.sites} sites "
+          f"({', '.join(str(c) for c in np.bincount(sites))}), {args.queries} queries, {args.index_type}")
+    print(f"{'setup':<34} {'recall@10':>10} {'ms/query':>9}")
+    recall, latency = measure(lambda i, q, k: single.search(q, k), queries, truth)
+    print(f"{'single ' + params['factory']:<34} {recall:>10.3f} {latency:>9.3f}", flush=True)
+
+    with tempfile.TemporaryDirectory() as folder:
+        build_partitions(vector_store, folder, index_type=args.index_type)
+        for route_top, margin in ((1, 0.0), (1, 0.02), (1, 0.05), (2, 0.02)):
+            partitioned = load_partitions(folder, route_top=route_top, margin=margin)
+            recall, latency = measure(lambda i, q, k: partitioned.search(q, k, questions=[questions[i]]), queries, truth)
+            routed = partitioned.stats()["routed"]
+            label = f"routed top={route_top} margin={margin}"
+            print(f"{label:<34} {recall:>10.3f} {latency:>9.3f}  {routed}", flush=True)
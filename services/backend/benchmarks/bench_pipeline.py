@@ -0,0 +1,60 @@
+"""Per-request overhead of compiling the RAG graph on every query vs reusing one compiled graph.
+
+Run from services/backend:
+    python -m benchmarks.bench_pipeline
+"""
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langgraph.graph import START, StateGraph
+from src.dataflow.pipeline import RagPipeline, State
+
+
+class StubPipeline(RagPipeline):
+    # Trivial nodes so the numbers only show graph build/dispatch overhead
+    def retrieve(self, state):
+        return {"context": []}
+
+    def generate(self, state):
+        return {"answer": state["question"]}
+
+
+def per_request_compile(pipeline, query):
+    # What generateResponse did before: build and compile the graph for every query
+    graph_builder = StateGraph(State).add_sequence([("retrieve", pipeline.retrieve), ("generate", pipeline.generate)])
+    graph_builder.add_edge(START, "retrieve")
+    graph = graph_builder.compile()
+    return graph.invoke({"question": query})
+
+
+def shared_graph(pipeline, query):
+    return pipeline.invoke(query)
+
+
+def measure(fn, pipeline, requests=500, threads=1):
+    timings = []
+
+    def one(i):
+        start = time.perf_counter()
+        fn(pipeline, f"question {i}")
+        timings.append(time.perf_counter() - start)
+
+    wall = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - wall
+    return {
+        "mean_ms": statistics.mean(timings) * 1000,
+        "p95_ms": sorted(timings)[int(len(timings) * 0.95)] * 1000,
+        "throughput_rps": requests / wall,
+    }
+
+
+if __name__ == "__main__":
+    pipeline = StubPipeline(retriever=None, llm=None, prompt=None)
+    for threads in (1, 8):
+        before = measure(per_request_compile, pipeline, threads=threads)
+        after = measure(shared_graph, pipeline, threads=threads)
+        print(f"threads={threads}")
+        print(f"  compile per request: mean {before['mean_ms']:.3f} ms  p95 {before['p95_ms']:.3f} ms  {before['throughput_rps']:.0f} req/s")
+        print(f"  compiled once:       mean {after['mean_ms']:.3f} ms  p95 {after['p95_ms']:.3f} ms  {after['throughput_rps']:.0f} req/s")
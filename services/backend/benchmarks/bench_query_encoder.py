@@ -0,0 +1,99 @@
+"""Per-query latency and process RSS of the PyTorch and int8 ONNX query encoders.
+
+Run from services/backend after exporting the ONNX encoder:
+    python -m src.dataflow.onnx_encoder --output onnx_encoder
+    python -m benchmarks.bench_query_encoder --onnx-dir onnx_encoder --queries 300
+
+Each backend is loaded through rag_model.load_embeddings in a fresh
+interpreter, so RSS is the whole process (Python, libraries, model) as one
+worker pays it, and the child reports whether torch ended up imported. One
+thread, one query at a time; cosine is against the PyTorch vectors, and
+recall@10 is the share of the PyTorch top 10 passages (out of --passages) that
+the backend's vectors also rank in the top 10.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+
+CHILD = """
+import json, sys, time
+import numpy as np
+start = time.perf_counter()
+from src.dataflow import rag_model
+embeddings = rag_model.load_embeddings()
+load_s = time.perf_counter() - start
+queries = json.load(open(sys.argv[1]))
+for query in queries[:10]:
+    embeddings.embed_query(query)
+latencies, vectors = [], []
+for query in queries:
+    start = time.perf_counter()
+    vectors.append(embeddings.embed_query(query))
+    latencies.append((time.perf_counter() - start) * 1000)
+np.save(sys.argv[2], np.array(vectors, dtype=np.float32))
+np.save(sys.argv[4], np.array(embeddings.embed_documents(json.load(open(sys.argv[3]))), dtype=np.float32))
+with open("/proc/self/status") as f:
+    rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS"))
+latencies.sort()
+print(json.dumps({"load_s": load_s, "p50_ms": latencies[len(latencies) // 2],
+                  "p95_ms": latencies[int(len(latencies) * 0.95)], "rss_mb": rss_kb / 1024,
+                  "torch": "torch" in sys.modules}))
+"""
+
+TOPICS = ["co-op deadlines", "CS 5200 prerequisites", "graduate housing", "the MS in data science",
+          "Khoury advising hours", "spring registration", "TA positions", "the Boston campus library"]
+
+
+DETAILS = ["deadlines and forms", "office hours and contacts", "fees and funding", "eligibility rules",
+           "how to apply online", "common questions", "who to contact", "what changed this year"]
+
+
+def run_child(backend, onnx_dir, queries_path, passages_path, tmp):
+    env = dict(os.environ, EMBEDDING_BACKEND=backend, ONNX_ENCODER_DIR=onnx_dir, ONNX_THREADS="1",
+               OMP_NUM_THREADS="1", MKL_NUM_THREADS="1")
+    vectors_path = os.path.join(tmp, f"{backend}.npy")
+    passage_vectors_path = os.path.join(tmp, f"{backend}.passages.npy")
+    out = subprocess.run([sys.executable, "-c", CHILD, queries_path, vectors_path, passages_path, passage_vectors_path],
+                         env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1]), np.load(vectors_path), np.load(passage_vectors_path)
+
+
+def top_k(queries, passages, k):
+    """Passage numbers of the k best cosine matches of each query."""
+    passages = passages / np.linalg.norm(passages, axis=1, keepdims=True)
+    return np.argsort(-(queries @ passages.T), axis=1)[:, :k]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--onnx-dir", default="onnx_encoder")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--passages", type=int, default=512)
+    args = parser.parse_args()
+
+    queries = [f"What should I know about {TOPICS[i % len(TOPICS)]} as student {i}?" for i in range(args.queries)]
+    passages = [f"{TOPICS[i % len(TOPICS)]}: {DETAILS[i // len(TOPICS) % len(DETAILS)]}, section {i}"
+                for i in range(args.passages)]
+    with tempfile.TemporaryDirectory() as tmp:
+        queries_path = os.path.join(tmp, "queries.json")
+        passages_path = os.path.join(tmp, "passages.json")
+        for path, texts in ((queries_path, queries), (passages_path, passages)):
+            with open(path, "w") as f:
+                json.dump(texts, f)
+        print(f"{args.queries} queries, {args.passages} passages, 1 thread")
+        print(f"{'backend':<8} {'load s':>7} {'p50 ms':>7} {'p95 ms':>7} {'RSS MB':>7} {'torch':>6} {'min cos':>8} "
+              f"{'recall@10':>9}", flush=True)
+        reference = None
+        for backend in ("torch", "onnx"):
+            stats, vectors, passage_vectors = run_child(backend, args.onnx_dir, queries_path, passages_path, tmp)
+            reference = (vectors, passage_vectors) if reference is None else reference
+            cosine = (vectors * reference[0]).sum(axis=1) / (np.linalg.norm(vectors, axis=1) *
+                                                             np.linalg.norm(reference[0], axis=1))
+            expected, found = top_k(*reference, 10), top_k(vectors, passage_vectors, 10)
+            recall = np.mean([len(set(e) & set(f)) / 10 for e, f in zip(expected, found)])
+            print(f"{backend:<8} {stats['load_s']:>7.2f} {stats['p50_ms']:>7.2f} {stats['p95_ms']:>7.2f} "
+                  f"{stats['rss_mb']:>7.0f} {str(stats['torch']):>6} {cosine.min():>8.4f} {recall:>9.3f}", flush=True)
@@ -0,0 +1,94 @@
+"""Artifact size, load time, resident memory and recall@10 per vector storage.
+
+Run from services/backend:
+    python -m benchmarks.bench_vector_storage --vectors 20000
+
+Each index is built by build_index over the same synthetic corpus as
+bench_index_types, written to disk, then loaded in a fresh interpreter the
+way the backend loads it (read_index, mmap mode by default) so RSS is what
+one worker pays. The child runs all queries before reading RSS, so pages a
+search touches are counted. Recall is against the exact float32 Flat top-10.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import faiss
+import numpy as np
+from benchmarks.bench_index_types import synthetic_corpus
+from src.dataflow.index_factory import build_index
+
+CONFIGS = [
+    {"storage": "float32"},
+    {"storage": "fp16"},
+    {"storage": "sq8"},
+    {"storage": "pq"},
+    {"storage": "sq8", "rerank": True},
+    {"storage": "pq", "rerank": True, "k_factor": 8},
+    {"index_type": "HNSW", "storage": "float32"},
+    {"index_type": "HNSW", "storage": "sq8"},
+    {"index_type": "HNSW", "storage": "pq", "rerank": True, "k_factor": 8},
+]
+
+CHILD = """
+import json, sys, time
+import faiss, numpy as np
+path, queries_path, mode = sys.argv[1:4]
+faiss.omp_set_num_threads(1)
+queries = np.load(queries_path)
+def rss_kb():
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmRSS"))
+before = rss_kb()
+start = time.perf_counter()
+flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY if mode == "mmap" else 0
+index = faiss.read_index(path, flags)
+load_ms = (time.perf_counter() - start) * 1000
+for name, value in json.loads(sys.argv[4]).items():
+    faiss.ParameterSpace().set_index_parameter(index, name, value)
+start = time.perf_counter()
+found = np.vstack([index.search(q[None, :], 10)[1] for q in queries])
+search_ms = (time.perf_counter() - start) / len(queries) * 1000
+np.save(queries_path + ".found.npy", found)
+print(json.dumps({"load_ms": load_ms, "search_ms": search_ms, "rss_mb": (rss_kb() - before) / 1024}))
+"""
+
+
+def run_child(path, queries_path, mode, search_params):
+    out = subprocess.run([sys.executable, "-c", CHILD, path, queries_path, mode, json.dumps(search_params)],
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1]), np.load(queries_path + ".found.npy")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--mode", choices=["mmap", "memory"], default="mmap")
+    args = parser.parse_args()
+    faiss.omp_set_num_threads(1)
+
+    corpus, queries = synthetic_corpus(args.vectors, args.queries)
+    exact = faiss.IndexFlatL2(corpus.shape[1])
+    exact.add(corpus)
+    truth = exact.search(queries, 10)[1]
+
+    print(f"{args.vectors} x {corpus.shape[1]} vectors, {args.queries} queries, {args.mode} load")
+    print(f"{'factory':<22} {'size MB':>8} {'load ms':>8} {'RSS MB':>7} {'ms/query':>9} {'recall@10':>10}", flush=True)
+    with tempfile.TemporaryDirectory() as folder:
+        queries_path = os.path.join(folder, "queries.npy")
+        np.save(queries_path, queries)
+        for config in CONFIGS:
+            start = time.perf_counter()
+            index, params = build_index(corpus, **config)
+            build_seconds = time.perf_counter() - start
+            path = os.path.join(folder, "index.faiss")
+            faiss.write_index(index, path)
+            stats, found = run_child(path, queries_path, args.mode, params["search"])
+            recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(found, truth)])
+            print(f"{params['factory']:<22} {os.path.getsize(path) / 2**20:>8.1f} {stats['load_ms']:>8.1f} "
+                  f"{stats['rss_mb']:>7.1f} {stats['search_ms']:>9.3f} {recall:>10.3f}  (build {build_seconds:.0f}s)",
+                  flush=True)
@@ -0,0 +1,107 @@
+"""Per-worker memory of the FAISS index with 1, 4 and 8 forked workers.
+
+Run from services/backend (Linux, reads /proc/<pid>/smaps_rollup):
+    python -m benchmarks.bench_worker_memory --vectors 50000
+
+A synthetic index (384-d flat vectors plus ~1 KB of text per chunk) is saved
+with FAISS.save_local, then N workers are forked, each loads it and runs a few
+searches, and their RSS and PSS are read while all of them are alive.
+PSS charges a shared page 1/N to each process, so it is the number that adds
+up to the host's real memory use.
+
+  memory   every worker calls FAISS.load_local (the old startup)
+  preload  the parent loads once and forks (gunicorn --preload), copy-on-write
+  mmap     every worker maps index.faiss and the SQLite docstore read-only
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.dataflow.docstore import convert_pickle_docstore, docstore_path
+from src.dataflow.index_store import load_vector_store
+
+DIM = 384
+
+
+def build_index(folder, vectors):
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+    rng = np.random.default_rng(0)
+    index = faiss.IndexFlatL2(DIM)
+    index.add(rng.standard_normal((vectors, DIM), dtype=np.float32))
+    filler = "Khoury College co-op, course and advising information. " * 18
+    docs = {str(i): Document(page_content=f"chunk {i} {filler}", metadata={"url": f"https://example.edu/{i // 20}", "title": f"Page {i // 20}"})
+            for i in range(vectors)}
+    FAISS(DeterministicFakeEmbedding(size=DIM), index, InMemoryDocstore(docs), {i: str(i) for i in range(vectors)}).save_local(folder)
+
+
+def memory_kb(pid):
+    usage = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("Rss", "Pss"):
+                usage[key] = int(value.split()[0])
+    return usage
+
+
+def touch(store, queries=20):
+    rng = np.random.default_rng(os.getpid())
+    for _ in range(queries):
+        store.similarity_search_by_vector(rng.standard_normal(DIM).tolist(), k=10)
+
+
+def worker(folder, mode, store, ready, done):
+    if store is None:
+        store = load_vector_store(folder, DeterministicFakeEmbedding(size=DIM), mode=mode)
+    touch(store)
+    ready.release()
+    done.acquire()
+
+
+def run(folder, mode, workers):
+    ctx = multiprocessing.get_context("fork")
+    store = None
+    if mode == "preload":
+        store = load_vector_store(folder, DeterministicFakeEmbedding(size=DIM), mode="memory")
+    ready, done = ctx.Semaphore(0), ctx.Semaphore(0)
+    procs = [ctx.Process(target=worker, args=(folder, mode, store, ready, done)) for _ in range(workers)]
+    for proc in procs:
+        proc.start()
+    for _ in procs:
+        # a worker killed by the OOM killer never signals, do not wait for it forever
+        if not ready.acquire(timeout=600):
+            for proc in procs:
+                proc.kill()
+            raise RuntimeError(f"{mode} x{workers}: a worker died, exit codes {[proc.exitcode for proc in procs]}")
+    usage = [memory_kb(proc.pid) for proc in procs]
+    for _ in procs:
+        done.release()
+    for proc in procs:
+        proc.join()
+    rss = sum(u["Rss"] for u in usage) / len(usage) / 1024
+    pss = sum(u["Pss"] for u in usage) / 1024
+    return rss, pss
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=50000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        build_index(folder, args.vectors)
+        # the first mmap load of a new index version converts the docstore once; keep that out of the numbers
+        pkl_path = os.path.join(folder, "index.pkl")
+        convert_pickle_docstore(pkl_path, docstore_path(pkl_path))
+        size_mb = sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder)) / 2**20
+        print(f"index: {args.vectors} vectors, {size_mb:.0f} MB on disk")
+        print(f"{'mode':<8} {'workers':>7} {'RSS/worker MB':>14} {'PSS total MB':>13} {'PSS/worker MB':>14}")
+        for mode in ("memory", "preload", "mmap"):
+            for workers in (1, 4, 8):
+                rss, pss = run(folder, mode, workers)
+                print(f"{mode:<8} {workers:>7} {rss:>14.0f} {pss:>13.0f} {pss / workers:>14.0f}", flush=True)
@@ -0,0 +1,120 @@
+"""Local OpenAI/Mistral-compatible /chat/completions server with random latency.
+
+Run from services/backend, then point the backend at it with LLM_ENDPOINT:
+    python -m benchmarks.fake_llm_server --port 8001 --latency-ms 300 --jitter-ms 200
+    LLM_ENDPOINT=http://127.0.0.1:8001 ...
+
+Each request sleeps latency + uniform(0, jitter) ms; --slow-rate sends that
+share of requests into a --slow-ms tail instead, and --error-rate answers
+with a 503. The answer echoes the last line of the prompt. With
+"stream": true it replies as server-sent events, one word per event.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Server(ThreadingHTTPServer):
+    # the default backlog of 5 drops connections when hundreds of async requests connect at once
+    request_queue_size = 1024
+
+
+class FakeLLMServer:
+    """ThreadingHTTPServer in a daemon thread; the knobs can be changed while it runs."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, slow_rate=0.0, slow_ms=0.0, error_rate=0.0, port=0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.error_rate = error_rate
+        # status codes to answer the next requests with, before the random behaviour applies
+        self.script = []
+        self.requests = 0
+        self.peers = set()
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.httpd = _Server(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _plan(self, peer):
+        """(delay seconds, status) for the next request."""
+        with self._lock:
+            self.requests += 1
+            self.peers.add(peer)
+            if self.script:
+                return self.latency_ms / 1000, self.script.pop(0)
+            if self.random.random() < self.error_rate:
+                return self.latency_ms / 1000, 503
+            if self.random.random() < self.slow_rate:
+                return self.slow_ms / 1000, 200
+            return (self.latency_ms + self.random.uniform(0, self.jitter_ms)) / 1000, 200
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type="application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client gave up (deadline, or its hedged twin won)
+                    pass
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                delay, status = server._plan(self.client_address)
+                time.sleep(delay)
+                if status != 200:
+                    return self._send(status, json.dumps({"error": "unavailable"}).encode())
+                prompt = request.get("messages", [{}])[-1].get("content", "")
+                answer = "answer to " + prompt.strip().splitlines()[-1] if prompt.strip() else "answer"
+                if not request.get("stream"):
+                    body = {"model": request.get("model"), "usage": {"prompt_tokens": len(prompt.split())},
+                            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}}]}
+                    return self._send(200, json.dumps(body).encode())
+                events = [{"choices": [{"index": 0, "delta": {"content": word + " "}}]} for word in answer.split()]
+                body = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+                self._send(200, body.encode(), content_type="text/event-stream")
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=200)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-ms", type=float, default=3000)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = FakeLLMServer(args.latency_ms, args.jitter_ms, args.slow_rate, args.slow_ms, args.error_rate, port=args.port)
+    print(f"fake LLM on {server.url}", flush=True)
+    server.httpd.serve_forever()
@@ -0,0 +1,386 @@
+"""Offline load test of the backend: the API on a synthetic index, a local bucket and a fake LLM.
+
+Run from services/backend:
+    python -m benchmarks.loadtest --concurrency 1 4 16 --requests 300 --llm-latency-ms 300
+    python -m benchmarks.loadtest ... --compare loadtest-results/loadtest-20260101-120000.json
+    python -m benchmarks.loadtest --app asgi --concurrency 16 64 256 ...
+
+Nothing leaves the machine:
+  * a synthetic corpus (--chunks chunks over --sites sites) is indexed with the
+    same index_factory/lexical code chunk_data uses and published to a
+    LOCAL_BUCKET_DIR bucket, which the app syncs at startup like it would GCS;
+  * queries are embedded by a hash encoder that costs --encoder-ms per call
+    (one call at a time, like the CPU-bound MiniLM);
+  * the LLM is benchmarks/fake_llm_server.py in its own process, reached
+    through LLM_ENDPOINT and the app's real HTTP client, answering after
+    --llm-latency-ms plus up to --llm-jitter-ms;
+  * the app runs in a child process, so the load generator does not share its
+    GIL: main.py on a threaded WSGI server (--app flask, a thread per
+    connection, or at most --flask-threads requests at a time like a gunicorn
+    deployment), or asgi.py on uvicorn (--app asgi).
+
+Each concurrency level sends --requests POST /NuBot/ requests from that many
+keep-alive clients. A --repeat-ratio share of the queries come from a small
+hot set, so the caches see some hits. The app records the exact duration of
+every stage it reports to /metrics (encode, search, bm25, prompt, llm) and of
+each request (server_total). The client measures client_total. The p50/p95/p99
+of each, throughput, errors and the app's peak thread count per level are printed and saved as JSON under
+--output-dir together with the run's settings and git commit, so runs can be
+compared over time (--compare prints the change against an earlier file).
+App settings not covered by a flag (INDEX_LOAD_MODE, EMBED_BATCH_SIZE, ...)
+are taken from the environment as usual.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from langchain_core.embeddings import Embeddings
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INDEX_PREFIX = "faiss_index"
+STAGES = ("client_total", "server_total", "encode", "search", "bm25", "prompt", "llm")
+WORDS = ["registration", "co-op", "deadline", "housing", "scholarship", "advisor", "capstone", "thesis",
+         "internship", "tuition", "library", "seminar", "research", "lab", "admission", "transcript",
+         "prerequisite", "elective", "graduate", "undergraduate", "faculty", "office", "hours", "campus"]
+SITES = ["www.khoury.northeastern.edu", "catalog.northeastern.edu", "registrar.northeastern.edu",
+         "coe.northeastern.edu", "library.northeastern.edu", "housing.northeastern.edu",
+         "careers.northeastern.edu", "graduate.northeastern.edu"]
+
+
+class HashEncoder(Embeddings):
+    """Deterministic unit vectors seeded by the text, costing cost_ms per call, one call at a time."""
+
+    def __init__(self, size=384, cost_ms=0.0):
+        self.size = size
+        self.cost = cost_ms / 1000
+        self.cpu = threading.Lock()
+
+    def _vector(self, text):
+        vector = np.random.default_rng(zlib.crc32(text.encode())).standard_normal(self.size)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        if self.cost:
+            with self.cpu:
+                time.sleep(self.cost)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def synthetic_chunks(n, sites, seed=0):
+    """(text, metadata) of n chunks spread over the first `sites` sites, with course numbers BM25 can match."""
+    from src.dataflow.context import estimate_tokens
+    rng = random.Random(seed)
+    chunks = []
+    for i in range(n):
+        site = SITES[i % min(sites, len(SITES))]
+        words = [rng.choice(WORDS) for _ in range(rng.randint(80, 160))]
+        words.insert(rng.randrange(len(words)), f"CS {5000 + i % 800}")
+        text = " ".join(words)
+        chunks.append((text, {"url": f"https://{site}/page-{i // 4}", "title": f"Page {i // 4}",
+                              "start_index": (i % 4) * 800, "token_count": estimate_tokens(text)}))
+    return chunks
+
+
+def build_synthetic_index(folder, chunks, encoder, index_type="Flat", storage="float32", partition_by_site=True):
+    """The files chunk_data uploads (FAISS index, index_params.json, bm25.idx, partitions), in folder."""
+    from langchain_community.vectorstores import FAISS
+    from src.dataflow.index_factory import build_partitions, rebuild_vector_store_index, save_index_params
+    from src.dataflow.lexical import BM25_FILE, build_bm25_index
+    os.makedirs(folder, exist_ok=True)
+    texts = [text for text, _ in chunks]
+    vector_store = FAISS.from_texts(texts, encoder, metadatas=[metadata for _, metadata in chunks])
+    if partition_by_site:
+        build_partitions(vector_store, folder, index_type=index_type, storage=storage)
+    index_params = rebuild_vector_store_index(vector_store, index_type=index_type, storage=storage)
+    vector_store.save_local(folder)
+    save_index_params(folder, index_params)
+    build_bm25_index(texts, os.path.join(folder, BM25_FILE))
+
+
+def serve(args):
+    """Child process: load the app from the local bucket and serve it; prints the port once ready."""
+    # the synced index, answer cache and profiles land in the work directory
+    os.chdir(args.workdir)
+    from src.dataflow import rag_model
+    from src.utils import metrics
+
+    samples, lock, peak = defaultdict(list), threading.Lock(), {"threads": 0}
+
+    def record(histogram, name):
+        observe = histogram.observe
+
+        def recording(value, *labels):
+            with lock:
+                samples[name(labels)].append(value)
+            observe(value, *labels)
+        histogram.observe = recording
+
+    record(metrics.STAGE_SECONDS, lambda labels: labels[0])
+    record(metrics.REQUEST_SECONDS, lambda labels: "server_total" if labels[0] == "/NuBot/" else labels[0])
+
+    def watch_threads():
+        while True:
+            peak["threads"] = max(peak["threads"], threading.active_count())
+            time.sleep(0.01)
+
+    def take_samples():
+        with lock:
+            taken = {"samples": dict(samples), "threads_peak": peak["threads"]}
+            samples.clear()
+            peak["threads"] = threading.active_count()
+        return taken
+
+    threading.Thread(target=watch_threads, daemon=True).start()
+    encoder = HashEncoder(args.dimension, cost_ms=args.encoder_ms)
+    rag_model.init(retriever=rag_model.build_retriever(encoder, rag_model.download_index()), tracking_enabled=False)
+    if args.app == "asgi":
+        import uvicorn
+        import asgi
+        asgi.app.post("/_loadtest/samples")(take_samples)
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        sock.listen(2048)
+        print(sock.getsockname()[1], flush=True)
+        uvicorn.Server(uvicorn.Config(asgi.app, log_level="warning", backlog=2048)).run(sockets=[sock])
+    else:
+        from flask import jsonify
+        from werkzeug.serving import make_server
+        import main
+        main.app.add_url_rule("/_loadtest/samples", "loadtest_samples", lambda: jsonify(take_samples()),
+                              methods=["POST"])
+        app = main.app
+        if args.flask_threads:
+            # like a gunicorn worker's fixed thread count: further requests queue for a free slot
+            slots, wsgi_app = threading.BoundedSemaphore(args.flask_threads), main.app.wsgi_app
+
+            def app(environ, start_response):
+                with slots:
+                    return list(wsgi_app(environ, start_response))
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        print(server.server_port, flush=True)
+        server.serve_forever()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"process exited with {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"nothing listening on {port} after {timeout} s")
+
+
+def start_fake_llm(args):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, "-m", "benchmarks.fake_llm_server", "--port", str(port),
+                                "--latency-ms", str(args.llm_latency_ms), "--jitter-ms", str(args.llm_jitter_ms),
+                                "--error-rate", str(args.llm_error_rate)],
+                               cwd=BACKEND_DIR, stdout=subprocess.DEVNULL)
+    wait_for_port(port, process)
+    return process, f"http://127.0.0.1:{port}"
+
+
+def start_app(args, workdir, bucket, llm_url):
+    env = dict(os.environ, LOCAL_BUCKET_DIR=bucket, FAISS_INDEX_FOLDER=INDEX_PREFIX, LLM_ENDPOINT=llm_url,
+               LLM_MODEL="fake", INIT_ON_START="lazy", INDEX_POLL_SECONDS="0", MLFLOW_TRACKING_URI="",
+               PROFILE_SAMPLE_RATE="0")
+    env.pop("METRICS_DIR", None)
+    process = subprocess.Popen([sys.executable, "-m", "benchmarks.loadtest", "serve", "--workdir", workdir,
+                                "--app", args.app, "--flask-threads", str(args.flask_threads),
+                                "--dimension", str(args.dimension),
+                                "--encoder-ms", str(args.encoder_ms)],
+                               cwd=BACKEND_DIR, env=env, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.strip().isdigit():
+        process.kill()
+        raise RuntimeError("the app did not start, see its output above")
+    return process, f"http://127.0.0.1:{int(line)}"
+
+
+def percentiles(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99),
+            "mean": sum(ordered) / len(ordered) * 1000, "count": len(ordered)}
+
+
+def queries(n, repeat_ratio, seed):
+    rng = random.Random(seed)
+    hot = [f"When is the {rng.choice(WORDS)} {rng.choice(WORDS)} deadline for CS {5000 + i}?" for i in range(20)]
+    return [rng.choice(hot) if rng.random() < repeat_ratio else
+            f"What about {rng.choice(WORDS)} and {rng.choice(WORDS)} for CS {5000 + rng.randrange(800)} (#{i})?"
+            for i in range(n)]
+
+
+def run_level(url, concurrency, batch, timeout):
+    """Send batch with `concurrency` keep-alive clients; client latencies, error count and wall time."""
+    latencies, errors, next_query = [], [0], iter(batch)
+    lock = threading.Lock()
+
+    def client(_):
+        with requests.Session() as session:
+            while True:
+                with lock:
+                    query = next(next_query, None)
+                if query is None:
+                    return
+                start = time.perf_counter()
+                try:
+                    response = session.post(f"{url}/NuBot/", json={"query": query}, timeout=timeout)
+                    failed = response.status_code != 200 or isinstance(response.json(), dict)
+                except (requests.RequestException, ValueError):
+                    failed = True
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    errors[0] += failed
+
+    wall = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    return latencies, errors[0], time.perf_counter() - wall
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_level(level, baseline=None):
+    latency = level["latency_ms"]
+    line = (f"c={level['concurrency']:<4} {level['throughput_rps']:>8.1f} req/s  errors {level['errors']:<4}"
+            f" server threads {level['server_threads_peak']:<4}")
+    if baseline is not None:
+        change = (level["throughput_rps"] / baseline["throughput_rps"] - 1) * 100
+        line += f" ({change:+.0f}% req/s vs baseline)"
+    print(line)
+    for stage in STAGES:
+        if latency.get(stage) is None:
+            continue
+        stats = latency[stage]
+        line = (f"    {stage:<13} p50 {stats['p50']:>8.2f}  p95 {stats['p95']:>8.2f}  p99 {stats['p99']:>8.2f} ms"
+                f"  (n={stats['count']})")
+        before = (baseline or {}).get("latency_ms", {}).get(stage)
+        if before:
+            line += f"  p95 {(stats['p95'] / before['p95'] - 1) * 100:+.0f}%"
+        print(line)
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="nubot-loadtest-")
+    processes = []
+    try:
+        bucket = os.path.join(workdir, "bucket")
+        start = time.perf_counter()
+        build_synthetic_index(os.path.join(bucket, INDEX_PREFIX), synthetic_chunks(args.chunks, args.sites),
+                              HashEncoder(args.dimension), index_type=args.index_type, storage=args.storage)
+        print(f"indexed {args.chunks} chunks over {args.sites} sites in {time.perf_counter() - start:.1f} s",
+              flush=True)
+        llm, llm_url = start_fake_llm(args)
+        processes.append(llm)
+        os.makedirs(os.path.join(workdir, "app"))
+        app, url = start_app(args, os.path.join(workdir, "app"), bucket, llm_url)
+        processes.append(app)
+
+        baseline = {}
+        if args.compare:
+            with open(args.compare) as f:
+                baseline = {level["concurrency"]: level for level in json.load(f)["levels"]}
+        levels = []
+        for i, concurrency in enumerate(args.concurrency):
+            batch = queries(args.requests, args.repeat_ratio, seed=i)
+            run_level(url, min(concurrency, 4), queries(args.warmup, 0.0, seed=1000 + i), args.timeout)
+            requests.post(f"{url}/_loadtest/samples")
+            latencies, errors, wall = run_level(url, concurrency, batch, args.timeout)
+            server = requests.post(f"{url}/_loadtest/samples").json()
+            level = {"concurrency": concurrency, "requests": len(latencies), "errors": errors,
+                     "wall_seconds": wall, "throughput_rps": len(latencies) / wall,
+                     "server_threads_peak": server["threads_peak"],
+                     "latency_ms": {"client_total": percentiles(latencies),
+                                    **{stage: percentiles(server["samples"].get(stage, [])) for stage in STAGES[1:]}}}
+            levels.append(level)
+            print_level(level, baseline.get(concurrency))
+
+        result = {"config": {**{key: value for key, value in vars(args).items() if key not in ("command", "compare", "workdir", "output_dir")},
+                             **{env: os.environ[env] for env in ("INDEX_LOAD_MODE", "EMBED_BATCH_SIZE",
+                                                                 "ANSWER_CACHE_BACKEND", "HYBRID_SEARCH",
+                                                                 "INDEX_ROUTING", "COALESCE_REQUESTS")
+                                if env in os.environ}},
+                  "git_commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                  "python": sys.version.split()[0], "cpus": os.cpu_count(), "levels": levels}
+        os.makedirs(args.output_dir, exist_ok=True)
+        path = os.path.join(args.output_dir, f"loadtest-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"saved {path}")
+        return path
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "serve"])
+    parser.add_argument("--app", default="flask", choices=["flask", "asgi"],
+                        help="main.py on a threaded WSGI server, or asgi.py on uvicorn")
+    parser.add_argument("--flask-threads", type=int, default=0,
+                        help="requests the Flask app serves at a time, as gunicorn workers x threads (0: no limit)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--repeat-ratio", type=float, default=0.1)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--sites", type=int, default=8)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--index-type", default="Flat")
+    parser.add_argument("--storage", default="float32")
+    parser.add_argument("--encoder-ms", type=float, default=5.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-jitter-ms", type=float, default=200)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output-dir", default="loadtest-results")
+    parser.add_argument("--compare", help="earlier result JSON to print changes against")
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "serve":
+        serve(args)
+    else:
+        run(args)
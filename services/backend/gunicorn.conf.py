@@ -0,0 +1,39 @@
+# gunicorn -c gunicorn.conf.py wsgi:app
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8080)}"
+workers = int(os.getenv('WEB_CONCURRENCY', 4))
+# Threaded workers: each of the workers serves up to GUNICORN_THREADS requests at once, so the container
+# takes workers * threads requests in flight and an SSE stream ties up one thread, not a whole worker.
+# Threads of one worker share its process, which is what lets the embedding batcher merge concurrent
+# queries and identical questions coalesce. Memory grows with workers, not threads: every worker holds its
+# own encoder, caches and session store, while the mmap-loaded index (INDEX_LOAD_MODE=mmap) and docstore
+# sit once in the page cache for all of them. So add threads for concurrency and workers for CPU cores.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 16))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+# Load the app (encoder, index) once in the master and fork it into the workers.
+# Pages the workers only read, such as the model weights, stay shared after the fork.
+preload_app = os.getenv('PRELOAD_APP', 'false').lower() == 'true'
+
+if preload_app:
+    # the background init thread would not survive the fork, load before forking instead
+    os.environ['INIT_ON_START'] = 'eager'
+
+
+# each worker snapshots its /metrics counters here so any worker can report the totals of all of them
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'nubot-metrics'))
+
+
+def on_starting(server):
+    # counts from a previous run of the server do not belong to this one
+    from src.utils.metrics import clear_directory
+    clear_directory(os.environ['METRICS_DIR'])
+
+
+def post_fork(server, worker):
+    if preload_app:
+        # the index watcher thread started in the master is gone in the worker
+        from src.dataflow.rag_model import start_index_watcher
+        start_index_watcher()
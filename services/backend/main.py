@@ -1,5 +1,4 @@
-
-from flask import Flask,jsonify
+from flask import Flask,jsonify,Response,request,stream_with_context,g,send_file
 from flask_restx import Api, Resource,fields,reqparse # type: ignore
 from src.utils.logger import logging
 from dotenv import load_dotenv
@@ -8,23 +7,35 @@ from dotenv import load_dotenv
 from src.utils.exception import CustomException
 import sys
 import os
-from src.dataflow.rag_model import generateResponse
+import json
+from src.dataflow.rag_model import (generateResponse, streamResponse, batchResponse, cacheStats, init, start_background_init,
+                                   readiness, index_status, reload_index, start_index_watcher, profiler,
+                                   BATCH_MAX_QUERIES)
+from src.utils.deadline import set_deadline, reset_deadline, requested_timeout
+from src.utils import metrics
 from flask_cors import CORS # type: ignore
 load_dotenv(override=True)
-
-
-app =Flask(__name__)
+# "background": load the pipeline in a thread while the server starts, "eager": before serving, "lazy": on first request
+INIT_ON_START = os.getenv('INIT_ON_START', 'background')
+# run one dummy query through the encoder and index after a background init
+WARM_UP = os.getenv('WARM_UP', 'true').lower() == 'true'
+# when set, /NuBot/admin/index requires it in the X-Admin-Token header
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+# seconds a request may take; clients can ask for less with an X-Request-Timeout header (seconds)
+REQUEST_TIMEOUT = float(os.getenv('REQUEST_TIMEOUT', 60))
 
 # Initialize Flask-RESTX API with Swagger support
-api =Api(app, version="1.0" , title="NuBot Backend", description="Backend for NuBot")
+api =Api(version="1.0" , title="NuBot Backend", description="Backend for NuBot")
 
-CORS(app)
 # create a namespace 
 ns=api.namespace("NuBot",descrption="namespace for Backend")
 parser = reqparse.RequestParser()
+parser.add_argument('query', type=str, required=True, location='json', help="Query is required")
+parser.add_argument('session_id', type=str, required=False, location='json')
 # Define a request model for Swagger UI
 query_model = api.model('QueryModel', {
-    'query': fields.String(required=True, description="User's input query")
+    'query': fields.String(required=True, description="User's input query"),
+    'session_id': fields.String(required=False, description="Chat session; follow-up questions may reuse its retrieval")
 })
 @ns.route("/")
 class Main(Resource):
@@ -34,21 +45,257 @@ class Main(Resource):
     @api.response(500, "Internal Server Error")
     def post(self):
         """Return a simple message"""
+        # "X-Profile: 1" (or PROFILE_SAMPLE_RATE) profiles this request; the X-Profile-Id response
+        # header names the result under /NuBot/admin/profiles
+        with profiler.profile("Main.post", enabled=profiler.wanted(profile_requested())) as request_profile:
+            headers = {"X-Profile-Id": request_profile.id} if request_profile is not None else {}
+            try:
+                args = parser.parse_args()
+                if not args['query']:
+                    return {"error": "Query field is required"}, 400
+                logging.info("Get api called")
+                query=args['query']
+                if request_profile is not None:
+                    request_profile.info["query"] = query
+                logging.info("response function called")
+                response=generateResponse(query, session_id=args['session_id'])
+                logging.info("Response generated successfully")
+                return response, 200, headers
+            except Exception as e:
+                logging.error("Custom exception occurred: %s", str(e))
+                mark_request_failed()
+                error = jsonify({"error": "An internal server error occurred", "details": str(e)})
+                error.headers.update(headers)
+                return error
+
+
+batch_model = api.model('BatchModel', {
+    'queries': fields.List(fields.String, required=True, description=f"Up to {BATCH_MAX_QUERIES} queries")
+})
+
+
+@ns.route("/batch")
+class Batch(Resource):
+    @api.expect(batch_model)
+    @api.response(200, "One {query, answer} or {query, error} per query, in request order")
+    @api.response(400, "queries must be a non-empty list of strings")
+    @api.response(500, "Internal Server Error")
+    def post(self):
+        """Answer many queries with one batched encode and FAISS search"""
+        queries = (request.get_json(silent=True) or {}).get("queries")
+        if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q for q in queries):
+            return {"error": "queries must be a non-empty list of strings"}, 400
+        if len(queries) > BATCH_MAX_QUERIES:
+            return {"error": f"At most {BATCH_MAX_QUERIES} queries per batch"}, 400
+        logging.info("Batch api called with %d queries", len(queries))
         try:
-            parser.add_argument('query', type=str, required=True, location='json', help="Query is required")
-            args = parser.parse_args()
-            if not args['query']:
-                return {"error": "Query field is required"}, 400
-            logging.info("Get api called")
-            query=args['query']
-            logging.info("response function called")
-            response=generateResponse(query)
-            logging.info("Response generated successfully")
-            return response
+            return {"results": batchResponse(queries)}
         except Exception as e:
             logging.error("Custom exception occurred: %s", str(e))
-            return jsonify({"error": "An internal server error occurred", "details": str(e)})
-           
+            return {"error": "An internal server error occurred", "details": str(e)}, 500
+
+
+@ns.route("/stats")
+class Stats(Resource):
+    @api.response(200, "Success")
+    def get(self):
+        """Cache sizes and hit ratios"""
+        return cacheStats()
+
+
+def format_sse(event, data):
+    """Encode one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@ns.route("/stream")
+class Stream(Resource):
+    @api.expect(query_model)
+    @api.response(200, "text/event-stream: one metadata event, token events, then done")
+    @api.response(400, "Query field is required")
+    def post(self):
+        """Stream the answer as Server-Sent Events"""
+        args = parser.parse_args()
+        if not args['query']:
+            return {"error": "Query field is required"}, 400
+        query=args['query']
+        session_id=args['session_id']
+        logging.info("Stream api called")
+
+        def events():
+            try:
+                for event, data in streamResponse(query, session_id=session_id):
+                    yield format_sse(event, data)
+                yield format_sse("done", {})
+            except Exception as e:
+                logging.error("Custom exception occurred: %s", str(e))
+                mark_request_failed()
+                yield format_sse("error", {"error": "An internal server error occurred", "details": str(e)})
+
+        # X-Accel-Buffering stops nginx-style proxies from holding back events
+        return Response(stream_with_context(events()), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def admin_authorized():
+    return not ADMIN_TOKEN or request.headers.get("X-Admin-Token") == ADMIN_TOKEN
+
+
+def profile_requested():
+    """X-Profile header set (by an admin, when ADMIN_TOKEN is configured)."""
+    return request.headers.get("X-Profile", "").lower() in ("1", "true") and admin_authorized()
+
+
+@ns.route("/admin/index")
+class AdminIndex(Resource):
+    def authorized(self):
+        return admin_authorized()
+
+    @api.response(200, "Loaded index version and reload history")
+    @api.response(401, "Missing or wrong X-Admin-Token")
+    def get(self):
+        """Loaded index version"""
+        if not self.authorized():
+            return {"error": "unauthorized"}, 401
+        return index_status()
+
+    @api.response(200, "Index synced from the bucket and reloaded")
+    @api.response(401, "Missing or wrong X-Admin-Token")
+    @api.response(500, "Reload failed, the previous index keeps serving")
+    def post(self):
+        """Force a reload of the index from the bucket"""
+        if not self.authorized():
+            return {"error": "unauthorized"}, 401
+        try:
+            return reload_index(force=True)
+        except Exception as e:
+            logging.error("Custom exception occurred: %s", str(e))
+            return {"error": "Index reload failed", "details": str(e)}, 500
+
+
+@ns.route("/admin/profiles")
+class AdminProfiles(Resource):
+    @api.response(200, "Saved request profiles, newest first")
+    @api.response(401, "Missing or wrong X-Admin-Token")
+    def get(self):
+        """Saved request profiles"""
+        if not admin_authorized():
+            return {"error": "unauthorized"}, 401
+        return {"profiles": profiler.list(), **profiler.stats()}
+
+
+@ns.route("/admin/profiles/<string:profile_id>")
+class AdminProfile(Resource):
+    @api.response(200, "Stage timing breakdown and the top functions by cumulative time")
+    @api.response(401, "Missing or wrong X-Admin-Token")
+    @api.response(404, "No such profile")
+    def get(self, profile_id):
+        """Stage breakdown of one profiled request"""
+        if not admin_authorized():
+            return {"error": "unauthorized"}, 401
+        path = profiler.path(profile_id, ".json")
+        if path is None:
+            return {"error": "profile not found"}, 404
+        with open(path) as f:
+            return json.load(f)
+
+
+@ns.route("/admin/profiles/<string:profile_id>/download")
+class AdminProfileDownload(Resource):
+    @api.response(200, "cProfile output (pstats format, e.g. for snakeviz)")
+    @api.response(401, "Missing or wrong X-Admin-Token")
+    @api.response(404, "No such profile")
+    def get(self, profile_id):
+        """Download the cProfile output of one profiled request"""
+        if not admin_authorized():
+            return {"error": "unauthorized"}, 401
+        path = profiler.path(profile_id, ".prof")
+        if path is None:
+            return {"error": "profile not found"}, 404
+        return send_file(os.path.abspath(path), mimetype="application/octet-stream", as_attachment=True,
+                         download_name=f"{profile_id}.prof")
+
+
+@api.route("/ready")
+class Ready(Resource):
+    @api.response(200, "Pipeline loaded")
+    @api.response(503, "Pipeline still loading or failed")
+    def get(self):
+        """Readiness probe"""
+        state = readiness()
+        return state, 200 if state["status"] == "ready" else 503
+
+
+@api.route("/metrics")
+class Metrics(Resource):
+    @api.response(200, "Prometheus text format: stage latency histograms, cache, error and in-flight counts, index gauges")
+    def get(self):
+        """Prometheus metrics"""
+        return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+def request_deadline():
+    return requested_timeout(request.headers.get("X-Request-Timeout"), REQUEST_TIMEOUT)
+
+
+def request_endpoint():
+    """Route pattern of the current request, a bounded label unlike the path."""
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def mark_request_failed():
+    """Count the current request as an error on /metrics (for handlers that answer errors with a 200)."""
+    request.environ["nubot.failed"] = True
+
+
+def create_app():
+    app =Flask(__name__)
+    api.init_app(app)
+    CORS(app)
+
+    # the LLM client and coalescing waits stop at this deadline instead of holding the worker thread
+    @app.before_request
+    def start_deadline():
+        g.deadline_token = set_deadline(request_deadline())
+
+    @app.teardown_request
+    def end_deadline(exc):
+        token = g.pop("deadline_token", None)
+        if token is not None:
+            reset_deadline(token)
+
+    # total time, in-flight and errors per route, kept in the WSGI environ of the request they belong to
+    @app.before_request
+    def start_metrics():
+        if request.path != "/metrics":
+            metrics.start_request(request.environ)
+
+    @app.after_request
+    def count_streams_and_errors(response):
+        if response.status_code >= 500:
+            mark_request_failed()
+        if response.is_streamed and "nubot.start" in request.environ:
+            # teardown runs when the view returns; a stream is done once its last event is sent
+            environ, endpoint = request.environ, request_endpoint()
+            environ["nubot.streaming"] = True
+            response.call_on_close(lambda: metrics.finish_request(environ, endpoint))
+        return response
+
+    @app.teardown_request
+    def end_metrics(exc):
+        if not request.environ.get("nubot.streaming"):
+            metrics.finish_request(request.environ, request_endpoint(), failed=exc is not None)
+
+    if INIT_ON_START == "eager":
+        init()
+    elif INIT_ON_START == "background":
+        start_background_init(warm=WARM_UP)
+    # picks up indexes published by the scheduled chunk_data flow without a restart
+    start_index_watcher()
+    return app
+
+
+app = create_app()
 
 if __name__=="__main__":
     PORT=os.getenv('PORT', 8080)
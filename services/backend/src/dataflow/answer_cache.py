@@ -0,0 +1,203 @@
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from src.utils.cache import TTLCache, normalize_query
+
+
+def _unit(embedding):
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class AnswerCacheBackend:
+    """Storage behind SemanticAnswerCache.
+
+    Embeddings are unit length, so the dot product is the cosine similarity.
+    Subclass this to put answers somewhere every gunicorn worker can read.
+    """
+
+    def search(self, embedding, threshold, index_version):
+        """Return (answer, score) of the closest entry at or above threshold, or None."""
+        raise NotImplementedError
+
+    def put(self, key, embedding, answer, index_version):
+        raise NotImplementedError
+
+    def invalidate(self, index_versions):
+        """Drop entries built against any of index_versions."""
+        raise NotImplementedError
+
+
+class InMemoryAnswerBackend(AnswerCacheBackend):
+    """Per-process backend on top of TTLCache."""
+
+    def __init__(self, max_entries=1024, ttl=3600):
+        self.entries = TTLCache(max_entries=max_entries, ttl=ttl)
+
+    def search(self, embedding, threshold, index_version):
+        candidates = [(key, value) for key, value in self.entries.items() if value[2] == index_version]
+        if not candidates:
+            return None
+        matrix = np.stack([value[0] for _, value in candidates])
+        scores = matrix @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+        key, (_, answer, _) = candidates[best]
+        # refresh its LRU position
+        self.entries.get(key)
+        return answer, float(scores[best])
+
+    def put(self, key, embedding, answer, index_version):
+        self.entries.put(key, (embedding, answer, index_version))
+
+    def invalidate(self, index_versions):
+        for key, value in self.entries.items():
+            if value[2] in index_versions:
+                self.entries.pop(key)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SqliteAnswerBackend(AnswerCacheBackend):
+    """Backend in a local SQLite file so all gunicorn workers on a host share hits.
+
+    Each process opens its own connection on first use (connections must not
+    cross a fork), WAL mode lets readers run while one worker writes.
+    """
+
+    def __init__(self, path, max_entries=1024, ttl=3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "key TEXT PRIMARY KEY, embedding BLOB, answer TEXT, index_version TEXT, "
+                "created REAL, last_used REAL)"
+            )
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def search(self, embedding, threshold, index_version):
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute(
+                "SELECT key, embedding, answer FROM answers WHERE index_version = ? AND created > ?",
+                (index_version, time.time() - self.ttl),
+            ).fetchall()
+            if not rows:
+                return None
+            matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+            scores = matrix @ embedding
+            best = int(np.argmax(scores))
+            if scores[best] < threshold:
+                return None
+            conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (time.time(), rows[best][0]))
+            conn.commit()
+            return rows[best][2], float(scores[best])
+
+    def put(self, key, embedding, answer, index_version):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?)",
+                (key, np.asarray(embedding, dtype=np.float32).tobytes(), answer, index_version, now, now),
+            )
+            conn.execute(
+                "DELETE FROM answers WHERE created <= ? OR key NOT IN "
+                "(SELECT key FROM answers ORDER BY last_used DESC LIMIT ?)",
+                (now - self.ttl, self.max_entries),
+            )
+            conn.commit()
+
+    def invalidate(self, index_versions):
+        versions = list(index_versions)
+        with self._lock:
+            conn = self._connection()
+            conn.execute(f"DELETE FROM answers WHERE index_version IN ({', '.join('?' * len(versions))})", versions)
+            conn.commit()
+
+
+class SemanticAnswerCache:
+    """Answer cache keyed on the query embedding.
+
+    A lookup hits when a stored query has cosine similarity >= threshold with
+    the new one and was answered against the same index version.
+
+    Index versions are content hashes with no order, so a version this cache
+    has not seen before is taken as the newer build: the cache moves to it and
+    drops what it holds for the versions it has moved past. Requests still
+    running on one of those older versions after a hot swap neither read nor
+    write entries. Only entries of versions this process moved past are
+    dropped, so a worker that swaps later than another sharing the same
+    backend does not wipe the other's newer entries.
+    """
+
+    def __init__(self, backend, threshold=0.95):
+        self.backend = backend
+        self.threshold = threshold
+        self.index_version = None
+        self.retired = set()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _check_version(self, index_version):
+        """Whether entries of index_version may be used, moving the cache to it when it is new."""
+        if index_version == self.index_version:
+            return True
+        with self._lock:
+            if index_version == self.index_version:
+                return True
+            if index_version in self.retired:
+                return False
+            if self.index_version is not None:
+                self.retired.add(self.index_version)
+                self.backend.invalidate(self.retired)
+            self.index_version = index_version
+            return True
+
+    def get(self, embedding, index_version):
+        found = None
+        if self._check_version(index_version):
+            found = self.backend.search(_unit(embedding), self.threshold, index_version)
+        with self._lock:
+            if found is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return found[0]
+
+    def put(self, query, embedding, answer, index_version):
+        if not self._check_version(index_version):
+            return
+        self.backend.put(normalize_query(query), _unit(embedding), answer, index_version)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hits / lookups if lookups else 0.0}
+
+
+def create_answer_cache(backend="memory", threshold=0.95, ttl=3600, max_entries=1024, path="answer_cache.sqlite3"):
+    """Build the cache from configuration, None when backend is "none"."""
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return SemanticAnswerCache(InMemoryAnswerBackend(max_entries=max_entries, ttl=ttl), threshold)
+    if backend == "sqlite":
+        return SemanticAnswerCache(SqliteAnswerBackend(path, max_entries=max_entries, ttl=ttl), threshold)
+    raise ValueError(f"Unknown answer cache backend: {backend}")
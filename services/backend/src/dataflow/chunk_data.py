@@ -1,6 +1,7 @@
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from datasets import load_dataset
 import os
+import shutil
 from langchain_community.vectorstores import FAISS
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.documents import Document
@@ -9,6 +10,9 @@ from dotenv import load_dotenv
 from google.cloud.storage import Client
 
 from store_data import upload_faiss_index_to_bucket
+from context import estimate_tokens
+from index_factory import build_partitions, rebuild_vector_store_index, save_index_params
+from lexical import BM25_FILE, build_bm25_index
 load_dotenv(override=True)
 BUCKET_NAME= os.getenv('BUCKET_NAME')
 from google.auth import default
@@ -26,6 +30,23 @@ except Exception:
     else:
         raise Exception("No credentials available")
 RAW_DATA_FOLDER= os.getenv('RAW_DATA_FOLDER')
+# FAISS_INDEX_TYPE: "Flat" (exact), "IVF" (nlist centroids, nprobe searched) or "HNSW" (graph, efSearch)
+# FAISS_VECTOR_STORAGE: "float32", "fp16", "sq8" (int8) or "pq" (FAISS_PQ_M bytes per vector);
+# FAISS_RERANK keeps the float32 vectors too and re-scores FAISS_RERANK_K_FACTOR * k candidates exactly
+INDEX_BUILD_PARAMS = dict(
+    index_type=os.getenv('FAISS_INDEX_TYPE', 'Flat'),
+    nlist=int(os.getenv('FAISS_NLIST', 0)) or None,
+    nprobe=int(os.getenv('FAISS_NPROBE', 16)),
+    hnsw_m=int(os.getenv('FAISS_HNSW_M', 32)),
+    ef_construction=int(os.getenv('FAISS_EF_CONSTRUCTION', 40)),
+    ef_search=int(os.getenv('FAISS_EF_SEARCH', 64)),
+    storage=os.getenv('FAISS_VECTOR_STORAGE', 'float32'),
+    pq_m=int(os.getenv('FAISS_PQ_M', 0)) or None,
+    rerank=os.getenv('FAISS_RERANK', 'false').lower() == 'true',
+    k_factor=int(os.getenv('FAISS_RERANK_K_FACTOR', 4)),
+)
+# one extra sub-index per source site (url host) that the backend can route queries to
+PARTITION_BY_SITE = os.getenv('FAISS_PARTITION_BY_SITE', 'true').lower() == 'true'
 def chunk_data():
     # Load all JSON files from a directory
     try:
@@ -43,8 +64,12 @@ def chunk_data():
                 metadata={"url": item['url'], "title": item['title']}
             )for item in dataset if "text" in item] 
 
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        # start_index lets the backend merge overlapping neighbours of one page exactly
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, add_start_index=True)
         all_splits = text_splitter.split_documents(docs)
+        # counted once here so context packing does not re-tokenize on every query
+        for split in all_splits:
+            split.metadata["token_count"] = estimate_tokens(split.page_content)
         # Initialize the embedding model
         model_name = "sentence-transformers/all-MiniLM-L6-v2"
         model_kwargs = {'device': 'cpu'}
@@ -52,12 +77,23 @@ def chunk_data():
         embeddings= HuggingFaceEmbeddings(model_name=model_name,
                                           model_kwargs=model_kwargs,
                                           encode_kwargs=encode_kwargs)
+        # from_documents already adds every split; adding them again stored each chunk twice
         vector_store = FAISS.from_documents(all_splits, embeddings)
-        # Convert documents into FAISS-compatible format
-        _ = vector_store.add_documents(documents=all_splits)
+        # start from an empty folder: partitions or files of an earlier build must not be uploaded with this one
+        shutil.rmtree('faiss_index', ignore_errors=True)
+        os.makedirs('faiss_index')
+        # per-site sub-indexes for query routing, built from the flat vectors before they are re-indexed
+        if PARTITION_BY_SITE:
+            build_partitions(vector_store, 'faiss_index', **INDEX_BUILD_PARAMS)
+        # from_documents always builds a flat index, re-index the same vectors into the configured type
+        index_params = rebuild_vector_store_index(vector_store, **INDEX_BUILD_PARAMS)
         # Save FAISS index
         vector_store.save_local('faiss_index')
-        upload_faiss_index_to_bucket()
+        # uploaded with the index; the backend applies its search knobs on load
+        save_index_params('faiss_index', index_params)
+        # BM25 over the same splits, position i is FAISS vector i; the backend fuses both rankings
+        build_bm25_index([split.page_content for split in all_splits], os.path.join('faiss_index', BM25_FILE))
+        upload_faiss_index_to_bucket(counts={"vectors": vector_store.index.ntotal})
         return 
     except Exception as e:
         raise Exception(e)
@@ -0,0 +1,142 @@
+# Context assembly between retrieval and the prompt.
+# chunk_data splits pages with chunk_overlap=200, so neighbouring hits from one
+# page repeat text; packing merges them, drops near-duplicates and caps the size.
+
+import re
+from langchain_core.documents import Document
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+# shortest shared text treated as chunk overlap when the index has no start_index metadata
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 400
+
+
+def estimate_tokens(text):
+    """Cheap tokenizer-free count: one token per word or punctuation mark.
+
+    chunk_data stores it as metadata["token_count"] at index time, packing only
+    counts the text it glues on when merging.
+    """
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def _token_count(doc):
+    count = doc.metadata.get("token_count")
+    return count if count is not None else estimate_tokens(doc.page_content)
+
+
+def _text_overlap(left, right):
+    """Length of the longest suffix of left that is a prefix of right."""
+    for size in range(min(len(left), len(right), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+class Passage:
+    """One or more overlapping chunks of the same page, merged into a contiguous span."""
+
+    def __init__(self, doc, rank):
+        self.rank = rank
+        self.url = doc.metadata.get("url")
+        self.metadata = dict(doc.metadata)
+        self.text = doc.page_content
+        self.tokens = _token_count(doc)
+        self.start = doc.metadata.get("start_index")
+        self.end = None if self.start is None else self.start + len(self.text)
+
+    def merge(self, doc):
+        """Glue doc onto this span if they overlap or touch; returns False if they are disjoint."""
+        if doc.metadata.get("url") != self.url:
+            return False
+        text = doc.page_content
+        start = doc.metadata.get("start_index")
+        if self.start is not None and start is not None:
+            end = start + len(text)
+            if start > self.end or end < self.start:
+                return False
+            if start < self.start:
+                prefix = text[:self.start - start]
+                self.text = prefix + self.text
+                self.tokens += estimate_tokens(prefix)
+                self.start = start
+            if end > self.end:
+                suffix = text[self.end - start:]
+                self.text += suffix
+                self.tokens += estimate_tokens(suffix)
+                self.end = end
+            return True
+        if text in self.text:
+            return True
+        overlap = _text_overlap(self.text, text)
+        if overlap:
+            suffix = text[overlap:]
+            self.text += suffix
+            self.tokens += estimate_tokens(suffix)
+            return True
+        overlap = _text_overlap(text, self.text)
+        if overlap:
+            prefix = text[:-overlap]
+            self.text = prefix + self.text
+            self.tokens += estimate_tokens(prefix)
+            return True
+        return False
+
+    def words(self):
+        return set(self.text.lower().split())
+
+    def to_document(self):
+        metadata = {**self.metadata, "token_count": self.tokens}
+        if self.start is not None:
+            metadata["start_index"] = self.start
+        return Document(page_content=self.text, metadata=metadata)
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def pack_context(docs, token_budget=None, dedup_threshold=0.9):
+    """Turn ranked chunks into the passages that go into the prompt.
+
+    Chunks of the same URL that overlap are merged into one passage ranked at
+    its best chunk. Passages whose word sets have Jaccard similarity >=
+    dedup_threshold with a better ranked one are dropped. The rest fill
+    token_budget in rank order, skipping those that no longer fit; the best
+    passage is always kept. Returns (documents, stats).
+    """
+    passages = []
+    for rank, doc in enumerate(docs):
+        target = next((passage for passage in passages if passage.merge(doc)), None)
+        if target is None:
+            passages.append(Passage(doc, rank))
+            continue
+        # the grown span can bridge the gap to another passage of the same page
+        for other in [passage for passage in passages if passage is not target]:
+            if target.merge(other.to_document()):
+                target.rank = min(target.rank, other.rank)
+                passages.remove(other)
+    passages.sort(key=lambda passage: passage.rank)
+
+    kept, kept_words = [], []
+    for passage in passages:
+        words = passage.words()
+        if any(_jaccard(words, other) >= dedup_threshold for other in kept_words):
+            continue
+        kept.append(passage)
+        kept_words.append(words)
+
+    packed, used = [], 0
+    for passage in kept:
+        if token_budget and packed and used + passage.tokens > token_budget:
+            continue
+        packed.append(passage)
+        used += passage.tokens
+
+    stats = {
+        "chunks": len(docs),
+        "passages": len(packed),
+        "tokens_in": sum(_token_count(doc) for doc in docs),
+        "tokens_out": used,
+    }
+    return [passage.to_document() for passage in packed], stats
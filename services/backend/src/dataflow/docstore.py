@@ -0,0 +1,111 @@
+import glob
+import json
+import os
+import pickle
+import sqlite3
+import threading
+from langchain_core.documents import Document
+
+DOCSTORE_PATTERN = "docstore-*.sqlite3"
+
+
+def docstore_path(pkl_path):
+    """SQLite file for this exact index.pkl.
+
+    Named after the pickle's mtime and size, so a synced new index gets a new
+    file and an older index that is still serving requests keeps reading its own.
+    """
+    stat = os.stat(pkl_path)
+    return os.path.join(os.path.dirname(pkl_path), f"docstore-{stat.st_mtime_ns}-{stat.st_size}.sqlite3")
+
+
+def remove_stale_docstores(folder, keep=2):
+    """Delete all but the keep newest converted docstores (current index plus the one being swapped out)."""
+    def mtime(path):
+        try:
+            return os.path.getmtime(path)
+        except FileNotFoundError:
+            return 0
+
+    paths = sorted(glob.glob(os.path.join(folder, DOCSTORE_PATTERN)), key=mtime, reverse=True)
+    for path in paths[keep:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # another worker cleaned up first
+            pass
+
+
+class SqliteDocstore:
+    """Read-only, file-backed replacement for the pickled InMemoryDocstore.
+
+    Chunks are read from SQLite on demand, so every worker shares the file
+    through the OS page cache instead of holding its own unpickled copy.
+    Implements the docstore.search(id) interface langchain's FAISS uses.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        # one connection per thread and process; sqlite connections must not cross a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def search(self, search):
+        row = self._connection().execute(
+            "SELECT page_content, metadata FROM docs WHERE doc_id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+
+class SqliteIdMap:
+    """FAISS position -> docstore id, read from the same SQLite file."""
+
+    def __init__(self, docstore):
+        self.docstore = docstore
+
+    def __getitem__(self, position):
+        row = self.docstore._connection().execute(
+            "SELECT doc_id FROM docs WHERE position = ?", (int(position),)).fetchone()
+        if row is None:
+            raise KeyError(position)
+        return row[0]
+
+    def get(self, position, default=None):
+        try:
+            return self[position]
+        except KeyError:
+            return default
+
+    def __len__(self):
+        return len(self.docstore)
+
+
+def convert_pickle_docstore(pkl_path, sqlite_path):
+    """Write the (docstore, index_to_docstore_id) pickle saved by FAISS.save_local into SQLite.
+
+    The file is built under a temporary name and renamed into place, so
+    workers racing on the first start never read a half-written store.
+    """
+    with open(pkl_path, "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    tmp_path = f"{sqlite_path}.{os.getpid()}.tmp"
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("CREATE TABLE docs (position INTEGER PRIMARY KEY, doc_id TEXT UNIQUE, page_content TEXT, metadata TEXT)")
+    conn.executemany(
+        "INSERT INTO docs VALUES (?, ?, ?, ?)",
+        ((position, doc_id, docstore._dict[doc_id].page_content, json.dumps(docstore._dict[doc_id].metadata))
+         for position, doc_id in index_to_docstore_id.items()),
+    )
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, sqlite_path)
@@ -0,0 +1,97 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from langchain_core.embeddings import Embeddings
+from src.utils.deadline import DeadlineExceeded, remaining
+
+
+class BatchingEmbeddings(Embeddings):
+    """Merges concurrent embed_query calls into one embed_documents call.
+
+    Each caller queues its text and blocks on a future. A single worker thread
+    takes the first queued text and, when others are already queued behind it,
+    collects whatever else arrives within max_wait_ms (up to max_batch_size
+    texts), encodes them in one batch and hands every caller its own vector.
+    A lone text is encoded at once, so a single client never pays the window.
+    Texts that queue up while a batch is being encoded go into the next batch
+    without waiting.
+
+    A caller waits at most timeout seconds, or until its request deadline if
+    that is sooner, then raises DeadlineExceeded; its text is dropped if the
+    worker has not reached it yet.
+    """
+
+    def __init__(self, embeddings, max_batch_size=32, max_wait_ms=2, timeout=30):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.timeout = timeout
+        self.batches = 0
+        self.batched_queries = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+
+    def _ensure_worker(self):
+        # threads do not survive a fork, so gunicorn workers start their own
+        if self._worker is None or self._pid != os.getpid():
+            with self._lock:
+                if self._worker is None or self._pid != os.getpid():
+                    self._queue = queue.Queue()
+                    self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._pid = os.getpid()
+                    self._worker.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        if self._queue.empty():
+            # no concurrent callers: waiting for more would only add latency
+            return batch
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # callers that gave up (cancelled their future) are left out
+            batch = [(text, future) for text, future in self._collect() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                vectors = self.embeddings.embed_documents([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.batched_queries += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def embed_query(self, text):
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future))
+        try:
+            return future.result(timeout=max(0.0, min(self.timeout, remaining(self.timeout))))
+        except FutureTimeout:
+            future.cancel()
+            raise DeadlineExceeded("Query embedding did not finish within the request deadline") from None
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "queries": self.batched_queries,
+            "mean_batch_size": self.batched_queries / self.batches if self.batches else 0.0,
+        }
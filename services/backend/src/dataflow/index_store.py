@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from src.utils.local_bucket import LocalBucket, file_md5
+
+MANIFEST_FILE = ".manifest.json"
+# written by the Prefect upload after every other file of a build: filename -> md5_hash/size, plus counts
+BUILD_MANIFEST_FILE = "build_manifest.json"
+
+
+def get_bucket():
+    """GCS bucket BUCKET_NAME, or a local directory when LOCAL_BUCKET_DIR is set."""
+    local_bucket_dir = os.getenv('LOCAL_BUCKET_DIR')
+    if local_bucket_dir:
+        return LocalBucket(local_bucket_dir)
+    from google.cloud.storage import Client
+    return Client().bucket(os.getenv('BUCKET_NAME'))
+
+
+def remote_manifest(bucket, prefix):
+    """filename -> {name, generation, md5_hash, size} for every blob under prefix."""
+    manifest = {}
+    for blob in bucket.list_blobs(prefix=prefix):
+        filename = os.path.basename(blob.name)
+        if not filename:
+            continue
+        manifest[filename] = {"name": blob.name, "generation": blob.generation,
+                              "md5_hash": blob.md5_hash, "size": blob.size}
+    return manifest
+
+
+def build_files(bucket, remote):
+    """The entries of remote that belong to the build described by its BUILD_MANIFEST_FILE.
+
+    The Prefect flow uploads the manifest last, so until a new upload is
+    complete the listed files do not all match it. Raises IOError in that
+    case; blobs the manifest does not list (left over from older builds) are
+    left out. Buckets without a manifest are returned as they are.
+    """
+    if BUILD_MANIFEST_FILE not in remote:
+        return remote
+    build = json.loads(bucket.blob(remote[BUILD_MANIFEST_FILE]["name"]).download_as_text())
+    files = {BUILD_MANIFEST_FILE: remote[BUILD_MANIFEST_FILE]}
+    for filename, expected in build["files"].items():
+        meta = remote.get(filename)
+        if meta is None or meta["size"] != expected["size"] or (
+                meta["md5_hash"] is not None and meta["md5_hash"] != expected["md5_hash"]):
+            raise IOError(f"Index upload in progress: {filename} does not match {BUILD_MANIFEST_FILE}")
+        files[filename] = meta
+    return files
+
+
+def read_build_manifest(local_dir):
+    """The synced BUILD_MANIFEST_FILE, {} for an index uploaded without one."""
+    try:
+        with open(os.path.join(local_dir, BUILD_MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def check_index_counts(vector_store, lexical=None, partitions=None, counts=None):
+    """Raise ValueError unless the index files loaded together describe the same chunks.
+
+    The FAISS index, its docstore, the BM25 index and the site partitions are
+    separate files; a mix of two builds loads fine but maps hits to the wrong
+    chunks. counts is the "counts" entry of the build manifest.
+    """
+    ntotal = vector_store.index.ntotal
+    found = {"docstore": len(vector_store.index_to_docstore_id)}
+    if lexical is not None:
+        found["bm25"] = len(lexical)
+    if partitions is not None:
+        found["partitions"] = partitions.ntotal
+    if counts and "vectors" in counts:
+        found[BUILD_MANIFEST_FILE] = counts["vectors"]
+    mismatched = {name: count for name, count in found.items() if count != ntotal}
+    if mismatched:
+        raise ValueError(f"Index files are from different builds: {ntotal} vectors, but {mismatched}")
+
+
+def manifest_version(manifest):
+    """Stable id of an index build, derived from the remote MD5s without reading any file."""
+    digest = hashlib.md5()
+    for filename in sorted(manifest):
+        meta = manifest[filename]
+        digest.update(f"{filename}:{meta['md5_hash'] or meta['generation']}\n".encode())
+    return digest.hexdigest()
+
+
+def read_manifest(local_dir):
+    try:
+        with open(os.path.join(local_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def write_manifest(local_dir, manifest):
+    # per-process temp name: every gunicorn worker's index watcher may sync the same folder
+    tmp_path = os.path.join(local_dir, f"{MANIFEST_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(local_dir, MANIFEST_FILE))
+
+
+def _is_current(local_dir, filename, remote, local):
+    path = os.path.join(local_dir, filename)
+    if not os.path.isfile(path):
+        return False
+    if local.get(filename) == remote:
+        return True
+    # no manifest entry yet (e.g. first run after an upgrade): trust the file if its content matches
+    return (remote["md5_hash"] is not None and os.path.getsize(path) == remote["size"]
+            and file_md5(path) == remote["md5_hash"])
+
+
+def sync_index(bucket, prefix, local_dir, workers=8):
+    """Make local_dir an exact copy of the blobs under prefix, downloading only what changed.
+
+    Changed files are downloaded in parallel into a temporary directory inside
+    local_dir (same filesystem, so the rename is atomic), checked against their
+    MD5 and only then renamed into place. An interrupted or corrupt download
+    never replaces a good file. When the bucket has a build manifest only the
+    files it lists are synced, and nothing is while its upload is incomplete
+    (see build_files). Returns (manifest, downloaded filenames).
+    """
+    os.makedirs(local_dir, exist_ok=True)
+    remote = build_files(bucket, remote_manifest(bucket, prefix))
+    local = read_manifest(local_dir)
+    changed = [filename for filename, meta in remote.items() if not _is_current(local_dir, filename, meta, local)]
+
+    if changed:
+        tmp_dir = tempfile.mkdtemp(prefix=".download-", dir=local_dir)
+        try:
+            def download(filename):
+                tmp_path = os.path.join(tmp_dir, filename)
+                bucket.blob(remote[filename]["name"]).download_to_filename(tmp_path)
+                # composite objects have no MD5, their generation is all we can compare
+                expected_md5 = remote[filename]["md5_hash"]
+                if expected_md5 is not None and file_md5(tmp_path) != expected_md5:
+                    raise IOError(f"MD5 mismatch for {remote[filename]['name']}")
+                return filename
+
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(download, changed))
+            for filename in changed:
+                os.replace(os.path.join(tmp_dir, filename), os.path.join(local_dir, filename))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    for filename in set(local) - set(remote):
+        # removed from the bucket since the last sync
+        path = os.path.join(local_dir, filename)
+        if os.path.isfile(path):
+            os.remove(path)
+    write_manifest(local_dir, remote)
+    return remote, changed
+
+
+def load_vector_store(folder, embeddings, mode="mmap", search_params=None):
+    """Load the FAISS index saved by FAISS.save_local in folder.
+
+    mode "memory" reads index.faiss and unpickles index.pkl into every process.
+    mode "mmap" memory-maps the vectors read-only and serves chunks from a
+    SQLite copy of the docstore. Both live in the OS page cache, so gunicorn
+    workers on one host share a single copy instead of one each.
+    The search knobs chunk_data saved in index_params.json (nprobe, efSearch)
+    are applied, with values in search_params taking precedence.
+    """
+    from src.dataflow.index_factory import apply_search_params, read_index_params
+    vector_store = _load_vector_store(folder, embeddings, mode)
+    saved = read_index_params(folder).get("search", {})
+    # overrides only apply to knobs this index type has (no nprobe on HNSW or Flat)
+    apply_search_params(vector_store.index, {name: (search_params or {}).get(name, value) for name, value in saved.items()})
+    return vector_store
+
+
+def _load_vector_store(folder, embeddings, mode):
+    from langchain_community.vectorstores import FAISS
+    if mode == "memory":
+        return FAISS.load_local(folder, embeddings, allow_dangerous_deserialization=True)
+    if mode != "mmap":
+        raise ValueError(f"Unknown index load mode: {mode}")
+
+    import faiss
+    from src.dataflow.docstore import (SqliteDocstore, SqliteIdMap, convert_pickle_docstore, docstore_path,
+                                       remove_stale_docstores)
+    pkl_path = os.path.join(folder, "index.pkl")
+    sqlite_path = docstore_path(pkl_path)
+    # converted once per index.pkl that sync_index brings in
+    if not os.path.isfile(sqlite_path):
+        convert_pickle_docstore(pkl_path, sqlite_path)
+        remove_stale_docstores(folder)
+    # a later sync renames a new index.faiss over this one, the mapping keeps the old file alive
+    index = faiss.read_index(os.path.join(folder, "index.faiss"), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    docstore = SqliteDocstore(sqlite_path)
+    return FAISS(embeddings, index, docstore, SqliteIdMap(docstore))
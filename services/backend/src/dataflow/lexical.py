@@ -0,0 +1,159 @@
+# BM25 inverted index over the chunks, built by chunk_data next to the FAISS files.
+# A copy lives in prefectWorkflows/dataflow/lexical.py, keep both in sync.
+
+import hashlib
+import json
+import mmap
+import os
+import re
+from collections import Counter
+import numpy as np
+
+BM25_FILE = "bm25.idx"
+MAGIC = b"BM25IDX1"
+TOKEN_PATTERN = re.compile(r"[a-z]+|\d+")
+# course codes are written both "CS 5200" and "CS5200", index and query both forms as "cs5200"
+SUBJECT_PATTERN = re.compile(r"^[a-z]{2,4}$")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do for from has have how i if in is it its my not of on or our so that the "
+    "their there these this to was we what when where which who will with you your".split())
+
+
+def tokenize(text):
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    terms = [token for token in tokens if token not in STOPWORDS]
+    terms += [a + b for a, b in zip(tokens, tokens[1:]) if b.isdigit() and SUBJECT_PATTERN.match(a)]
+    return terms
+
+
+def term_hash(term):
+    """64-bit id of a term; the file stores hashes instead of strings so lookups are one binary search."""
+    return int.from_bytes(hashlib.blake2b(term.encode(), digest_size=8).digest(), "little")
+
+
+def build_bm25_index(texts, path, k1=1.2, b=0.75):
+    """Write a BM25 index over texts to path; document i is position i in the FAISS index.
+
+    Each posting stores its precomputed BM25 weight (idf times the saturated,
+    length-normalized term frequency), so a query only sums postings. Postings
+    are sorted by weight, best first, so search can stop early on common terms;
+    the header's "sorted" flag records that.
+    """
+    postings = {}
+    lengths = np.zeros(len(texts), dtype=np.float32)
+    for position, text in enumerate(texts):
+        counts = Counter(tokenize(text))
+        lengths[position] = sum(counts.values())
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((position, tf))
+    avgdl = float(lengths.mean()) if len(texts) else 0.0
+    hashes = sorted((term_hash(term), term) for term in postings)
+    offsets = np.zeros(len(hashes) + 1, dtype=np.int64)
+    docs, weights = [], []
+    for i, (_, term) in enumerate(hashes):
+        positions, tfs = map(np.asarray, zip(*postings[term]))
+        idf = np.log(1 + (len(texts) - len(positions) + 0.5) / (len(positions) + 0.5))
+        norm = k1 * (1 - b + b * lengths[positions] / (avgdl or 1))
+        weight = idf * tfs * (k1 + 1) / (tfs + norm)
+        order = np.argsort(-weight, kind="stable")
+        docs.append(positions[order].astype(np.int32))
+        weights.append(weight[order].astype(np.float32))
+        offsets[i + 1] = offsets[i] + len(positions)
+    arrays = {
+        "term_hashes": np.array([h for h, _ in hashes], dtype=np.uint64),
+        "offsets": offsets,
+        "docs": np.concatenate(docs) if docs else np.zeros(0, dtype=np.int32),
+        "weights": np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32),
+    }
+    _write(path, {"documents": len(texts), "avgdl": avgdl, "k1": k1, "b": b, "sorted": True}, arrays)
+
+
+def _write(path, meta, arrays):
+    """MAGIC, 8-byte header length, JSON header, then the arrays 8-byte aligned at the offsets the header lists."""
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = {"dtype": array.dtype.str, "count": len(array), "offset": offset}
+        offset += -(-array.nbytes // 8) * 8
+    header = json.dumps({**meta, "arrays": layout}).encode()
+    header += b" " * (-(len(MAGIC) + 8 + len(header)) % 8)
+    start = len(MAGIC) + 8 + len(header)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + len(header).to_bytes(8, "little") + header)
+        for name, array in arrays.items():
+            f.seek(start + layout[name]["offset"])
+            f.write(array.tobytes())
+        f.truncate(start + offset)
+    os.replace(tmp_path, path)
+
+
+class Bm25Index:
+    """Read-only BM25 index memory-mapped from a file written by build_bm25_index.
+
+    Opening reads only the header; posting pages are faulted in by the OS as
+    queries touch them and are shared by every worker on the host. The mapping
+    keeps the opened file alive after a newer index is renamed over it.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a BM25 index")
+        header_length = int.from_bytes(self._mmap[len(MAGIC):len(MAGIC) + 8], "little")
+        start = len(MAGIC) + 8
+        self.meta = json.loads(self._mmap[start:start + header_length])
+        start += header_length
+        for name, spec in self.meta.pop("arrays").items():
+            setattr(self, name, np.frombuffer(self._mmap, dtype=spec["dtype"], count=spec["count"],
+                                              offset=start + spec["offset"]))
+
+    def __len__(self):
+        return self.meta["documents"]
+
+    def search(self, text, k=10, max_postings=1000):
+        """Positions of the k best-scoring documents for text, best first.
+
+        Only the max_postings highest-weighted postings of each term are read.
+        Terms with more postings than that are common, so their idf and their
+        share of any score is small. Cutting them keeps a lookup bounded
+        however frequent the query words are. An index written before postings
+        were sorted (no "sorted" flag in its header) is read in full.
+        """
+        hashes = np.array(sorted({term_hash(term) for term in tokenize(text)}), dtype=np.uint64)
+        if not len(hashes) or not len(self.term_hashes):
+            return []
+        slots = np.minimum(np.searchsorted(self.term_hashes, hashes), len(self.term_hashes) - 1)
+        slots = slots[self.term_hashes[slots] == hashes]
+        if not len(slots):
+            return []
+        if not self.meta.get("sorted"):
+            # postings in document order: a cut would keep the first documents, not the best ones
+            max_postings = None
+        bounds = [(self.offsets[slot], self.offsets[slot + 1] if max_postings is None
+                   else min(self.offsets[slot + 1], self.offsets[slot] + max_postings)) for slot in slots]
+        docs = np.concatenate([self.docs[lo:hi] for lo, hi in bounds])
+        weights = np.concatenate([self.weights[lo:hi] for lo, hi in bounds])
+        unique, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+        if len(unique) > k:
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(unique))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return unique[top].tolist()
+
+
+def open_bm25_index(folder):
+    """Bm25Index in folder, None for indexes published before chunk_data built one."""
+    path = os.path.join(folder, BM25_FILE)
+    return Bm25Index(path) if os.path.isfile(path) else None
+
+
+def reciprocal_rank_fusion(rankings, k=10, constant=60):
+    """Merge ranked id lists: each id scores sum(1 / (constant + rank)), ties keep first-seen order."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (constant + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
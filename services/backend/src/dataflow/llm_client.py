@@ -0,0 +1,442 @@
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Optional
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+from src.utils.deadline import DeadlineExceeded, remaining
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+_ROLES = {"human": "user", "ai": "assistant", "system": "system", "tool": "tool"}
+_DONE = object()
+
+_clients = {}
+_clients_lock = threading.Lock()
+# event loop -> {base_url: cycle of AsyncClients}; an async pool only works on the loop that opened its connections
+_async_clients = weakref.WeakKeyDictionary()
+# httpcore's async pool scans all of its connections on every request, so its CPU cost grows with the square of the
+# connections in use; hundreds of concurrent calls are spread over pools of at most this many connections instead
+ASYNC_POOL_SIZE = 16
+
+
+def _client_options(headers, max_connections, max_keepalive, timeout):
+    return {"headers": headers,
+            "limits": httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+            "timeout": httpx.Timeout(timeout, connect=min(timeout, 5.0))}
+
+
+def shared_http_client(base_url="", headers=None, max_connections=20, max_keepalive=10, timeout=60.0):
+    """One keep-alive connection pool per process and base_url (pools do not survive a fork)."""
+    key = (os.getpid(), base_url)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = httpx.Client(base_url=base_url, **_client_options(headers, max_connections,
+                                                                                        max_keepalive, timeout))
+        return client
+
+
+def shared_async_http_client(base_url="", headers=None, max_connections=20, max_keepalive=10, timeout=60.0):
+    """shared_http_client for coroutines: max_connections per running event loop and base_url, in ASYNC_POOL_SIZE pools."""
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    pools = clients.get(base_url)
+    if pools is None:
+        n = -(-max_connections // ASYNC_POOL_SIZE)
+        options = _client_options(headers, -(-max_connections // n), -(-max_keepalive // n), timeout)
+        pools = clients[base_url] = itertools.cycle([httpx.AsyncClient(base_url=base_url, **options) for _ in range(n)])
+    return next(pools)
+
+
+async def _next_chunk(stream):
+    """Next item of an async iterator, None at its end; anext(stream, None) needs Python 3.10."""
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+def _is_retryable(error):
+    if isinstance(error, DeadlineExceeded):
+        return False
+    if isinstance(error, (httpx.TransportError, TimeoutError, ConnectionError)):
+        return True
+    status = getattr(getattr(error, "response", None), "status_code", None) or getattr(error, "status_code", None)
+    return status in RETRYABLE_STATUS
+
+
+class HttpChatModel(BaseChatModel):
+    """Chat model for an OpenAI/Mistral-compatible /chat/completions endpoint over the shared connection pool.
+
+    Each request's timeout is the smaller of timeout and what is left of the
+    current deadline, so an abandoned attempt does not outlive the request.
+    """
+
+    endpoint: str
+    model: str
+    api_key: Optional[str] = None
+    temperature: Optional[float] = None
+    timeout: float = 60.0
+    max_connections: int = 20
+
+    @property
+    def _llm_type(self):
+        return "http-chat"
+
+    def _client(self, factory=shared_http_client):
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else None
+        return factory(self.endpoint.rstrip("/"), headers=headers, max_connections=self.max_connections,
+                       max_keepalive=self.max_connections, timeout=self.timeout)
+
+    def _payload(self, messages, stop, stream):
+        payload = {"model": self.model, "stream": stream,
+                   "messages": [{"role": _ROLES.get(m.type, "user"), "content": m.content} for m in messages]}
+        if self.temperature is not None:
+            payload["temperature"] = self.temperature
+        if stop:
+            payload["stop"] = stop
+        return payload
+
+    def _request_timeout(self):
+        left = remaining(self.timeout)
+        if left <= 0:
+            raise DeadlineExceeded("Request deadline passed before the LLM call")
+        return min(self.timeout, left)
+
+    @staticmethod
+    def _result(response):
+        response.raise_for_status()
+        body = response.json()
+        message = AIMessage(content=body["choices"][0]["message"]["content"],
+                            response_metadata={"model": body.get("model"), "usage": body.get("usage")})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    @staticmethod
+    def _chunk(line):
+        """The content chunk of one SSE line, None for other lines, _DONE at the end of the stream."""
+        if not line.startswith("data:"):
+            return None
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return _DONE
+        content = json.loads(data)["choices"][0]["delta"].get("content")
+        return ChatGenerationChunk(message=AIMessageChunk(content=content)) if content else None
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return self._result(self._client().post("/chat/completions", json=self._payload(messages, stop, False),
+                                                timeout=self._request_timeout()))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        client = self._client(shared_async_http_client)
+        return self._result(await client.post("/chat/completions", json=self._payload(messages, stop, False),
+                                              timeout=self._request_timeout()))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        with self._client().stream("POST", "/chat/completions", json=self._payload(messages, stop, True),
+                                   timeout=self._request_timeout()) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                chunk = self._chunk(line)
+                if chunk is _DONE:
+                    break
+                if chunk is not None:
+                    if run_manager:
+                        run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                    yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        client = self._client(shared_async_http_client)
+        async with client.stream("POST", "/chat/completions", json=self._payload(messages, stop, True),
+                                 timeout=self._request_timeout()) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                chunk = self._chunk(line)
+                if chunk is _DONE:
+                    break
+                if chunk is not None:
+                    if run_manager:
+                        await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                    yield chunk
+
+
+class LatencyWindow:
+    """Recent successful call latencies, for the hedging delay."""
+
+    def __init__(self, size=200, min_samples=20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p):
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+class ResilientChatModel(BaseChatModel):
+    """Wraps a chat model with a per-request deadline, jittered retries and optional hedging.
+
+    Each attempt runs on a shared thread pool, so the request thread stops
+    waiting at the deadline even when the upstream call hangs. Failed
+    attempts with a retryable error (timeouts, connection errors, 429/5xx)
+    are retried after a full-jitter exponential backoff, as long as the
+    deadline leaves room. With hedge on, a second identical request is sent
+    when the first has not answered after the p95 of recent latencies, and
+    whichever answers first wins.
+
+    ainvoke/astream apply the same policy with tasks on the caller's event
+    loop instead of pool threads; a losing or late async attempt is cancelled.
+    """
+
+    inner: BaseChatModel
+    timeout: float = 30.0
+    max_retries: int = 2
+    backoff_base: float = 0.2
+    backoff_max: float = 2.0
+    hedge: bool = False
+    hedge_percentile: float = 0.95
+    hedge_min_delay: float = 0.05
+    pool_size: int = 16
+
+    _latency: LatencyWindow = PrivateAttr(default_factory=LatencyWindow)
+    _counts: dict = PrivateAttr(default_factory=lambda: {"calls": 0, "attempts": 0, "retries": 0, "hedges": 0,
+                                                          "hedge_wins": 0, "deadline_exceeded": 0, "errors": 0})
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _pool: Any = PrivateAttr(default=None)
+    _pool_pid: Any = PrivateAttr(default=None)
+
+    @property
+    def _llm_type(self):
+        return f"resilient-{self.inner._llm_type}"
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="llm")
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _submit(self, fn, record):
+        # the attempt sees this request's deadline (and tracking trace) in the pool thread
+        context = contextvars.copy_context()
+        started = time.monotonic()
+
+        def run():
+            result = context.run(fn)
+            if record:
+                self._latency.add(time.monotonic() - started)
+            return result
+        self._count("attempts")
+        return self._executor().submit(run)
+
+    def _hedge_delay(self):
+        if not self.hedge:
+            return None
+        p = self._latency.percentile(self.hedge_percentile)
+        return None if p is None else max(p, self.hedge_min_delay)
+
+    def _attempt(self, fn, until, hedge):
+        """One attempt, hedged if enabled; returns fn's result or raises its error or DeadlineExceeded."""
+        futures = [self._submit(fn, record=hedge)]
+        hedge_delay = self._hedge_delay() if hedge else None
+        if hedge_delay is not None and until - time.monotonic() > hedge_delay:
+            done, _ = wait(futures, timeout=hedge_delay)
+            if not done:
+                futures.append(self._submit(fn, record=True))
+                self._count("hedges")
+        pending, error = set(futures), None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, until - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        if error is not None and not pending:
+            raise error
+        raise DeadlineExceeded("LLM call did not finish within the request deadline")
+
+    def _until(self):
+        """monotonic() by which a call must finish: timeout from now, or the request deadline if that is sooner."""
+        return time.monotonic() + min(self.timeout, remaining(self.timeout))
+
+    def _with_policy(self, fn, hedge=True, until=None):
+        until = self._until() if until is None else until
+        self._count("calls")
+        attempt = 0
+        while True:
+            try:
+                if until <= time.monotonic():
+                    raise DeadlineExceeded("Request deadline passed before the LLM call")
+                return self._attempt(fn, until, hedge)
+            except Exception as e:
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                if not _is_retryable(e) or attempt >= self.max_retries or time.monotonic() + delay >= until:
+                    self._count("deadline_exceeded" if isinstance(e, DeadlineExceeded) else "errors")
+                    raise
+            self._count("retries")
+            attempt += 1
+            time.sleep(delay)
+
+    def _spawn(self, make_coroutine, record):
+        # a task copies the current context, so the attempt sees this request's deadline
+        started = time.monotonic()
+
+        async def run():
+            result = await make_coroutine()
+            if record:
+                self._latency.add(time.monotonic() - started)
+            return result
+        self._count("attempts")
+        return asyncio.ensure_future(run())
+
+    async def _aattempt(self, make_coroutine, until, hedge):
+        """_attempt on the event loop; attempts still running when it returns are cancelled."""
+        tasks = [self._spawn(make_coroutine, record=hedge)]
+        pending, error = set(tasks), None
+        try:
+            hedge_delay = self._hedge_delay() if hedge else None
+            if hedge_delay is not None and until - time.monotonic() > hedge_delay:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+                if not done:
+                    tasks.append(self._spawn(make_coroutine, record=True))
+                    pending.add(tasks[-1])
+                    self._count("hedges")
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, until - time.monotonic()),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        if error is not None and not pending:
+            raise error
+        raise DeadlineExceeded("LLM call did not finish within the request deadline")
+
+    async def _awith_policy(self, make_coroutine, hedge=True, until=None):
+        until = self._until() if until is None else until
+        self._count("calls")
+        attempt = 0
+        while True:
+            try:
+                if until <= time.monotonic():
+                    raise DeadlineExceeded("Request deadline passed before the LLM call")
+                return await self._aattempt(make_coroutine, until, hedge)
+            except Exception as e:
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                if not _is_retryable(e) or attempt >= self.max_retries or time.monotonic() + delay >= until:
+                    self._count("deadline_exceeded" if isinstance(e, DeadlineExceeded) else "errors")
+                    raise
+            self._count("retries")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return self._with_policy(lambda: self.inner._generate(messages, stop=stop, **kwargs))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        return await self._awith_policy(lambda: self.inner._agenerate(messages, stop=stop, **kwargs))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        # retried only until the first token, never hedged: a stream cannot be resumed or cheaply duplicated.
+        # Chunks are read in the pool so the deadline also covers a stream that stalls after its first token;
+        # a stream given up on is closed (with its connection) as soon as the read in progress returns.
+        until = self._until()
+        streams, abandoned = [], threading.Event()
+
+        def read(stream):
+            chunk = next(stream, None)
+            if abandoned.is_set():
+                stream.close()
+            return chunk
+
+        def first_chunk():
+            stream = self.inner._stream(messages, stop=stop, **kwargs)
+            streams.append(stream)
+            return stream, read(stream)
+
+        try:
+            stream, chunk = self._with_policy(first_chunk, hedge=False, until=until)
+            while chunk is not None:
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+                future = self._executor().submit(contextvars.copy_context().run, read, stream)
+                done, _ = wait([future], timeout=max(0.0, until - time.monotonic()))
+                if not done:
+                    self._count("deadline_exceeded")
+                    raise DeadlineExceeded("LLM stream did not finish within the request deadline")
+                chunk = future.result()
+        finally:
+            abandoned.set()
+            for stream in streams:
+                try:
+                    stream.close()
+                except ValueError:
+                    # still reading in a pool thread, read() closes it when the chunk arrives
+                    pass
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        until = self._until()
+        streams = []
+
+        async def first_chunk():
+            stream = self.inner._astream(messages, stop=stop, **kwargs)
+            streams.append(stream)
+            return stream, await _next_chunk(stream)
+
+        try:
+            stream, chunk = await self._awith_policy(first_chunk, hedge=False, until=until)
+            while chunk is not None:
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+                try:
+                    chunk = await asyncio.wait_for(_next_chunk(stream), max(0.0, until - time.monotonic()))
+                except asyncio.TimeoutError:
+                    self._count("deadline_exceeded")
+                    raise DeadlineExceeded("LLM stream did not finish within the request deadline") from None
+        finally:
+            for stream in streams:
+                try:
+                    await stream.aclose()
+                except RuntimeError:
+                    # a first-chunk attempt that was just cancelled; the cancellation closes it
+                    pass
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counts)
+        p95 = self._latency.percentile(0.95)
+        stats["latency_p95_ms"] = None if p95 is None else round(p95 * 1000, 1)
+        return stats
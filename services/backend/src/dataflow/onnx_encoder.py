@@ -0,0 +1,100 @@
+"""all-MiniLM-L6-v2 on ONNX Runtime, an int8 alternative to the PyTorch query encoder.
+
+Export once (this part needs torch, transformers, onnx and onnxruntime):
+    python -m src.dataflow.onnx_encoder --output onnx_encoder
+
+Then serve with EMBEDDING_BACKEND=onnx ONNX_ENCODER_DIR=onnx_encoder. Serving
+only imports onnxruntime, tokenizers and numpy, never torch. The vectors match
+HuggingFaceEmbeddings (mean pooling over the attention mask, L2 normalised),
+so the existing FAISS index is used as is.
+"""
+import argparse
+import json
+import os
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+MODEL_FILE = "model.int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+CONFIG_FILE = "encoder.json"
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence-transformers style encoder over an ONNX model exported by export_onnx_encoder."""
+
+    def __init__(self, folder, threads=None, batch_size=32):
+        import onnxruntime
+        from tokenizers import Tokenizer
+        with open(os.path.join(folder, CONFIG_FILE)) as f:
+            self.config = json.load(f)
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(os.path.join(folder, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_id"], pad_token=self.config["pad_token"])
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(os.path.join(folder, self.config["model_file"]), options,
+                                                    providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _encode(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask,
+                 "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64)}
+        hidden = self.session.run(None, {name: feeds[name] for name in self.input_names})[0]
+        # mean over real tokens, then unit length, as the sentence-transformers pooling + normalize modules do
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if self.config.get("normalize", True):
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled
+
+    def embed_documents(self, texts):
+        vectors = [self._encode(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+        return np.concatenate(vectors).tolist() if vectors else []
+
+    def embed_query(self, text):
+        return self._encode([text])[0].tolist()
+
+
+def export_onnx_encoder(output, model_name=MODEL_NAME, quantize=True, max_seq_length=256):
+    """Export model_name's transformer to ONNX, quantize its weights to int8 and save the tokenizer next to it."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+    os.makedirs(output, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    fp32_path = os.path.join(output, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(sample[name] for name in names), fp32_path, input_names=names,
+                          output_names=["last_hidden_state"], opset_version=14, dynamo=False,
+                          dynamic_axes={**{name: {0: "batch", 1: "sequence"} for name in names},
+                                        "last_hidden_state": {0: "batch", 1: "sequence"}})
+    model_file = "model.onnx"
+    if quantize:
+        quantize_dynamic(fp32_path, os.path.join(output, MODEL_FILE), weight_type=QuantType.QInt8)
+        os.remove(fp32_path)
+        model_file = MODEL_FILE
+    tokenizer.backend_tokenizer.save(os.path.join(output, TOKENIZER_FILE))
+    config = {"model": model_name, "model_file": model_file, "max_seq_length": max_seq_length, "normalize": True,
+              "pad_id": tokenizer.pad_token_id, "pad_token": tokenizer.pad_token}
+    with open(os.path.join(output, CONFIG_FILE), "w") as f:
+        json.dump(config, f, indent=2)
+    return output
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", default="onnx_encoder")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--no-quantize", action="store_true")
+    args = parser.parse_args()
+    print(export_onnx_encoder(args.output, args.model, quantize=not args.no_quantize))
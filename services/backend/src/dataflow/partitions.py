@@ -0,0 +1,119 @@
+import json
+import os
+import re
+import threading
+import faiss
+import numpy as np
+from src.dataflow.index_factory import PARTITIONS_FILE, apply_search_params
+
+WORD = re.compile(r"[a-z0-9]+")
+# host labels that say nothing about a site's content
+GENERIC_LABELS = {"www", "edu", "com", "org", "net", "io", "gov"}
+
+
+def site_keywords(sites):
+    """Host labels that identify one site: khoury.northeastern.edu -> {"khoury"} when every site is *.northeastern.edu."""
+    labels = [set(site.split(".")) - GENERIC_LABELS for site in sites]
+    shared = set.intersection(*labels) if labels else set()
+    return [label_set - shared for label_set in labels]
+
+
+class PartitionedIndex:
+    """Per-site sub-indexes searched like one faiss index.
+
+    search(x, k) has the faiss signature and returns positions in the full
+    index, so Retriever keeps mapping them through index_to_docstore_id.
+    Each query is routed to the partitions whose site it names, otherwise to
+    the route_top partitions whose centroid it is closest to. It falls back
+    to every partition when the choice is ambiguous (the next centroid is
+    within margin) or the routed partitions return fewer than k hits.
+    """
+
+    def __init__(self, partitions, metric=faiss.METRIC_L2, route_top=1, margin=0.05):
+        self.partitions = partitions
+        self.sites = [partition["site"] for partition in partitions]
+        self.keywords = site_keywords(self.sites)
+        self.centroids = np.array([partition["centroid"] for partition in partitions], dtype=np.float32)
+        self.metric = metric
+        self.route_top = route_top
+        self.margin = margin
+        self.ntotal = sum(partition["index"].ntotal for partition in partitions)
+        self.counts = {"keyword": 0, "centroid": 0, "fallback": 0}
+        self._lock = threading.Lock()
+
+    def route(self, vector, question=None):
+        """Partition numbers to search for one query, and how they were chosen."""
+        everything = list(range(len(self.partitions)))
+        if len(everything) == 1:
+            return everything, "centroid"
+        if question:
+            words = set(WORD.findall(question.lower()))
+            named = [i for i, keywords in enumerate(self.keywords) if keywords & words]
+            if named:
+                return named, "keyword"
+        similarity = self.centroids @ (vector / (np.linalg.norm(vector) or 1))
+        order = np.argsort(-similarity)
+        chosen = order[:self.route_top]
+        if len(order) > len(chosen) and similarity[order[len(chosen)]] >= similarity[order[0]] - self.margin:
+            return everything, "fallback"
+        return sorted(chosen.tolist()), "centroid"
+
+    def _search_partitions(self, vectors, k, plan):
+        """plan: partition numbers per row -> list of (distance, position) per row."""
+        hits = [[] for _ in range(len(vectors))]
+        for number, partition in enumerate(self.partitions):
+            rows = [row for row, chosen in enumerate(plan) if number in chosen]
+            if not rows:
+                continue
+            distances, local = partition["index"].search(vectors[rows], k)
+            for row, row_distances, row_local in zip(rows, distances, local):
+                hits[row].extend((float(d), int(partition["ids"][i])) for d, i in zip(row_distances, row_local) if i != -1)
+        return hits
+
+    def search(self, vectors, k, questions=None):
+        vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+        questions = questions or [None] * len(vectors)
+        routes = [self.route(vector, question) for vector, question in zip(vectors, questions)]
+        plan = [set(chosen) for chosen, _ in routes]
+        hits = self._search_partitions(vectors, k, plan)
+        # too few hits in the routed partitions: search the rest as well
+        short = {row for row, row_hits in enumerate(hits) if len(row_hits) < k and len(plan[row]) < len(self.partitions)}
+        if short:
+            rest = [set(range(len(self.partitions))) - plan[row] if row in short else set() for row in range(len(hits))]
+            for row, extra in enumerate(self._search_partitions(vectors, k, rest)):
+                hits[row].extend(extra)
+        with self._lock:
+            for row, (_, how) in enumerate(routes):
+                self.counts["fallback" if row in short else how] += 1
+        reverse = self.metric == faiss.METRIC_INNER_PRODUCT
+        distances = np.full((len(vectors), k), -np.inf if reverse else np.inf, dtype=np.float32)
+        positions = np.full((len(vectors), k), -1, dtype=np.int64)
+        for row, row_hits in enumerate(hits):
+            row_hits = sorted(row_hits, reverse=reverse)[:k]
+            distances[row, :len(row_hits)] = [d for d, _ in row_hits]
+            positions[row, :len(row_hits)] = [p for _, p in row_hits]
+        return distances, positions
+
+    def stats(self):
+        with self._lock:
+            return {"partitions": len(self.partitions), "routed": dict(self.counts)}
+
+
+def load_partitions(folder, search_params=None, route_top=1, margin=0.05):
+    """PartitionedIndex over the sub-indexes chunk_data wrote to folder, None when it wrote none.
+
+    Sub-indexes and their id arrays are memory-mapped like the full index.
+    """
+    path = os.path.join(folder, PARTITIONS_FILE)
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        meta = json.load(f)
+    partitions = []
+    for partition in meta["partitions"]:
+        index = faiss.read_index(os.path.join(folder, partition["file"]), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+        apply_search_params(index, {name: (search_params or {}).get(name, value)
+                                    for name, value in partition["search"].items()})
+        ids = np.load(os.path.join(folder, partition["ids"]), mmap_mode="r")
+        partitions.append({**partition, "index": index, "ids": ids})
+    return PartitionedIndex(partitions, metric=meta["metric"], route_top=route_top, margin=margin)
@@ -0,0 +1,189 @@
+import time
+from langchain_core.documents import Document
+from langgraph.graph import START, StateGraph
+from typing_extensions import List, NotRequired, TypedDict
+from src.utils import tracking
+from src.utils.aio import run_blocking
+from src.utils.metrics import stage
+from src.dataflow.context import pack_context
+
+
+# Define state for application
+class State(TypedDict):
+    question: str
+    # chat session of the question; follow-ups may reuse its previous retrieval
+    session_id: NotRequired[str]
+    # set by retrieve: the context came from the session's previous candidates, not a search
+    session_reuse: NotRequired[bool]
+    context: List[Document]
+    answer: str
+
+
+class RagPipeline:
+    """retrieve -> generate graph that is compiled once and shared by all request threads.
+
+    The compiled graph holds no per-request state, so a single instance can be
+    invoked from many threads at the same time. Components are never mutated in
+    place: `with_components` returns a new pipeline, and callers swap the reference.
+    Requests that already hold the old pipeline finish on the old components.
+    """
+
+    def __init__(self, retriever, llm, prompt, model_name="mistral-tiny-latest", token_budget=None, dedup_threshold=0.9):
+        # retriever is anything with invoke(question) -> List[Document],
+        # e.g. vector_store.as_retriever(search_kwargs={"k": 10})
+        self.retriever = retriever
+        self.llm = llm
+        self.prompt = prompt
+        self.model_name = model_name
+        # context packing: max estimated tokens of retrieved text per prompt (None: no cap)
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+        graph_builder = StateGraph(State).add_sequence([("retrieve", self.retrieve), ("generate", self.generate)])
+        graph_builder.add_edge(START, "retrieve")
+        self.graph = graph_builder.compile()
+
+    def with_components(self, retriever=None, llm=None, prompt=None):
+        """Return a new pipeline with the given components replaced."""
+        return RagPipeline(
+            retriever if retriever is not None else self.retriever,
+            llm if llm is not None else self.llm,
+            prompt if prompt is not None else self.prompt,
+            model_name=self.model_name,
+            token_budget=self.token_budget,
+            dedup_threshold=self.dedup_threshold,
+        )
+
+    def retrieve(self, state: State):
+        start_time = time.perf_counter()
+        session_reuse = False
+        if state.get("session_id") and hasattr(self.retriever, "invoke_session"):
+            retrieved_docs, session_reuse = self.retriever.invoke_session(state["question"], state["session_id"])
+        else:
+            retrieved_docs = self.retriever.invoke(state["question"])
+        retrieval_time = time.perf_counter() - start_time
+
+        # Extract only metadata
+        doc_metadata = [{"doc_id": doc.metadata.get("id", i), "source": doc.metadata.get("source", "unknown")}
+                        for i, doc in enumerate(retrieved_docs)]
+
+        # Recorded on the request's trace, sent to MLflow off the request path
+        tracking.log_metric("retrieval_time", retrieval_time)
+        tracking.log_param("retrieved_docs_count", len(retrieved_docs))
+        tracking.log_dict(doc_metadata, "retrieved_docs.json")
+
+        return {"context": retrieved_docs, "session_reuse": session_reuse}
+
+    def build_prompt(self, question, docs):
+        """Prompt for question with the retrieved chunks merged, deduplicated and capped at token_budget."""
+        with stage("prompt"):
+            passages, packing = pack_context(docs, token_budget=self.token_budget, dedup_threshold=self.dedup_threshold)
+            docs_content = "\n\n".join(doc.page_content for doc in passages)
+            return self.prompt.invoke({"question": question, "context": docs_content}), docs_content, packing
+
+    def _prompt_for(self, state: State):
+        messages, docs_content, packing = self.build_prompt(state["question"], state["context"])
+        tracking.log_param("retrieved_tokens", packing["tokens_in"])
+        tracking.log_param("context_tokens", packing["tokens_out"])
+        tracking.log_param("context_passages", packing["passages"])
+        tracking.log_param("context_length", len(docs_content))
+        return messages
+
+    def _log_generation(self, start_time, response):
+        # Log LLM generation performance
+        tracking.log_metric("generation_time", time.perf_counter() - start_time)
+        tracking.log_param("response_length", len(response.content.split()))
+        tracking.log_param("model_name", self.model_name)
+
+    def generate(self, state: State):
+        start_time = time.perf_counter()
+        messages = self._prompt_for(state)
+        with stage("llm"):
+            response = self.llm.invoke(messages)
+        self._log_generation(start_time, response)
+        return {"answer": response.content}
+
+    def invoke(self, query, session_id=None):
+        return self.graph.invoke(initial_state(query, session_id))
+
+    def batch(self, queries, max_concurrency=4):
+        """Answer many queries: one batched retrieval, then at most max_concurrency LLM calls at a time.
+
+        Returns one State per query, in order. A query whose generation failed
+        gets the exception in place of its State; a retrieval failure fails the batch.
+        """
+        start_time = time.perf_counter()
+        if hasattr(self.retriever, "invoke_batch"):
+            contexts = self.retriever.invoke_batch(queries)
+        else:
+            contexts = [self.retriever.invoke(query) for query in queries]
+        tracking.log_metric("retrieval_time", time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        prompts = [self.build_prompt(query, docs)[0] for query, docs in zip(queries, contexts)]
+        with stage("llm"):
+            responses = self.llm.batch(prompts, config={"max_concurrency": max_concurrency}, return_exceptions=True)
+        tracking.log_metric("generation_time", time.perf_counter() - start_time)
+        tracking.log_param("model_name", self.model_name)
+        return [
+            response if isinstance(response, Exception)
+            else {"question": query, "context": docs, "answer": response.content}
+            for query, docs, response in zip(queries, contexts, responses)
+        ]
+
+    def stream(self, query, session_id=None):
+        """Yield ("metadata", sources) as soon as retrieval finishes, then ("token", text) per LLM chunk.
+
+        Tokens come from the chat model's streaming interface while generate() runs,
+        so callers can forward them before the full answer exists.
+        """
+        for mode, chunk in self.graph.stream(initial_state(query, session_id), stream_mode=["updates", "messages"]):
+            if mode == "updates" and "retrieve" in chunk:
+                yield "metadata", source_metadata(chunk["retrieve"]["context"])
+            elif mode == "messages":
+                message, metadata = chunk
+                if metadata.get("langgraph_node") == "generate" and message.content:
+                    yield "token", message.content
+
+    # Async path for the ASGI app. It skips the graph: retrieval (encoder, FAISS, BM25) blocks, so it runs on
+    # the executor the caller passes, and the LLM call is awaited on the event loop instead of holding a thread.
+
+    async def aretrieve(self, state: State, executor=None):
+        return await run_blocking(executor, self.retrieve, state)
+
+    async def agenerate(self, state: State):
+        start_time = time.perf_counter()
+        messages = self._prompt_for(state)
+        with stage("llm"):
+            response = await self.llm.ainvoke(messages)
+        self._log_generation(start_time, response)
+        return {"answer": response.content}
+
+    async def ainvoke(self, query, executor=None, session_id=None):
+        state = initial_state(query, session_id)
+        state.update(await self.aretrieve(state, executor))
+        state.update(await self.agenerate(state))
+        return state
+
+    async def astream(self, query, executor=None, session_id=None):
+        """stream() for the event loop: ("metadata", sources), then ("token", text) per LLM chunk."""
+        state = initial_state(query, session_id)
+        state.update(await self.aretrieve(state, executor))
+        yield "metadata", source_metadata(state["context"])
+        messages = self._prompt_for(state)
+        with stage("llm"):
+            async for chunk in self.llm.astream(messages):
+                if chunk.content:
+                    yield "token", chunk.content
+
+
+def initial_state(query, session_id=None):
+    state = {"question": f"{query}"}
+    if session_id:
+        state["session_id"] = session_id
+    return state
+
+
+def source_metadata(docs):
+    """url/title of each retrieved chunk, in retrieval order."""
+    return [{"url": doc.metadata.get("url"), "title": doc.metadata.get("title")} for doc in docs]
+
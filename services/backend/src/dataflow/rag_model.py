@@ -1,32 +1,110 @@
 from functools import lru_cache
 # from langchain import hub
-from langchain_core.documents import Document
-from langgraph.graph import START, StateGraph
-from typing_extensions import List, TypedDict
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain.chat_models import init_chat_model
-from langchain_community.vectorstores import FAISS
-from langchain_core.prompts import PromptTemplate
 import getpass
 import os
 from dotenv import load_dotenv
-import mlflow
 import time
-from langfair.auto import AutoEval
 import asyncio
-# Load the FAISS index
-from google.cloud.storage import Client
-import tempfile
-import os
+import threading
+from src.utils.logger import logging
+from src.utils import tracking
+from src.utils.cache import normalize_query
+from src.utils.singleflight import AsyncSingleFlight, SingleFlight
+from src.utils.profiling import Profiler
+from src.utils.deadline import DeadlineExceeded, remaining
+from src.utils.aio import run_blocking
+from src.utils import metrics
+# Heavy dependencies (torch, FAISS, MLflow, GCS, LLM clients) are imported inside the
+# functions that need them so importing this module stays cheap and side-effect free.
 load_dotenv(override=True)
-mlflow.langchain.autolog()
 MLFLOW_TRACKING_URI =os.environ.get("MLFLOW_TRACKING_URI")
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
 FAISS_INDEX_FOLDER= os.getenv('FAISS_INDEX_FOLDER')
-mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)  # Remote MLflow Server
-# Where you currently have this line:
+# Semantic answer cache: "memory" (per worker), "sqlite" (shared by workers on a host) or "none"
+ANSWER_CACHE_BACKEND = os.getenv('ANSWER_CACHE_BACKEND', 'memory')
+ANSWER_CACHE_THRESHOLD = float(os.getenv('ANSWER_CACHE_THRESHOLD', 0.95))
+ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', 3600))
+ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', 1024))
+ANSWER_CACHE_PATH = os.getenv('ANSWER_CACHE_PATH', 'answer_cache.sqlite3')
+# Query text -> (embedding, top-k doc ids) cache in front of the encoder and FAISS search
+RETRIEVAL_CACHE_SIZE = int(os.getenv('RETRIEVAL_CACHE_SIZE', 2048))
+RETRIEVAL_CACHE_TTL = int(os.getenv('RETRIEVAL_CACHE_TTL', 24 * 3600))
+# Concurrent query embeddings are merged into one encoder call; EMBED_BATCH_SIZE=1 turns this off
+EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', 32))
+EMBED_BATCH_WAIT_MS = float(os.getenv('EMBED_BATCH_WAIT_MS', 2))
+# longest a request waits for its query embedding (less if the request deadline is sooner)
+EMBED_TIMEOUT = float(os.getenv('EMBED_TIMEOUT', 30))
+# Query encoder: "torch" (HuggingFaceEmbeddings) or "onnx" (int8 export in ONNX_ENCODER_DIR, torch is never imported)
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+ONNX_ENCODER_DIR = os.getenv('ONNX_ENCODER_DIR', 'onnx_encoder')
+ONNX_THREADS = int(os.getenv('ONNX_THREADS', 0))
+# parallel downloads when syncing the index from the bucket
+INDEX_DOWNLOAD_WORKERS = int(os.getenv('INDEX_DOWNLOAD_WORKERS', 8))
+# "mmap": vectors and docstore are memory-mapped and shared by all workers on a host, "memory": private copy per worker
+INDEX_LOAD_MODE = os.getenv('INDEX_LOAD_MODE', 'mmap')
+# Retrieved chunks are merged per page and deduplicated, then capped at this many estimated tokens (0: no cap)
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 1500))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv('CONTEXT_DEDUP_THRESHOLD', 0.9))
+# /NuBot/batch: queries per request and LLM calls in flight per batch
+BATCH_MAX_QUERIES = int(os.getenv('BATCH_MAX_QUERIES', 100))
+BATCH_LLM_CONCURRENCY = int(os.getenv('BATCH_LLM_CONCURRENCY', 4))
+# search-time knobs for IVF/HNSW and reranked indexes; unset uses what chunk_data saved in index_params.json
+INDEX_SEARCH_PARAMS = {name: int(os.environ[env]) for name, env in (("nprobe", "FAISS_NPROBE"), ("efSearch", "FAISS_EF_SEARCH"),
+                                                                    ("k_factor_rf", "FAISS_RERANK_K_FACTOR"))
+                       if os.getenv(env)}
+# fuse BM25 hits (bm25.idx from chunk_data, when the index has one) with the dense top-k
+HYBRID_SEARCH = os.getenv('HYBRID_SEARCH', 'true').lower() == 'true'
+HYBRID_RRF_CONSTANT = int(os.getenv('HYBRID_RRF_CONSTANT', 60))
+# search only the per-site partitions a query routes to (when chunk_data built them);
+# a query whose next-closest site centroid is within INDEX_ROUTE_MARGIN searches all of them
+INDEX_ROUTING = os.getenv('INDEX_ROUTING', 'true').lower() == 'true'
+INDEX_ROUTE_TOP = int(os.getenv('INDEX_ROUTE_TOP', 1))
+INDEX_ROUTE_MARGIN = float(os.getenv('INDEX_ROUTE_MARGIN', 0.05))
+# concurrent identical questions share one encoder/FAISS/LLM call; waiters give up after COALESCE_TIMEOUT seconds
+COALESCE_REQUESTS = os.getenv('COALESCE_REQUESTS', 'true').lower() == 'true'
+COALESCE_TIMEOUT = float(os.getenv('COALESCE_TIMEOUT', 60))
+# LLM client: LLM_ENDPOINT points at any OpenAI-compatible server instead of Mistral (self-hosted, load tests).
+# A call gets LLM_TIMEOUT seconds in total (or what is left of the API request's deadline), each attempt at most
+# LLM_ATTEMPT_TIMEOUT; LLM_HEDGE sends a second request once the first is slower than the LLM_HEDGE_PERCENTILE latency
+LLM_MODEL = os.getenv('LLM_MODEL', 'mistral-tiny-latest')
+LLM_ENDPOINT = os.getenv('LLM_ENDPOINT')
+MISTRAL_ENDPOINT = os.getenv('MISTRAL_ENDPOINT', 'https://api.mistral.ai/v1')
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 30))
+LLM_ATTEMPT_TIMEOUT = float(os.getenv('LLM_ATTEMPT_TIMEOUT', 20))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', 16))
+LLM_HEDGE = os.getenv('LLM_HEDGE', 'false').lower() == 'true'
+LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', 0.95))
+# Per-request cProfile + stage breakdown, saved to PROFILE_DIR (newest PROFILE_KEEP kept): requests with an
+# "X-Profile: 1" header and a PROFILE_SAMPLE_RATE share of the others; a request that is not profiled costs nothing extra
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', 50))
+# Follow-up questions of a chat session (the frontend's session_id) whose embedding has at least SESSION_REUSE_THRESHOLD
+# cosine similarity with the session's last search are ranked among its SESSION_MAX_CHUNKS candidates instead of
+# searching the index; SESSION_MAX sessions per worker, each kept SESSION_TTL seconds after its last question
+SESSION_CONTEXT = os.getenv('SESSION_CONTEXT', 'true').lower() == 'true'
+SESSION_REUSE_THRESHOLD = float(os.getenv('SESSION_REUSE_THRESHOLD', 0.75))
+SESSION_MAX_CHUNKS = int(os.getenv('SESSION_MAX_CHUNKS', 30))
+SESSION_MAX = int(os.getenv('SESSION_MAX', 1024))
+SESSION_TTL = int(os.getenv('SESSION_TTL', 1800))
+# ASGI app (asgi.py): threads per process that run the blocking steps (encoder, FAISS, caches) while the event loop
+# keeps serving; the LLM calls are awaited and need no thread
+RETRIEVAL_THREADS = int(os.getenv('RETRIEVAL_THREADS', 8))
+# seconds between checks of the bucket for a newly published index, 0 turns the watcher off
+INDEX_POLL_SECONDS = float(os.getenv('INDEX_POLL_SECONDS', 300))
+# Stage timings are queued in memory and flushed to MLflow by a background thread.
+# TRACKING_SAMPLE_RATE=0.1 records one request in ten; a full queue drops traces instead of blocking.
+TRACKING_SAMPLE_RATE = float(os.getenv('TRACKING_SAMPLE_RATE', 1.0))
+TRACKING_QUEUE_SIZE = int(os.getenv('TRACKING_QUEUE_SIZE', 1000))
+TRACKING_BATCH_SIZE = int(os.getenv('TRACKING_BATCH_SIZE', 50))
+TRACKING_FLUSH_SECONDS = float(os.getenv('TRACKING_FLUSH_SECONDS', 5))
+# mlflow.langchain.autolog() traces every LangChain call synchronously, off by default
+MLFLOW_AUTOLOG = os.getenv('MLFLOW_AUTOLOG', 'false').lower() == 'true'
+RUN_DESCRIPTION = "RAG pipeline with Mistral AI model"
 
 def get_or_create_experiment(experiment_name):
+    import mlflow
     try:
         experiment = mlflow.get_experiment_by_name(experiment_name)
         if experiment is not None:
@@ -46,23 +124,44 @@ def get_or_create_experiment(experiment_name):
 # Replace it with:
 
 def ensure_experiment(name):
+    import mlflow
     try:
-        mlflow.set_experiment(name)
+        return mlflow.set_experiment(name)
     except Exception as e:
         mlflow.create_experiment(name)
-        mlflow.set_experiment(name)
+        return mlflow.set_experiment(name)
+
+
+def init_tracking():
+    import mlflow
+    if MLFLOW_AUTOLOG:
+        mlflow.langchain.autolog()
+    mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)  # Remote MLflow Server
+    experiment = ensure_experiment("rag_experiment")
+    # requests only touch the in-memory queue, the sink talks to the server
+    tracking.configure(tracking.MlflowSink(MLFLOW_TRACKING_URI, experiment.experiment_id),
+                       sample_rate=TRACKING_SAMPLE_RATE, max_queue=TRACKING_QUEUE_SIZE,
+                       batch_size=TRACKING_BATCH_SIZE, flush_seconds=TRACKING_FLUSH_SECONDS)
 
-ensure_experiment("rag_experiment")
-# mlflow.set_experiment("rag_experiment")
-mlflow.set_tag("description", "RAG pipeline with Mistral AI model")
-# experiment_id = get_or_create_experiment("rag_experiment")
-if not os.environ.get("MISTRAL_API_KEY"):
-  os.environ["MISTRAL_API_KEY"] = getpass.getpass("Enter API key for Mistral AI: ")
 
 @lru_cache(maxsize=None)
 def get_llm():
-    llm = init_chat_model("mistral-tiny-latest", model_provider="mistralai")
-    return llm
+    """Mistral (or the OpenAI-compatible LLM_ENDPOINT) on a pooled HTTP client, behind deadlines and retries."""
+    from src.dataflow.llm_client import HttpChatModel, ResilientChatModel, shared_http_client
+    if LLM_ENDPOINT:
+        llm = HttpChatModel(endpoint=LLM_ENDPOINT, model=LLM_MODEL, api_key=MISTRAL_API_KEY,
+                            timeout=LLM_ATTEMPT_TIMEOUT, max_connections=LLM_MAX_CONNECTIONS)
+    else:
+        from langchain.chat_models import init_chat_model
+        # one keep-alive pool per worker instead of the client's default; retries are done by the wrapper
+        client = shared_http_client(MISTRAL_ENDPOINT, headers={"Authorization": f"Bearer {MISTRAL_API_KEY}",
+                                                               "Accept": "application/json"},
+                                    max_connections=LLM_MAX_CONNECTIONS, max_keepalive=LLM_MAX_CONNECTIONS,
+                                    timeout=LLM_ATTEMPT_TIMEOUT)
+        llm = init_chat_model(LLM_MODEL, model_provider="mistralai", client=client, max_retries=1,
+                              timeout=int(LLM_ATTEMPT_TIMEOUT))
+    return ResilientChatModel(inner=llm, timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES, hedge=LLM_HEDGE,
+                              hedge_percentile=LLM_HEDGE_PERCENTILE, pool_size=LLM_MAX_CONNECTIONS)
 
 @lru_cache(maxsize=None)
 def get_prompt():
@@ -83,115 +182,434 @@ Context:
 Question: {question}
 
 Answer:"""
+    from langchain_core.prompts import PromptTemplate
     custom_rag_prompt = PromptTemplate.from_template(template)
     return custom_rag_prompt
 
-# Define state for application
-class State(TypedDict):
-    question: str
-    context: List[Document]
-    answer: str
-
-
 @lru_cache(maxsize=None)
 def load_embeddings():
+    if EMBEDDING_BACKEND == "onnx":
+        from src.dataflow.onnx_encoder import OnnxEmbeddings
+        return OnnxEmbeddings(ONNX_ENCODER_DIR, threads=ONNX_THREADS or None, batch_size=EMBED_BATCH_SIZE)
+    from langchain_community.embeddings import HuggingFaceEmbeddings
     embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
     return embeddings
 
 
+@lru_cache(maxsize=None)
+def get_session_store():
+    """Per-worker session candidates, shared by the retrievers of successive index versions."""
+    from src.dataflow.session_context import SessionStore
+    return SessionStore(max_sessions=SESSION_MAX, ttl=SESSION_TTL, max_chunks=SESSION_MAX_CHUNKS,
+                        threshold=SESSION_REUSE_THRESHOLD)
 
-# Initialize GCS client
-storage_client = Client()
-bucket=storage_client.bucket(os.getenv('BUCKET_NAME'))
-embeddings=load_embeddings()
-if not os.path.exists(FAISS_INDEX_FOLDER):
-    os.makedirs(FAISS_INDEX_FOLDER, exist_ok=True)
-# Create a temporary directory
-# Download FAISS index files from bucket to FAISS_INDEX_FOLDER directory
-for blob in bucket.list_blobs(prefix=FAISS_INDEX_FOLDER):
-    # Extract just the filename from the full path
-    filename = os.path.basename(blob.name)
-    local_path = os.path.join(FAISS_INDEX_FOLDER, filename)
-    blob.download_to_filename(local_path)
-
-# Load FAISS index from directory
-vector_store = FAISS.load_local(FAISS_INDEX_FOLDER, embeddings, allow_dangerous_deserialization=True)
-# Define application steps
-def retrieve(state: State):
-    with mlflow.start_run(nested=True, run_name="retrieval"):
-        start_time = time.time()
-        retrieved_docs = vector_store.similarity_search(state["question"],k=10)
-        retrieval_time = time.time() - start_time
-    
-        # Extract only metadata
-        doc_metadata = [{"doc_id": doc.metadata.get("id", i), "source": doc.metadata.get("source", "unknown")}
-                        for i, doc in enumerate(retrieved_docs)]
-        
-        # Log metadata instead of full documents
-        mlflow.log_metric("retrieval_time", retrieval_time)
-        mlflow.log_param("retrieved_docs_count", len(retrieved_docs))
-        mlflow.log_dict(doc_metadata, "retrieved_docs.json")
-
-    return {"context": retrieved_docs}
-
-# Initialize LLM once and store in a global variable
-llm = get_llm()
-# Initialize prompt once and store in a global variable
-prompt = get_prompt()
-def generate(state: State):
-    with mlflow.start_run(nested=True, run_name="generation"):
+
+def download_index():
+    """Sync FAISS index files from the bucket to FAISS_INDEX_FOLDER, returns the index version."""
+    from src.dataflow.index_store import get_bucket, sync_index, manifest_version
+    manifest, downloaded = sync_index(get_bucket(), FAISS_INDEX_FOLDER, FAISS_INDEX_FOLDER,
+                                      workers=INDEX_DOWNLOAD_WORKERS)
+    logging.info("Index sync downloaded %d of %d files", len(downloaded), len(manifest))
+    return manifest_version(manifest)
+
+
+def build_retriever(embeddings, index_version, query_encoder=None):
+    """Load the index in FAISS_INDEX_FOLDER; pass query_encoder to reuse the running batcher on a reload.
+
+    Raises ValueError when the files in the folder come from different builds.
+    """
+    from src.dataflow.index_store import check_index_counts, load_vector_store, read_build_manifest
+    from src.dataflow.retrieval import Retriever
+    from src.dataflow.embedding_batcher import BatchingEmbeddings
+    from src.dataflow.lexical import open_bm25_index
+    from src.dataflow.partitions import load_partitions
+    # Load FAISS index from directory
+    vector_store = load_vector_store(FAISS_INDEX_FOLDER, embeddings, mode=INDEX_LOAD_MODE, search_params=INDEX_SEARCH_PARAMS)
+    lexical = open_bm25_index(FAISS_INDEX_FOLDER) if HYBRID_SEARCH else None
+    partitions = None
+    if INDEX_ROUTING:
+        partitions = load_partitions(FAISS_INDEX_FOLDER, search_params=INDEX_SEARCH_PARAMS,
+                                     route_top=INDEX_ROUTE_TOP, margin=INDEX_ROUTE_MARGIN)
+    check_index_counts(vector_store, lexical, partitions, read_build_manifest(FAISS_INDEX_FOLDER).get("counts"))
+    if query_encoder is None:
+        query_encoder = embeddings
+        if EMBED_BATCH_SIZE > 1:
+            query_encoder = BatchingEmbeddings(embeddings, max_batch_size=EMBED_BATCH_SIZE, max_wait_ms=EMBED_BATCH_WAIT_MS,
+                                               timeout=EMBED_TIMEOUT)
+    return Retriever(vector_store, query_encoder, k=10, index_version=index_version,
+                     cache_size=RETRIEVAL_CACHE_SIZE, cache_ttl=RETRIEVAL_CACHE_TTL, lexical=lexical,
+                     rrf_constant=HYBRID_RRF_CONSTANT, partitions=partitions,
+                     sessions=get_session_store() if SESSION_CONTEXT else None)
+
+
+# Set by init(); nothing below is created at import time
+pipeline = None
+answer_cache = None
+_pipeline_lock = threading.Lock()
+_init_lock = threading.Lock()
+_readiness = {"status": "not_started", "error": None, "init_seconds": None, "warmed_up": False}
+_reload_lock = threading.Lock()
+_index_state = {"reloads": 0, "loaded_at": None, "last_check": None, "last_error": None}
+_watcher = {"thread": None, "pid": None}
+_inflight = SingleFlight(timeout=COALESCE_TIMEOUT) if COALESCE_REQUESTS else None
+_ainflight = AsyncSingleFlight(timeout=COALESCE_TIMEOUT) if COALESCE_REQUESTS else None
+_retrieval_pool = {"executor": None, "pid": None}
+profiler = Profiler(PROFILE_DIR, sample_rate=PROFILE_SAMPLE_RATE, keep=PROFILE_KEEP)
+
+
+def init(retriever=None, llm=None, tracking_enabled=True):
+    """Load the encoder, index, LLM and caches and compile the pipeline.
+
+    Safe to call from several threads, only the first call does the work.
+    retriever/llm override the defaults (tests, benchmarks); tracking_enabled=False
+    skips the MLflow setup.
+    """
+    global pipeline, answer_cache
+    if _readiness["status"] == "ready":
+        return pipeline
+    with _init_lock:
+        if _readiness["status"] == "ready":
+            return pipeline
+        _readiness.update(status="initializing", error=None)
         start_time = time.time()
-        docs_content = "\n\n".join(doc.page_content for doc in state["context"])
-        token_count = len(docs_content.split()) 
-        # Use the global prompt instance
-        mlflow.log_param("retrieved_tokens", token_count)
-        mlflow.log_param("context_length", len(docs_content))
-        messages = prompt.invoke({"question": state["question"], "context": docs_content})
-        response = llm.invoke(messages)
-        generation_time = time.time() - start_time
-        
-        # Log LLM generation performance
-        mlflow.log_metric("generation_time", generation_time)
-        mlflow.log_param("response_length", len(response.content.split()))
-        mlflow.log_param("model_name", "mistral-tiny-latest")
-
-        # Save response
-        # with open("response.txt", "w") as f:
-        #     f.write(response.content)
-        # mlflow.log_artifact("response.txt")
-
-    return {"answer": response.content}
-
-
-def generateResponse(query):
-# Compile application and test
+        try:
+            from src.dataflow.pipeline import RagPipeline
+            from src.dataflow.answer_cache import create_answer_cache
+            if tracking_enabled:
+                init_tracking()
+            if retriever is None:
+                retriever = build_retriever(load_embeddings(), download_index())
+            if llm is None:
+                llm = get_llm()
+            answer_cache = create_answer_cache(ANSWER_CACHE_BACKEND, threshold=ANSWER_CACHE_THRESHOLD,
+                                               ttl=ANSWER_CACHE_TTL, max_entries=ANSWER_CACHE_SIZE,
+                                               path=ANSWER_CACHE_PATH)
+            # Compile the retrieve -> generate graph once per worker and share it across request threads
+            pipeline = RagPipeline(retriever, llm, get_prompt(), token_budget=CONTEXT_TOKEN_BUDGET or None,
+                                   dedup_threshold=CONTEXT_DEDUP_THRESHOLD)
+        except Exception as e:
+            logging.error("Pipeline initialization failed: %s", str(e))
+            _readiness.update(status="failed", error=str(e))
+            raise
+        publish_index_metrics(retriever)
+        _readiness.update(status="ready", init_seconds=round(time.time() - start_time, 3))
+        logging.info("Pipeline ready in %s seconds", _readiness["init_seconds"])
+        return pipeline
+
+
+def warm_up():
+    """Run one dummy query through the encoder and the index so the first user does not pay for it."""
+    retriever = get_pipeline().retriever
+    retriever.search_ids(retriever.embeddings.embed_query("Khoury College of Computer Sciences"))
+    _readiness["warmed_up"] = True
+
+
+def start_background_init(warm=True):
+    """Initialize (and optionally warm up) in a daemon thread so the server can bind its port right away."""
+    def run():
+        try:
+            init()
+            if warm:
+                warm_up()
+        except Exception:
+            # already recorded in readiness(); requests retry init lazily
+            pass
+
+    thread = threading.Thread(target=run, name="rag-init", daemon=True)
+    thread.start()
+    return thread
+
+
+def readiness():
+    return dict(_readiness)
+
+
+def is_ready():
+    return _readiness["status"] == "ready"
+
+
+def get_pipeline():
+    return pipeline if is_ready() else init()
+
+
+def swap_pipeline(retriever=None, llm=None, prompt=None):
+    """Replace the retriever, LLM or prompt used by new requests.
+
+    In-flight requests keep the pipeline they started with.
+    """
+    global pipeline
+    get_pipeline()
+    with _pipeline_lock:
+        pipeline = pipeline.with_components(retriever=retriever, llm=llm, prompt=prompt)
+        publish_index_metrics(pipeline.retriever)
+        return pipeline
+
+
+def publish_index_metrics(retriever):
+    """Set the /metrics index gauges to the retriever that new requests use."""
+    index = getattr(getattr(retriever, "vector_store", None), "index", None)
+    if index is not None:
+        metrics.INDEX_VECTORS.set(index.ntotal)
+    metrics.INDEX_INFO.clear()
+    metrics.INDEX_INFO.set(1, str(retriever.index_version))
+
+
+def reload_index(force=False):
+    """Sync the index from the bucket and, if its version changed (or force), swap it in.
+
+    The new index is loaded next to the current one and swapped in with
+    swap_pipeline, so requests already running finish on the old index.
+    Returns the index status.
+    """
+    with _reload_lock:
+        current = get_pipeline().retriever
+        _index_state["last_check"] = time.time()
+        try:
+            index_version = download_index()
+            if index_version != current.index_version or force:
+                # vector_store.embeddings is the raw encoder; current.embeddings may be the shared batcher
+                embeddings = getattr(current.vector_store, "embeddings", None) or current.embeddings
+                retriever = build_retriever(embeddings, index_version, query_encoder=current.embeddings)
+                swap_pipeline(retriever=retriever)
+                _index_state["reloads"] += 1
+                _index_state["loaded_at"] = time.time()
+                logging.info("Swapped index %s -> %s", current.index_version, index_version)
+            _index_state["last_error"] = None
+        except Exception as e:
+            logging.error("Index reload failed, still serving %s: %s", current.index_version, str(e))
+            _index_state["last_error"] = str(e)
+            raise
+        return index_status()
+
+
+def index_status():
+    return {"index_version": get_pipeline().retriever.index_version, **_index_state}
+
+
+def start_index_watcher(interval=None):
+    """Poll the bucket every interval seconds in a daemon thread and hot-swap new index versions.
+
+    Idempotent per process; call again after a fork (the thread does not survive it).
+    """
+    interval = INDEX_POLL_SECONDS if interval is None else interval
+    if interval <= 0 or (_watcher["thread"] is not None and _watcher["pid"] == os.getpid()):
+        return _watcher["thread"]
+
+    def run():
+        while True:
+            time.sleep(interval)
+            if _watcher["thread"] is not threading.current_thread():
+                # stopped or replaced
+                return
+            try:
+                if is_ready():
+                    reload_index()
+            except Exception:
+                # recorded in index_status(); the old index keeps serving
+                pass
+
+    thread = threading.Thread(target=run, name="index-watcher", daemon=True)
+    thread.start()
+    _watcher.update(thread=thread, pid=os.getpid())
+    return thread
+
+
+def generateResponse(query, session_id=None):
     try:
-        ensure_experiment("rag_experiment")
-        with mlflow.start_run(run_name="RAG_Pipeline"):
-            mlflow.log_param("query", query)
-            graph_builder = StateGraph(State).add_sequence([retrieve, generate])
-            graph_builder.add_edge(START, "retrieve")
-            graph = graph_builder.compile()
-            response = graph.invoke({"question": f"{query}"})
-            mlflow.log_param("final_answer", response["answer"])
-            return response["answer"]
+        current_pipeline = get_pipeline()
+        if _inflight is None:
+            return _answer(current_pipeline, query, session_id)
+        # identical questions asked while this one runs wait for its answer instead of repeating the work
+        key = _coalesce_key(current_pipeline, query, session_id)
+        # a waiter gives up at its own request deadline if that comes first
+        timeout = min(COALESCE_TIMEOUT, max(0.0, remaining(COALESCE_TIMEOUT)))
+        # a leader that ran out of its own (shorter) deadline does not fail the waiters that have time left
+        return _inflight.do(key, lambda: _answer(current_pipeline, query, session_id), timeout=timeout,
+                            retry_on=(DeadlineExceeded,))
     except Exception as e:
-        mlflow.log_param("error", str(e))
         raise Exception(e)
-    
+
+
+def _coalesce_key(current_pipeline, query, session_id):
+    retriever = current_pipeline.retriever
+    key = (retriever.index_version, normalize_query(query))
+    # a session with candidates may answer from them, so the same question can get other chunks there;
+    # a session without any shares the search (and the answer) with everyone else
+    sessions = getattr(retriever, "sessions", None)
+    if session_id and sessions is not None and sessions.has(session_id, retriever.index_version):
+        key += (session_id,)
+    return key
+
+
+def _cached_answer(current_pipeline, query):
+    """(query embedding, cached answer or None); (None, None) without an answer cache."""
+    if answer_cache is None:
+        return None, None
+    # paraphrases of an already answered question skip retrieval and the LLM
+    # the retriever caches this embedding, so the encoder still runs once per question
+    query_embedding = current_pipeline.retriever.embed_query(query)
+    cached_answer = answer_cache.get(query_embedding, current_pipeline.retriever.index_version)
+    metrics.CACHE_LOOKUPS.inc("answer", "miss" if cached_answer is None else "hit")
+    return query_embedding, cached_answer
+
+
+def _answer(current_pipeline, query, session_id=None):
+    index_version = current_pipeline.retriever.index_version
+    query_embedding, cached_answer = _cached_answer(current_pipeline, query)
+    if cached_answer is not None:
+        return cached_answer
+    # the trace records the error itself when the pipeline raises
+    with tracking.trace("RAG_Pipeline", description=RUN_DESCRIPTION):
+        tracking.log_param("query", query)
+        response = current_pipeline.invoke(query, session_id=session_id)
+        tracking.log_param("final_answer", response["answer"])
+        # an answer from one session's earlier candidates is not for everyone
+        if answer_cache is not None and not response.get("session_reuse"):
+            answer_cache.put(query, query_embedding, response["answer"], index_version)
+        return response["answer"]
+
+
+def retrieval_executor():
+    """Thread pool for the blocking steps of the async path, one per process."""
+    if _retrieval_pool["pid"] != os.getpid():
+        from concurrent.futures import ThreadPoolExecutor
+        _retrieval_pool.update(executor=ThreadPoolExecutor(RETRIEVAL_THREADS, thread_name_prefix="retrieval"),
+                               pid=os.getpid())
+    return _retrieval_pool["executor"]
+
+
+async def aget_pipeline():
+    # a lazy init loads the encoder and the index, which must not stall the event loop
+    return pipeline if is_ready() else await run_blocking(retrieval_executor(), init)
+
+
+async def agenerateResponse(query, session_id=None):
+    """generateResponse for the ASGI app: blocking steps run on the retrieval pool, the LLM call is awaited."""
+    current_pipeline = await aget_pipeline()
+    if _ainflight is None:
+        return await _aanswer(current_pipeline, query, session_id)
+    key = _coalesce_key(current_pipeline, query, session_id)
+    timeout = min(COALESCE_TIMEOUT, max(0.0, remaining(COALESCE_TIMEOUT)))
+    return await _ainflight.do(key, lambda: _aanswer(current_pipeline, query, session_id), timeout=timeout,
+                               retry_on=(DeadlineExceeded,))
+
+
+async def _aanswer(current_pipeline, query, session_id=None):
+    executor = retrieval_executor()
+    index_version = current_pipeline.retriever.index_version
+    query_embedding, cached_answer = await run_blocking(executor, _cached_answer, current_pipeline, query)
+    if cached_answer is not None:
+        return cached_answer
+    with tracking.trace("RAG_Pipeline", description=RUN_DESCRIPTION):
+        tracking.log_param("query", query)
+        response = await current_pipeline.ainvoke(query, executor, session_id=session_id)
+        tracking.log_param("final_answer", response["answer"])
+        if answer_cache is not None and not response.get("session_reuse"):
+            await run_blocking(executor, answer_cache.put, query, query_embedding, response["answer"], index_version)
+        return response["answer"]
+
+
+def batchResponse(queries):
+    """Answers for many queries, in order: {"query", "answer"} or {"query", "error"} per item."""
+    current_pipeline = get_pipeline()
+    retriever = current_pipeline.retriever
+    index_version = retriever.index_version
+    results = [None] * len(queries)
+    pending = list(range(len(queries)))
+    embeddings = None
+    with tracking.trace("RAG_Pipeline_batch", description=RUN_DESCRIPTION):
+        tracking.log_param("batch_size", len(queries))
+        if answer_cache is not None and hasattr(retriever, "embed_queries"):
+            # one encoder pass for the whole batch, the retriever reuses these embeddings
+            embeddings = retriever.embed_queries(queries)
+            pending = []
+            for i, query in enumerate(queries):
+                cached_answer = answer_cache.get(embeddings[i], index_version)
+                if cached_answer is not None:
+                    results[i] = {"query": query, "answer": cached_answer}
+                else:
+                    pending.append(i)
+        tracking.log_metric("answer_cache_hits", len(queries) - len(pending))
+        if embeddings is not None:
+            metrics.CACHE_LOOKUPS.inc("answer", "hit", amount=len(queries) - len(pending))
+            metrics.CACHE_LOOKUPS.inc("answer", "miss", amount=len(pending))
+        if pending:
+            states = current_pipeline.batch([queries[i] for i in pending], max_concurrency=BATCH_LLM_CONCURRENCY)
+            for i, state in zip(pending, states):
+                if isinstance(state, Exception):
+                    logging.error("Batch item %d failed: %s", i, str(state))
+                    results[i] = {"query": queries[i], "error": str(state)}
+                    continue
+                results[i] = {"query": queries[i], "answer": state["answer"]}
+                if embeddings is not None:
+                    answer_cache.put(queries[i], embeddings[i], state["answer"], index_version)
+        tracking.log_metric("errors", sum("error" in result for result in results))
+    return results
+
+
+def cacheStats():
+    """Size and hit ratio of the retrieval cache and hit/miss counts of the answer and session caches."""
+    retriever = get_pipeline().retriever
+    stats = {"retrieval_cache": retriever.stats(), "index_version": retriever.index_version}
+    if answer_cache is not None:
+        stats["answer_cache"] = answer_cache.stats()
+    if getattr(retriever, "sessions", None) is not None:
+        stats["session_context"] = retriever.sessions.stats()
+    if tracking.tracker is not None:
+        stats["tracking"] = tracking.tracker.stats()
+    if _inflight is not None:
+        stats["coalescing"] = _inflight.stats()
+    if _ainflight is not None and _ainflight.leaders:
+        stats["coalescing_async"] = _ainflight.stats()
+    if profiler.sample_rate > 0 or profiler.profiled:
+        stats["profiling"] = profiler.stats()
+    if hasattr(get_pipeline().llm, "stats"):
+        stats["llm"] = get_pipeline().llm.stats()
+    return stats
+
+
+def streamResponse(query, session_id=None):
+    """Generator of (event, data) pairs: one "metadata" event, then "token" events."""
+    current_pipeline = get_pipeline()
+    with tracking.trace("RAG_Pipeline_stream", description=RUN_DESCRIPTION):
+        tracking.log_param("query", query)
+        answer = []
+        for event, data in current_pipeline.stream(query, session_id=session_id):
+            if event == "token":
+                answer.append(data)
+            yield event, data
+        tracking.log_param("final_answer", "".join(answer))
+
+
+async def astreamResponse(query, session_id=None):
+    """streamResponse for the ASGI app."""
+    current_pipeline = await aget_pipeline()
+    with tracking.trace("RAG_Pipeline_stream", description=RUN_DESCRIPTION):
+        tracking.log_param("query", query)
+        answer = []
+        async for event, data in current_pipeline.astream(query, retrieval_executor(), session_id=session_id):
+            if event == "token":
+                answer.append(data)
+            yield event, data
+        tracking.log_param("final_answer", "".join(answer))
+
+
 async def checkModel_fairness():
+    from langfair.auto import AutoEval
     auto_object = AutoEval(
         prompts=["tell me about khoury college"], 
-        langchain_llm=llm,
+        langchain_llm=get_pipeline().llm,
         # toxicity_device=device # uncomment if GPU is available
     )
     results = await auto_object.evaluate()
     print(results['metrics'])
     
 if __name__ == "__main__":
-
+    import mlflow
+    if not os.environ.get("MISTRAL_API_KEY"):
+        os.environ["MISTRAL_API_KEY"] = getpass.getpass("Enter API key for Mistral AI: ")
     query=input("generate query")
-    ensure_experiment("rag_experiment")
+    init()
     response=generateResponse(query)
     print("MLflow URI:", mlflow.get_tracking_uri())
     print("Using experiment ID:", experiment_id)
@@ -0,0 +1,219 @@
+import threading
+import time
+import numpy as np
+import faiss
+from src.dataflow.lexical import reciprocal_rank_fusion
+from src.utils.cache import TTLCache, normalize_query
+from src.utils.metrics import CACHE_LOOKUPS, observe_stage, stage
+
+
+class Retriever:
+    """Top-k chunk lookup against a langchain FAISS vector store.
+
+    Keeps a bounded cache from normalized query text to its embedding and top-k
+    docstore ids, tagged with the index version it was computed on. A repeated
+    question skips both the encoder and the FAISS search.
+
+    With a lexical index (Bm25Index over the same positions) the dense and
+    BM25 top-k are merged by reciprocal-rank fusion, so exact terms such as
+    course numbers or names rank even when their embedding is unremarkable.
+    With partitions (a PartitionedIndex) only the sites a query is routed to
+    are searched.
+
+    With sessions (a SessionStore) a question asked with a session_id can be
+    answered from the candidates of that session's previous search.
+    """
+
+    def __init__(self, vector_store, embeddings=None, k=10, index_version=None, cache_size=2048, cache_ttl=24 * 3600,
+                 lexical=None, rrf_constant=60, partitions=None, sessions=None):
+        self.vector_store = vector_store
+        self.embeddings = embeddings if embeddings is not None else vector_store.embeddings
+        self.k = k
+        self.lexical = lexical
+        self.rrf_constant = rrf_constant
+        self.partitions = partitions
+        self.sessions = sessions
+        self.index_version = index_version
+        self.cache = TTLCache(max_entries=cache_size, ttl=cache_ttl)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _cached(self, question):
+        entry = self.cache.get(normalize_query(question))
+        if entry is not None and entry[0] == self.index_version:
+            return entry
+        return None
+
+    def embed_query(self, question):
+        entry = self._cached(question)
+        if entry is not None:
+            return entry[1]
+        with stage("encode"):
+            embedding = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        self.cache.put(normalize_query(question), (self.index_version, embedding, None, None))
+        return embedding
+
+    def search_ids(self, embeddings_matrix, k=None, questions=None):
+        """Batched FAISS search: one list of (docstore_id, distance) per row of the matrix.
+
+        questions (the text of each row) lets the partition router match site names.
+        """
+        distances, positions = self._search(embeddings_matrix, k or self.k, questions)
+        index_to_docstore_id = self.vector_store.index_to_docstore_id
+        return [
+            [(index_to_docstore_id[pos], float(dist)) for pos, dist in zip(row_positions, row_distances) if pos != -1]
+            for row_positions, row_distances in zip(positions, distances)
+        ]
+
+    def _search(self, embeddings_matrix, k, questions=None):
+        """FAISS (distances, positions) arrays for the rows of the matrix."""
+        start = time.perf_counter()
+        vectors = np.array(embeddings_matrix, dtype=np.float32, ndmin=2)
+        if self.vector_store._normalize_L2:
+            faiss.normalize_L2(vectors)
+        if self.partitions is not None:
+            distances, positions = self.partitions.search(vectors, k, questions=questions)
+        else:
+            distances, positions = self.vector_store.index.search(vectors, k)
+        observe_stage("search", time.perf_counter() - start)
+        return distances, positions
+
+    def _rank(self, question, row):
+        """Docstore ids for one question from its search_ids row, fused with BM25 when there is a lexical index."""
+        dense = [doc_id for doc_id, _ in row]
+        if self.lexical is None:
+            return tuple(dense)
+        index_to_docstore_id = self.vector_store.index_to_docstore_id
+        with stage("bm25"):
+            lexical = [index_to_docstore_id[pos] for pos in self.lexical.search(question, self.k)]
+        return tuple(reciprocal_rank_fusion([dense, lexical], k=self.k, constant=self.rrf_constant))
+
+    def get_documents(self, doc_ids):
+        docs = []
+        for doc_id in doc_ids:
+            doc = self.vector_store.docstore.search(doc_id)
+            if isinstance(doc, str):
+                # InMemoryDocstore returns a message string for unknown ids
+                raise ValueError(f"Could not find document for id {doc_id}, got {doc}")
+            docs.append(doc)
+        return docs
+
+    def invoke(self, question, session_id=None):
+        return self.invoke_session(question, session_id)[0]
+
+    def invoke_session(self, question, session_id=None):
+        """(documents, reused) for a question, where reused tells that they came from the session's candidates.
+
+        A session only changes the lookup when the store holds a live entry for it
+        and the question is close to that entry's search. Any other question takes
+        the shared cache and search, and its candidates become the session's entry.
+        """
+        sessions = self.sessions if session_id is not None else None
+        if sessions is not None:
+            doc_ids = sessions.lookup(session_id, lambda: self.embed_query(question), self.index_version, self.k)
+            CACHE_LOOKUPS.inc("session", "miss" if doc_ids is None else "hit")
+            if doc_ids is not None:
+                return self.get_documents(doc_ids), True
+        key = normalize_query(question)
+        entry = self._cached(question)
+        # entries from invoke_batch have no candidates, a session's first question searches again to get them
+        if entry is not None and entry[2] is not None and (sessions is None or entry[3] is not None):
+            with self._lock:
+                self.hits += 1
+            CACHE_LOOKUPS.inc("retrieval", "hit")
+            doc_ids, candidates, embedding = entry[2], entry[3], entry[1]
+        else:
+            with self._lock:
+                self.misses += 1
+            CACHE_LOOKUPS.inc("retrieval", "miss")
+            if entry is not None:
+                embedding = entry[1]
+            else:
+                with stage("encode"):
+                    embedding = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+            _, positions = self._search(embedding, self._pool_size(), [question])
+            doc_ids, candidates = self._ranked(question, positions[0])
+            self.cache.put(key, (self.index_version, embedding, doc_ids, candidates))
+        if sessions is not None:
+            sessions.remember(session_id, embedding, self.index_version, [doc_id for doc_id, _ in candidates],
+                              self._vectors([position for _, position in candidates]))
+        return self.get_documents(doc_ids), False
+
+    def _pool_size(self):
+        """Hits to ask FAISS for: k, or the session candidates when there is a session store."""
+        return self.k if self.sessions is None else max(self.k, self.sessions.max_chunks)
+
+    def _ranked(self, question, positions):
+        """(top-k docstore ids, session candidates) for one question from its row of FAISS positions.
+
+        The top k are the dense hits fused with BM25 when there is a lexical index.
+        Candidates are (docstore id, position) pairs, the top k first and then the
+        next best dense hits, up to sessions.max_chunks; None without a session store.
+        """
+        index_to_docstore_id = self.vector_store.index_to_docstore_id
+        dense = {index_to_docstore_id[pos]: int(pos) for pos in positions if pos != -1}
+        doc_ids = tuple(list(dense)[:self.k])
+        found = dict(dense)
+        if self.lexical is not None:
+            with stage("bm25"):
+                lexical = {index_to_docstore_id[pos]: int(pos) for pos in self.lexical.search(question, self.k)}
+            doc_ids = tuple(reciprocal_rank_fusion([list(doc_ids), list(lexical)], k=self.k, constant=self.rrf_constant))
+            found.update(lexical)
+        if self.sessions is None:
+            return doc_ids, None
+        pool = list(doc_ids) + [doc_id for doc_id in dense if doc_id not in doc_ids]
+        return doc_ids, tuple((doc_id, found[doc_id]) for doc_id in pool[:self.sessions.max_chunks])
+
+    def _vectors(self, positions):
+        """Stored vectors at these index positions, None for an index that cannot reconstruct them (IVF)."""
+        try:
+            return self.vector_store.index.reconstruct_batch(np.array(positions, dtype=np.int64))
+        except RuntimeError:
+            return None
+
+    def _embed_missing(self, questions, entries):
+        """Embeddings for every question: cached ones reused, the rest encoded in one embed_documents call."""
+        missing = [i for i, entry in enumerate(entries) if entry is None]
+        encoded = {}
+        if missing:
+            with stage("encode"):
+                vectors = self.embeddings.embed_documents([questions[i] for i in missing])
+            for i, vector in zip(missing, vectors):
+                encoded[i] = np.asarray(vector, dtype=np.float32)
+                self.cache.put(normalize_query(questions[i]), (self.index_version, encoded[i], None, None))
+        return np.vstack([encoded[i] if entry is None else entry[1] for i, entry in enumerate(entries)])
+
+    def embed_queries(self, questions):
+        """Embedding matrix for many questions, one row per question."""
+        return self._embed_missing(questions, [self._cached(question) for question in questions])
+
+    def invoke_batch(self, questions):
+        """invoke() for many questions: one encoder pass and one FAISS search over the query matrix."""
+        if not questions:
+            return []
+        entries = [self._cached(question) for question in questions]
+        embeddings = self._embed_missing(questions, entries)
+        doc_ids = [entry[2] if entry is not None else None for entry in entries]
+        to_search = [i for i, ids in enumerate(doc_ids) if ids is None]
+        with self._lock:
+            self.hits += len(questions) - len(to_search)
+            self.misses += len(to_search)
+        CACHE_LOOKUPS.inc("retrieval", "hit", amount=len(questions) - len(to_search))
+        CACHE_LOOKUPS.inc("retrieval", "miss", amount=len(to_search))
+        if to_search:
+            rows = self.search_ids(embeddings[to_search], questions=[questions[i] for i in to_search])
+            for i, row in zip(to_search, rows):
+                doc_ids[i] = self._rank(questions[i], row)
+                self.cache.put(normalize_query(questions[i]), (self.index_version, embeddings[i], doc_ids[i], None))
+        return [self.get_documents(ids) for ids in doc_ids]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            **({"routing": self.partitions.stats()} if self.partitions is not None else {}),
+        }
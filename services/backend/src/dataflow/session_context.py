@@ -0,0 +1,85 @@
+import threading
+import time
+import numpy as np
+from src.utils.cache import TTLCache
+
+
+def _unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+class SessionStore:
+    """Candidate chunks of the last full search of each chat session, for follow-up questions.
+
+    A session entry holds the embedding of the turn that searched the index, the
+    docstore ids of up to max_chunks candidates from that search and, when the
+    index can reconstruct them, their vectors (unit length). A later question of
+    the same session whose embedding has a cosine similarity of at least threshold
+    with that turn is answered from the candidates, ranked against the new
+    question, instead of searching the whole index. Comparing with the turn that
+    searched, not the latest one, keeps a chain of follow-ups from drifting away
+    from the candidates.
+
+    At most max_sessions sessions are kept (least recently used evicted), each
+    for ttl seconds after its last question; an entry of another index version
+    is a miss. Memory per session is bounded by max_chunks vectors.
+    """
+
+    def __init__(self, max_sessions=1024, ttl=1800, max_chunks=30, threshold=0.75, timer=time.monotonic):
+        self.max_chunks = max_chunks
+        self.threshold = threshold
+        self.entries = TTLCache(max_entries=max_sessions, ttl=ttl, timer=timer)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def has(self, session_id, index_version):
+        """Whether the session has a live entry for this index version (not counted as a lookup)."""
+        entry = self.entries.peek(session_id)
+        return entry is not None and entry[0] == index_version
+
+    def lookup(self, session_id, embed, index_version, k):
+        """Top-k docstore ids from the session's candidates, or None when the question needs a full search.
+
+        embed returns the question's embedding; it is only called when the session has a live entry.
+        """
+        entry = self.entries.get(session_id)
+        if entry is None or entry[0] != index_version:
+            with self._lock:
+                self.misses += 1
+            return None
+        query = _unit(embed())
+        if float(entry[1] @ query) < self.threshold:
+            with self._lock:
+                self.misses += 1
+            return None
+        _, _, doc_ids, vectors = entry
+        if vectors is not None:
+            order = np.argsort(-(vectors @ query), kind="stable")[:k]
+            doc_ids = tuple(doc_ids[i] for i in order)
+        # an active conversation keeps its entry alive
+        self.entries.put(session_id, entry)
+        with self._lock:
+            self.hits += 1
+        return tuple(doc_ids[:k])
+
+    def remember(self, session_id, embedding, index_version, doc_ids, vectors=None):
+        """Keep the candidates of a full search, best first; vectors is one row per doc id or None."""
+        doc_ids = tuple(doc_ids[:self.max_chunks])
+        if vectors is not None:
+            vectors = _unit(vectors[:len(doc_ids)])
+        self.entries.put(session_id, (index_version, _unit(embedding), doc_ids, vectors))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        entries = [value for _, value in self.entries.items()]
+        return {
+            "sessions": len(entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.entries.evictions,
+            "vector_bytes": sum(entry[3].nbytes for entry in entries if entry[3] is not None),
+        }
@@ -0,0 +1,11 @@
+# helpers for the async (ASGI) serving path
+
+import asyncio
+import contextvars
+import functools
+
+
+async def run_blocking(executor, fn, *args):
+    """Await fn(*args) run on executor (None: the loop's default) with the caller's deadline, trace and profile."""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(context.run, fn, *args))
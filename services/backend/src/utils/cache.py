@@ -0,0 +1,82 @@
+# bounded in-process caches shared by the backend
+
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_query(query):
+    """Lower-case and collapse whitespace so trivially different spellings share a key."""
+    return " ".join(str(query).lower().split())
+
+
+class TTLCache:
+    """Thread-safe LRU map with a time-to-live per entry.
+
+    Least recently used entries are evicted once max_entries is reached,
+    expired entries are dropped when they are read.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600, timer=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.timer = timer
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self.timer():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def peek(self, key, default=None):
+        """Live value for key without counting a lookup or refreshing its LRU position."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry is not None and entry[0] > self.timer() else default
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (self.timer() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def items(self):
+        """Snapshot of live (key, value) pairs, least recently used first."""
+        now = self.timer()
+        with self._lock:
+            return [(key, entry[1]) for key, entry in self._entries.items() if entry[0] > now]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
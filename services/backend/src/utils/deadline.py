@@ -0,0 +1,46 @@
+# per-request deadline shared by everything a request calls (LLM client, coalescing waits)
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+# absolute time.monotonic() by which the current API request must be answered, None for no deadline
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+@contextmanager
+def deadline(seconds):
+    """Give every call made inside the block (in this context) seconds to finish, in total."""
+    token = _deadline.set(None if seconds is None else time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def set_deadline(seconds):
+    """deadline() for code that cannot use a with block (a Flask before_request); returns the token to reset."""
+    return _deadline.set(None if seconds is None else time.monotonic() + seconds)
+
+
+def reset_deadline(token):
+    _deadline.reset(token)
+
+
+def remaining(default=None):
+    """Seconds left before the current deadline, default when there is none."""
+    at = _deadline.get()
+    return default if at is None else at - time.monotonic()
+
+
+def requested_timeout(header, limit):
+    """Seconds an API request may take: an X-Request-Timeout header value, capped at limit (limit when unset or invalid)."""
+    try:
+        asked = float(limit if header is None else header)
+    except ValueError:
+        asked = limit
+    return min(max(asked, 0.0), limit)
@@ -0,0 +1,68 @@
+# Directory-backed stand-in for a google.cloud.storage bucket.
+# Set LOCAL_BUCKET_DIR to serve the index from disk (offline runs, tests, load tests).
+
+import base64
+import hashlib
+import os
+import shutil
+
+
+def file_md5(path):
+    """base64 MD5 of a file, the format GCS uses for Blob.md5_hash."""
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return base64.b64encode(digest.digest()).decode()
+
+
+class LocalBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.path = os.path.join(bucket.root, name)
+
+    @property
+    def generation(self):
+        # GCS bumps the generation on every overwrite, mtime does the same here
+        return os.stat(self.path).st_mtime_ns
+
+    @property
+    def size(self):
+        return os.stat(self.path).st_size
+
+    @property
+    def md5_hash(self):
+        return file_md5(self.path)
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def download_as_text(self):
+        with open(self.path) as f:
+            return f.read()
+
+    def download_to_filename(self, filename):
+        shutil.copyfile(self.path, filename)
+
+    def upload_from_filename(self, filename):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        shutil.copyfile(filename, self.path)
+
+
+class LocalBucket:
+    def __init__(self, root):
+        self.root = root
+        self.name = os.path.basename(os.path.normpath(root))
+
+    def blob(self, name):
+        return LocalBlob(self, name)
+
+    def list_blobs(self, prefix=None):
+        blobs = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                name = os.path.relpath(os.path.join(dirpath, filename), self.root).replace(os.sep, "/")
+                if prefix is None or name.startswith(prefix):
+                    blobs.append(LocalBlob(self, name))
+        return sorted(blobs, key=lambda blob: blob.name)
@@ -0,0 +1,291 @@
+# Prometheus-style counters, gauges and histograms kept in process memory.
+# Updating one is a dict lookup and an add under a lock, cheap enough to stay on.
+# render() writes the text exposition format served at /metrics. With METRICS_DIR
+# set (gunicorn.conf.py does), every worker also writes a snapshot there every few
+# seconds and render() adds up the other workers' snapshots, so any worker's
+# /metrics covers the whole server.
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from src.utils.logger import logging
+from src.utils.profiling import record_stage
+
+# seconds; from sub-millisecond FAISS searches to LLM calls that hit the deadline
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def snapshot(self):
+        """[labels, value] pairs; JSON-serialisable so other workers can merge them."""
+        with self._lock:
+            return [[list(labels), value if not isinstance(value, list) else list(value)]
+                    for labels, value in self._values.items()]
+
+    def merge(self, samples, other):
+        """Add another worker's snapshot to samples (label tuple -> value)."""
+        for labels, value in other:
+            labels = tuple(labels)
+            samples[labels] = samples.get(labels, 0) + value
+
+    def lines(self, samples):
+        for labels, value in sorted(samples.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Counter(_Metric):
+    """Monotonic count, e.g. cache hits or errors; label values are passed positionally."""
+
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """Current value. Across workers "sum" adds live workers' values (in-flight), "max" takes the largest."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, multiprocess="max"):
+        super().__init__(name, documentation, labelnames, registry)
+        self.multiprocess = multiprocess
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def merge(self, samples, other):
+        if self.multiprocess == "sum":
+            return super().merge(samples, other)
+        for labels, value in other:
+            labels = tuple(labels)
+            samples[labels] = max(samples.get(labels, value), value)
+
+
+class Histogram(_Metric):
+    """Latency distribution in fixed buckets; per label set: one count per bucket (+Inf last), sum, count."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        """Observe the duration of the block, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def merge(self, samples, other):
+        for labels, value in other:
+            labels = tuple(labels)
+            current = samples.get(labels)
+            samples[labels] = list(value) if current is None else [a + b for a, b in zip(current, value)]
+
+    def lines(self, samples):
+        for labels, state in sorted(samples.items()):
+            cumulative = 0
+            for le, count in zip(self.buckets + (float("inf"),), state):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', _number(le))])} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(state[-2])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {state[-1]}"
+
+
+class Registry:
+    """The metrics of this process, and the snapshot files shared with other workers."""
+
+    def __init__(self, directory=None, flush_seconds=5.0):
+        self.metrics = []
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self._writer = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def snapshot(self):
+        return {metric.name: metric.snapshot() for metric in self.metrics}
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def write_snapshot(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(os.getpid())
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + ".tmp", path)
+
+    def ensure_writer(self):
+        """Start this worker's snapshot thread (threads do not survive a fork, so once per pid)."""
+        if not self.directory or (self._writer is not None and self._pid == os.getpid()):
+            return
+        with self._lock:
+            if self._writer is not None and self._pid == os.getpid():
+                return
+
+            def run():
+                while self._pid == os.getpid():
+                    try:
+                        self.write_snapshot()
+                    except OSError as e:
+                        logging.warning("Could not write metrics snapshot: %s", str(e))
+                    time.sleep(self.flush_seconds)
+
+            self._pid = os.getpid()
+            self._writer = threading.Thread(target=run, name="metrics-snapshot", daemon=True)
+            self._writer.start()
+
+    def _other_workers(self):
+        """(snapshot, alive) of every other worker that wrote one."""
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json") or not name[:-5].isdigit() or name == f"{os.getpid()}.json":
+                continue
+            pid = int(name[:-5])
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            try:
+                os.kill(pid, 0)
+                alive = True
+            except ProcessLookupError:
+                alive = False
+            except PermissionError:
+                alive = True
+            yield snapshot, alive
+
+    def render(self):
+        """All metrics in the Prometheus text format, this worker's live values plus the other workers' snapshots."""
+        merged = {}
+        for metric in self.metrics:
+            merged[metric.name] = {}
+            metric.merge(merged[metric.name], metric.snapshot())
+        for snapshot, alive in self._other_workers():
+            for metric in self.metrics:
+                # a dead worker's counts stay in the totals, its gauges do not
+                if metric.name in snapshot and (alive or metric.kind != "gauge"):
+                    metric.merge(merged[metric.name], snapshot[metric.name])
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.lines(merged[metric.name]))
+        return "\n".join(lines) + "\n"
+
+
+def clear_directory(directory):
+    """Remove snapshots left by a previous server run (gunicorn on_starting)."""
+    if directory and os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.endswith((".json", ".tmp")):
+                os.remove(os.path.join(directory, name))
+
+
+REGISTRY = Registry(directory=os.getenv("METRICS_DIR") or None,
+                    flush_seconds=float(os.getenv("METRICS_FLUSH_SECONDS", 5)))
+
+STAGE_SECONDS = Histogram("nubot_stage_seconds", "Time spent per pipeline stage (encode, search, bm25, prompt, llm)",
+                          ["stage"])
+REQUEST_SECONDS = Histogram("nubot_request_seconds", "Total time per API request", ["endpoint"])
+REQUESTS_IN_FLIGHT = Gauge("nubot_requests_in_flight", "API requests being served", multiprocess="sum")
+REQUEST_ERRORS = Counter("nubot_request_errors_total", "API requests that failed", ["endpoint"])
+CACHE_LOOKUPS = Counter("nubot_cache_lookups_total", "Retrieval and answer cache lookups by result", ["cache", "result"])
+INDEX_VECTORS = Gauge("nubot_index_vectors", "Vectors in the loaded FAISS index")
+INDEX_INFO = Gauge("nubot_index_info", "Loaded index version (value is always 1)", ["version"])
+
+
+def start_request(state):
+    """Count an API request as in flight; its start time is kept in state (the WSGI environ or ASGI scope)."""
+    REGISTRY.ensure_writer()
+    REQUESTS_IN_FLIGHT.inc()
+    state["nubot.start"] = time.perf_counter()
+
+
+def finish_request(state, endpoint, failed=False):
+    """Record the total time of a started request, and an error if failed or state["nubot.failed"] is set."""
+    start = state.pop("nubot.start", None)
+    if start is None:
+        return
+    REQUESTS_IN_FLIGHT.dec()
+    REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint)
+    if failed or state.pop("nubot.failed", False):
+        REQUEST_ERRORS.inc(endpoint)
+
+
+def observe_stage(stage, seconds):
+    """Record one pipeline stage in nubot_stage_seconds and in the request's profile, if it has one."""
+    STAGE_SECONDS.observe(seconds, stage)
+    record_stage(stage, seconds)
+
+
+@contextmanager
+def stage(name):
+    """Time the block as pipeline stage `name` (see observe_stage)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
@@ -0,0 +1,146 @@
+# Opt-in profiling of single requests.
+# A profiled request runs under cProfile and collects a wall-clock breakdown of
+# the pipeline stages (metrics.stage reports each one here); both are written to
+# PROFILE_DIR as <id>.prof (pstats, for snakeviz or pstats) and <id>.json.
+# A request that is not profiled only pays for one ContextVar lookup per stage.
+
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from src.utils.logger import logging
+
+_current_profile = contextvars.ContextVar("current_profile", default=None)
+
+# cProfile is process-wide on Python 3.12+, so one profiled request at a time
+_profiler_lock = threading.Lock()
+
+PROFILE_ID_CHARS = set("0123456789abcdef-")
+
+
+class RequestProfile:
+    """cProfile of the request thread plus the stage timings reported from any thread that copied its context."""
+
+    def __init__(self, name, **info):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.name = name
+        self.info = info
+        self.stages = {}
+        self.profiler = cProfile.Profile()
+        self.seconds = None
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage, seconds):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"seconds": 0.0, "calls": 0})
+            entry["seconds"] += seconds
+            entry["calls"] += 1
+
+    def top_functions(self, limit=25, sort="cumulative"):
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def summary(self):
+        with self._lock:
+            stages = {name: dict(entry) for name, entry in self.stages.items()}
+        covered = sum(entry["seconds"] for entry in stages.values())
+        return {"id": self.id, "name": self.name, **self.info, "seconds": self.seconds, "stages": stages,
+                # time outside the instrumented stages: the web framework, graph, caches, waiting on a coalesced call
+                "unattributed_seconds": max(0.0, self.seconds - covered) if self.seconds is not None else None,
+                "top_functions": self.top_functions()}
+
+    def save(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        self.profiler.dump_stats(os.path.join(folder, f"{self.id}.prof"))
+        summary = self.summary()
+        with open(os.path.join(folder, f"{self.id}.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+
+class Profiler:
+    """Decides which requests to profile and keeps the newest `keep` profiles in `folder`."""
+
+    def __init__(self, folder="profiles", sample_rate=0.0, keep=50):
+        self.folder = folder
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self.profiled = 0
+        self.skipped_busy = 0
+
+    def wanted(self, requested=False):
+        return requested or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    @contextmanager
+    def profile(self, name, enabled=True, **info):
+        """Profile the block when enabled; yields the RequestProfile (saved on exit) or None."""
+        if not enabled:
+            yield None
+            return
+        if not _profiler_lock.acquire(blocking=False):
+            self.skipped_busy += 1
+            yield None
+            return
+        request_profile = RequestProfile(name, **info)
+        try:
+            request_profile.profiler.enable()
+        except ValueError:
+            # another profiler (coverage, a debugger) owns the hook
+            _profiler_lock.release()
+            self.skipped_busy += 1
+            yield None
+            return
+        token = _current_profile.set(request_profile)
+        start = time.perf_counter()
+        try:
+            yield request_profile
+        finally:
+            request_profile.profiler.disable()
+            request_profile.seconds = time.perf_counter() - start
+            _current_profile.reset(token)
+            _profiler_lock.release()
+            try:
+                request_profile.save(self.folder)
+                self.profiled += 1
+                self._prune()
+            except OSError as e:
+                logging.warning("Could not save profile %s: %s", request_profile.id, str(e))
+
+    def _prune(self):
+        profiles = sorted(name[:-5] for name in os.listdir(self.folder) if name.endswith(".json"))
+        for profile_id in profiles[:max(0, len(profiles) - self.keep)]:
+            for suffix in (".json", ".prof"):
+                try:
+                    os.remove(os.path.join(self.folder, profile_id + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def path(self, profile_id, suffix):
+        """File of a saved profile, None for an unknown or malformed id."""
+        if not profile_id or not set(profile_id) <= PROFILE_ID_CHARS:
+            return None
+        path = os.path.join(self.folder, profile_id + suffix)
+        return path if os.path.isfile(path) else None
+
+    def list(self):
+        if not os.path.isdir(self.folder):
+            return []
+        return sorted((name[:-5] for name in os.listdir(self.folder) if name.endswith(".json")), reverse=True)
+
+    def stats(self):
+        return {"sample_rate": self.sample_rate, "profiled": self.profiled, "skipped_busy": self.skipped_busy}
+
+
+def record_stage(stage, seconds):
+    """Add a stage timing to the current request's profile, if it is being profiled."""
+    request_profile = _current_profile.get()
+    if request_profile is not None:
+        request_profile.add_stage(stage, seconds)
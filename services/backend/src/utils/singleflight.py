@@ -0,0 +1,125 @@
+# coalesces identical concurrent calls so only one of them does the work
+
+import asyncio
+import threading
+import time
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "until")
+
+    def __init__(self, until):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.until = until
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; callers that arrive while it runs share its outcome.
+
+    The first caller for a key (the leader) runs fn. Callers arriving before it
+    returns wait up to timeout seconds and then get the same return value, or
+    the same exception re-raised. Nothing is kept once the call finishes, so a
+    later request runs again (or hits whatever cache the call filled).
+
+    timeout is also how long the caller's own request may take. When the leader
+    fails with an exception in retry_on (its request deadline passed, say), a
+    waiter whose timeout ends later does not inherit that failure: it runs the
+    call again, as the new leader or as a waiter on one.
+    """
+
+    def __init__(self, timeout=60.0):
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.retries = 0
+
+    def _until(self, timeout):
+        return time.monotonic() + (self.timeout if timeout is None else timeout)
+
+    def _retry(self, error, until, leader_until, retry_on):
+        """Whether a waiter runs the call again after the leader failed with error."""
+        if not isinstance(error, retry_on) or until <= leader_until or until <= time.monotonic():
+            return False
+        with self._lock:
+            self.retries += 1
+        return True
+
+    def do(self, key, fn, timeout=None, retry_on=()):
+        until = self._until(timeout)
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call(until)
+                    self.leaders += 1
+                else:
+                    self.coalesced += 1
+            if leader:
+                try:
+                    call.result = fn()
+                except BaseException as e:
+                    call.error = e
+                    with self._lock:
+                        self.errors += 1
+                    raise
+                finally:
+                    with self._lock:
+                        del self._calls[key]
+                    call.done.set()
+                return call.result
+            if not call.done.wait(max(0.0, until - time.monotonic())):
+                with self._lock:
+                    self.timeouts += 1
+                raise TimeoutError(f"Timed out waiting for the in-flight request for {key!r}")
+            if call.error is None:
+                return call.result
+            if not self._retry(call.error, until, call.until, retry_on):
+                raise call.error
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._calls), "leaders": self.leaders, "coalesced": self.coalesced,
+                    "timeouts": self.timeouts, "errors": self.errors, "retries": self.retries}
+
+
+class AsyncSingleFlight(SingleFlight):
+    """SingleFlight for coroutines on one event loop: waiters await the leader's task instead of blocking a thread.
+
+    The call runs in its own task, so a leader whose client disconnects does
+    not cancel it for the requests waiting on the same key.
+    """
+
+    async def do(self, key, fn, timeout=None, retry_on=()):
+        until = self._until(timeout)
+        while True:
+            entry = self._calls.get(key)
+            if entry is None:
+                call = asyncio.ensure_future(fn())
+                self._calls[key] = (call, until)
+                self.leaders += 1
+                call.add_done_callback(lambda task: self._finish(key, task))
+                return await asyncio.shield(call)
+            call, leader_until = entry
+            self.coalesced += 1
+            try:
+                return await asyncio.wait_for(asyncio.shield(call), max(0.0, until - time.monotonic()))
+            except Exception as e:
+                if not call.done():
+                    # this waiter's timeout, the call itself goes on
+                    self.timeouts += 1
+                    raise TimeoutError(f"Timed out waiting for the in-flight request for {key!r}") from None
+                if not self._retry(e, until, leader_until, retry_on):
+                    raise
+
+    def _finish(self, key, task):
+        if self._calls.get(key, (None,))[0] is task:
+            del self._calls[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
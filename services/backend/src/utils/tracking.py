@@ -0,0 +1,210 @@
+# Request instrumentation that never waits on the tracking server.
+# Stages record params/metrics into the current request's Trace; finished traces go
+# into a bounded queue that a background thread flushes to MLflow in batches.
+
+import contextvars
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from src.utils.logger import logging
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+# MLflow rejects longer param values
+MAX_PARAM_LENGTH = 6000
+
+
+class Trace:
+    """Params, metrics and small JSON artifacts of one request, kept in memory until flushed."""
+
+    def __init__(self, run_name, tags=None):
+        self.run_name = run_name
+        self.tags = dict(tags or {})
+        self.params = {}
+        self.metrics = {}
+        self.artifacts = {}
+        self.status = "FINISHED"
+        self.start_ms = int(time.time() * 1000)
+        self.end_ms = None
+
+
+def log_param(key, value):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.params[key] = str(value)[:MAX_PARAM_LENGTH]
+
+
+def log_metric(key, value):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.metrics[key] = float(value)
+
+
+def log_dict(dictionary, artifact_file):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.artifacts[artifact_file] = dictionary
+
+
+class MlflowSink:
+    """Writes traces as MLflow runs: one log_batch per run instead of a request per value."""
+
+    def __init__(self, tracking_uri, experiment_id):
+        from mlflow.tracking import MlflowClient
+        self.client = MlflowClient(tracking_uri)
+        self.experiment_id = experiment_id
+
+    def write(self, traces):
+        from mlflow.entities import Metric, Param, RunTag
+        for trace in traces:
+            run = self.client.create_run(self.experiment_id, start_time=trace.start_ms,
+                                         tags=trace.tags, run_name=trace.run_name)
+            run_id = run.info.run_id
+            self.client.log_batch(
+                run_id,
+                metrics=[Metric(key, value, trace.end_ms, 0) for key, value in trace.metrics.items()],
+                params=[Param(key, value) for key, value in trace.params.items()],
+                tags=[RunTag(key, value) for key, value in trace.tags.items()],
+            )
+            for artifact_file, dictionary in trace.artifacts.items():
+                self.client.log_dict(run_id, dictionary, artifact_file)
+            self.client.set_terminated(run_id, status=trace.status, end_time=trace.end_ms)
+
+
+class BufferedTracker:
+    """Samples requests and ships their traces to a sink from a background thread.
+
+    submit() never blocks: when the queue is full (tracking server slow or down)
+    the trace is dropped and counted. The worker takes up to batch_size traces,
+    waiting at most flush_seconds for a batch to fill, and hands them to the sink.
+    """
+
+    def __init__(self, sink, sample_rate=1.0, max_queue=1000, batch_size=50, flush_seconds=5.0):
+        self.sink = sink
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_queue = max_queue
+        self.submitted = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+
+    def _ensure_worker(self):
+        # threads do not survive a fork, so gunicorn workers start their own
+        if self._worker is None or self._pid != os.getpid():
+            with self._lock:
+                if self._worker is None or self._pid != os.getpid():
+                    self._queue = queue.Queue(maxsize=self.max_queue)
+                    self._worker = threading.Thread(target=self._run, name="tracking-flush", daemon=True)
+                    self._pid = os.getpid()
+                    self._worker.start()
+
+    def sampled(self):
+        if self.sample_rate >= 1 or random.random() < self.sample_rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+    def submit(self, trace):
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(trace)
+            self.submitted += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self.sink.write(batch)
+                self.flushed += len(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logging.warning("Dropped %d traces, tracking server error: %s", len(batch), str(e))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self, timeout=None):
+        """Wait until every queued trace has been handed to the sink (tests, shutdown)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self):
+        return {
+            "sample_rate": self.sample_rate,
+            "queued": self._queue.qsize(),
+            "submitted": self.submitted,
+            "sampled_out": self.sampled_out,
+            "dropped": self.dropped,
+            "flushed": self.flushed,
+            "failed": self.failed,
+        }
+
+
+tracker = None
+
+
+def configure(sink, **kwargs):
+    """Install the process-wide tracker; until then trace() is a no-op."""
+    global tracker
+    tracker = BufferedTracker(sink, **kwargs)
+    return tracker
+
+
+@contextmanager
+def trace(run_name, **tags):
+    """Collect the log_* calls made inside the block (and in threads that copy the context) into one run.
+
+    Yields the Trace, or None when tracking is off or the request was not sampled.
+    A trace that started is submitted even if the block raises, with status FAILED.
+    """
+    current = tracker
+    if current is None or not current.sampled():
+        yield None
+        return
+    request_trace = Trace(run_name, tags)
+    token = _current_trace.set(request_trace)
+    start = time.perf_counter()
+    try:
+        yield request_trace
+    except BaseException as e:
+        request_trace.status = "FAILED"
+        request_trace.params["error"] = (str(e) or type(e).__name__)[:MAX_PARAM_LENGTH]
+        raise
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # a streaming generator closed from another context
+            pass
+        request_trace.metrics["total_time"] = time.perf_counter() - start
+        request_trace.end_ms = int(time.time() * 1000)
+        current.submit(request_trace)
@@ -0,0 +1,26 @@
+import re
+import time
+from langchain_core.language_models.chat_models import SimpleChatModel
+
+
+def sample(text, name, **labels):
+    """Value of one sample in a /metrics page, 0 when absent."""
+    wanted = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    pattern = "^" + re.escape(name + (f"{{{wanted}}}" if labels else "")) + r" (\S+)$"
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+class EchoChatModel(SimpleChatModel):
+    """Answers with the last prompt line after 20 ms, fails on "boom"."""
+
+    @property
+    def _llm_type(self):
+        return "echo"
+
+    def _call(self, messages, *args, **kwargs):
+        time.sleep(0.02)
+        prompt = messages[-1].content
+        if "boom" in prompt:
+            raise RuntimeError("llm failed")
+        return "answer to " + prompt.splitlines()[-1]
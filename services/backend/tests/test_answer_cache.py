@@ -0,0 +1,133 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from src.dataflow.answer_cache import (InMemoryAnswerBackend, SemanticAnswerCache, SqliteAnswerBackend,
+                                       create_answer_cache)
+from src.utils.cache import TTLCache
+
+
+def vector(*values):
+    return np.array(values, dtype=np.float32)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = TTLCache(max_entries=2, ttl=60)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_ttl_expiry(self):
+        clock = FakeClock()
+        cache = TTLCache(max_entries=10, ttl=5, timer=clock)
+        cache.put("a", 1)
+        clock.now = 4
+        self.assertEqual(cache.get("a"), 1)
+        clock.now = 6
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+
+class AnswerCacheContract:
+    """Behaviour every backend must provide."""
+
+    def make_backend(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.cache = SemanticAnswerCache(self.make_backend(), threshold=0.9)
+
+    def test_paraphrase_hit(self):
+        self.cache.put("tell me about khoury college", vector(1, 0, 0), "Khoury is ...", "v1")
+        self.assertEqual(self.cache.get(vector(0.95, 0.1, 0), "v1"), "Khoury is ...")
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_below_threshold_miss(self):
+        self.cache.put("tell me about khoury college", vector(1, 0, 0), "Khoury is ...", "v1")
+        self.assertIsNone(self.cache.get(vector(0, 1, 0), "v1"))
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_new_index_version_invalidates(self):
+        self.cache.put("co-op deadlines", vector(1, 0, 0), "old answer", "v1")
+        self.assertIsNone(self.cache.get(vector(1, 0, 0), "v2"))
+        self.assertIsNone(self.cache.get(vector(1, 0, 0), "v1"))
+
+    def test_requests_still_on_the_old_version_are_ignored(self):
+        self.cache.put("co-op deadlines", vector(1, 0, 0), "old answer", "v1")
+        self.cache.put("co-op deadlines", vector(1, 0, 0), "new answer", "v2")
+        # a request that started before the hot swap finishes after it
+        self.cache.put("co-op deadlines", vector(1, 0, 0), "old answer", "v1")
+        self.assertIsNone(self.cache.get(vector(1, 0, 0), "v1"))
+        self.assertEqual(self.cache.get(vector(1, 0, 0), "v2"), "new answer")
+        self.assertEqual(self.cache.index_version, "v2")
+
+
+class TestInMemoryBackend(AnswerCacheContract, unittest.TestCase):
+
+    def make_backend(self):
+        return InMemoryAnswerBackend(max_entries=2, ttl=60)
+
+    def test_bounded_size(self):
+        for i in range(5):
+            self.cache.put(f"q{i}", vector(i, 1, 0), f"a{i}", "v1")
+        self.assertEqual(len(self.cache.backend), 2)
+
+
+class TestSqliteBackend(AnswerCacheContract, unittest.TestCase):
+
+    def make_backend(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "answers.sqlite3")
+        return SqliteAnswerBackend(self.path, max_entries=2, ttl=60)
+
+    def test_shared_between_workers(self):
+        self.cache.put("tell me about khoury college", vector(1, 0, 0), "Khoury is ...", "v1")
+        # a second process opens its own connection to the same file
+        other_worker = SemanticAnswerCache(SqliteAnswerBackend(self.path), threshold=0.9)
+        self.assertEqual(other_worker.get(vector(1, 0.05, 0), "v1"), "Khoury is ...")
+
+    def test_worker_behind_does_not_wipe_newer_entries(self):
+        self.cache.put("co-op deadlines", vector(1, 0, 0), "old answer", "v1")
+        self.cache.put("co-op deadlines", vector(1, 0, 0), "new answer", "v2")
+        # this worker has not swapped yet
+        behind = SemanticAnswerCache(SqliteAnswerBackend(self.path), threshold=0.9)
+        behind.put("housing", vector(0, 1, 0), "housing answer", "v1")
+        self.assertEqual(self.cache.get(vector(1, 0, 0), "v2"), "new answer")
+        # when it swaps it only drops what it held for v1
+        self.assertEqual(behind.get(vector(1, 0, 0), "v2"), "new answer")
+        self.assertIsNone(behind.get(vector(0, 1, 0), "v1"))
+
+    def test_bounded_size(self):
+        for i in range(5):
+            self.cache.put(f"q{i}", vector(i, 1, 0), f"a{i}", "v1")
+        count = self.cache.backend._connection().execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        self.assertEqual(count, 2)
+
+
+class TestCreateAnswerCache(unittest.TestCase):
+
+    def test_disabled(self):
+        self.assertIsNone(create_answer_cache("none"))
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            create_answer_cache("memcached")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import asyncio
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch
+import httpx
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import SimpleChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from src.dataflow import rag_model
+from src.dataflow.llm_client import ResilientChatModel
+from src.dataflow.retrieval import Retriever
+from src.utils.singleflight import AsyncSingleFlight, SingleFlight
+from helpers import sample
+
+
+class SleepyChatModel(SimpleChatModel):
+    """Answers with the last prompt line after 200 ms, fails on "boom"; the async path sleeps without a thread."""
+
+    calls: list = []
+    threads: set = set()
+
+    @property
+    def _llm_type(self):
+        return "sleepy"
+
+    def _answer(self, messages):
+        prompt = messages[-1].content
+        self.calls.append(prompt)
+        if "boom" in prompt:
+            raise RuntimeError("llm failed")
+        return "answer to " + prompt.splitlines()[-1]
+
+    def _call(self, messages, *args, **kwargs):
+        time.sleep(0.2)
+        return self._answer(messages)
+
+    async def _agenerate(self, messages, *args, **kwargs):
+        self.threads.add(threading.get_ident())
+        await asyncio.sleep(0.2)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+
+
+class TestAsgiApp(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with patch.dict(os.environ, {"INIT_ON_START": "lazy"}):
+            import asgi
+            import main
+        cls.asgi = asgi
+        cls.flask = main.app.test_client()
+
+    def setUp(self):
+        from langchain_core.prompts import PromptTemplate
+        embeddings = DeterministicFakeEmbedding(size=16)
+        vector_store = FAISS.from_texts([f"chunk {i}" for i in range(20)], embeddings,
+                                        metadatas=[{"url": f"https://example.edu/{i}"} for i in range(20)])
+        self.llm = SleepyChatModel(calls=[], threads=set())
+        for target in (patch.object(rag_model, "pipeline", None),
+                       patch.object(rag_model, "answer_cache", None),
+                       patch.object(rag_model, "_inflight", SingleFlight(timeout=5)),
+                       patch.object(rag_model, "_ainflight", AsyncSingleFlight(timeout=5)),
+                       patch.object(rag_model, "get_prompt", lambda: PromptTemplate.from_template("{context}\n{question}")),
+                       patch.dict(rag_model._readiness, {"status": "not_started", "error": None})):
+            target.start()
+            self.addCleanup(target.stop)
+        rag_model.init(retriever=Retriever(vector_store, embeddings, k=3, index_version="v1"), llm=self.llm,
+                       tracking_enabled=False)
+
+    def call(self, requests):
+        """Send (method, path, kwargs) requests to the ASGI app concurrently; responses in order."""
+        async def run():
+            transport = httpx.ASGITransport(app=self.asgi.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await asyncio.gather(*[client.request(method, path, **kwargs) for method, path, kwargs in requests])
+        return asyncio.run(run())
+
+    def test_same_responses_as_the_flask_app(self):
+        cases = [("post", "/NuBot/", {"json": {"query": "Who teaches CS 5200?"}}),
+                 ("post", "/NuBot/", {"json": {"query": ""}}),
+                 ("post", "/NuBot/", {"json": {"query": "boom"}}),
+                 ("post", "/NuBot/batch", {"json": {"queries": ["Where is the library?", "boom"]}}),
+                 ("post", "/NuBot/batch", {"json": {"queries": []}}),
+                 ("get", "/NuBot/admin/profiles/not-there", {}),
+                 ("get", "/ready", {})]
+        for (method, path, kwargs), response in zip(cases, self.call(cases)):
+            expected = getattr(self.flask, method)(path, **kwargs)
+            self.assertEqual(response.status_code, expected.status_code, path)
+            self.assertEqual(response.json(), expected.json, path)
+
+    def test_stream_events(self):
+        response, = self.call([("post", "/NuBot/stream", {"json": {"query": "Who teaches CS 5200?"}})])
+        self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+        expected = self.flask.post("/NuBot/stream", json={"query": "Who teaches CS 5200?"})
+        self.assertEqual(response.text, expected.get_data(as_text=True))
+        expected.close()
+
+    def test_waiting_requests_hold_no_threads(self):
+        cases = [("post", "/NuBot/", {"json": {"query": f"question {i}"}}) for i in range(100)]
+        start = time.perf_counter()
+        responses = self.call(cases)
+        # 100 LLM calls of 200 ms each, overlapping on the event loop
+        self.assertLess(time.perf_counter() - start, 2.0)
+        self.assertEqual([r.json() for r in responses], [f"answer to question {i}" for i in range(100)])
+        self.assertEqual(len(self.llm.threads), 1)
+
+    def test_identical_questions_share_one_llm_call(self):
+        responses = self.call([("post", "/NuBot/", {"json": {"query": "When is registration?"}}),
+                               ("post", "/NuBot/", {"json": {"query": "when is  REGISTRATION?"}})])
+        self.assertEqual([r.json() for r in responses], ["answer to When is registration?"] * 2)
+        self.assertEqual(len(self.llm.calls), 1)
+        self.assertEqual(rag_model.cacheStats()["coalescing_async"]["coalesced"], 1)
+
+    def test_deadline_header_and_metrics(self):
+        rag_model.swap_pipeline(llm=ResilientChatModel(inner=self.llm))
+        before = self.call([("get", "/metrics", {})])[0].text
+        start = time.perf_counter()
+        response, = self.call([("post", "/NuBot/", {"json": {"query": "slow"}, "headers": {"X-Request-Timeout": "0.05"}})])
+        self.assertLess(time.perf_counter() - start, 0.15)
+        self.assertIn("deadline", response.json()["details"])
+        after = self.call([("get", "/metrics", {})])[0].text
+        for name in ("nubot_request_seconds_count", "nubot_request_errors_total"):
+            self.assertEqual(sample(after, name, endpoint="/NuBot/") - sample(before, name, endpoint="/NuBot/"), 1)
+        self.assertEqual(sample(after, "nubot_requests_in_flight"), 0)
+
+    def test_swagger_documents_the_same_routes(self):
+        paths = self.call([("get", "/swagger.json", {})])[0].json()["paths"]
+        flask_paths = self.flask.get("/swagger.json").json["paths"]
+        self.assertEqual(set(paths), set(flask_paths))
+        self.assertIn("query", str(paths["/NuBot/"]["post"]["requestBody"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import threading
+import unittest
+from unittest.mock import patch
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.dataflow import rag_model
+from src.dataflow.retrieval import Retriever
+from helpers import EchoChatModel
+
+
+class Concurrency:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def __enter__(self):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+
+    def __exit__(self, *exc):
+        with self.lock:
+            self.active -= 1
+
+
+llm_calls = Concurrency()
+
+
+class CountingChatModel(EchoChatModel):
+    """EchoChatModel that records how many calls run at once in llm_calls."""
+
+    def _call(self, *args, **kwargs):
+        with llm_calls:
+            return super()._call(*args, **kwargs)
+
+
+class TestBatchEndpoint(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with patch.dict(os.environ, {"INIT_ON_START": "lazy"}):
+            import main
+        cls.client = main.app.test_client()
+
+    def setUp(self):
+        from langchain_core.prompts import PromptTemplate
+        embeddings = DeterministicFakeEmbedding(size=16)
+        vector_store = FAISS.from_texts([f"chunk {i}" for i in range(20)], embeddings)
+        llm_calls.peak = 0
+        for target in (patch.object(rag_model, "pipeline", None),
+                       patch.object(rag_model, "answer_cache", None),
+                       patch.object(rag_model, "BATCH_LLM_CONCURRENCY", 2),
+                       patch.object(rag_model, "get_prompt", lambda: PromptTemplate.from_template("{context}\n{question}")),
+                       patch.dict(rag_model._readiness, {"status": "not_started", "error": None})):
+            target.start()
+            self.addCleanup(target.stop)
+        rag_model.init(retriever=Retriever(vector_store, embeddings, k=3, index_version="v1"),
+                       llm=CountingChatModel(), tracking_enabled=False)
+
+    def test_results_in_order_with_item_errors(self):
+        queries = [f"question {i}" for i in range(6)] + ["boom"]
+        response = self.client.post("/NuBot/batch", json={"queries": queries})
+        self.assertEqual(response.status_code, 200)
+        results = response.json["results"]
+        self.assertEqual([r["query"] for r in results], queries)
+        self.assertEqual([r["answer"] for r in results[:6]], [f"answer to question {i}" for i in range(6)])
+        self.assertEqual(results[6]["error"], "llm failed")
+        self.assertEqual(llm_calls.peak, 2)
+
+    def test_one_search_for_the_whole_batch(self):
+        retriever = rag_model.get_pipeline().retriever
+        with patch.object(retriever.vector_store.index, "search", wraps=retriever.vector_store.index.search) as search:
+            self.client.post("/NuBot/batch", json={"queries": ["a", "b", "c"]})
+        self.assertEqual(search.call_count, 1)
+        self.assertEqual(search.call_args[0][0].shape[0], 3)
+
+    def test_answer_cache_hits_skip_the_pipeline(self):
+        from src.dataflow.answer_cache import create_answer_cache
+        with patch.object(rag_model, "answer_cache", create_answer_cache("memory", threshold=0.99)):
+            self.client.post("/NuBot/batch", json={"queries": ["question 1"]})
+            with patch.object(rag_model.pipeline, "batch", wraps=rag_model.pipeline.batch) as batch:
+                results = self.client.post("/NuBot/batch", json={"queries": ["question 1", "question 2"]}).json["results"]
+        batch.assert_called_once()
+        self.assertEqual(batch.call_args[0][0], ["question 2"])
+        self.assertEqual(results[0]["answer"], "answer to question 1")
+
+    def test_rejects_bad_payloads(self):
+        self.assertEqual(self.client.post("/NuBot/batch", json={"queries": []}).status_code, 400)
+        self.assertEqual(self.client.post("/NuBot/batch", json={"queries": "one"}).status_code, 400)
+        with patch("main.BATCH_MAX_QUERIES", 2):
+            self.assertEqual(self.client.post("/NuBot/batch", json={"queries": ["a", "b", "c"]}).status_code, 400)
@@ -0,0 +1,65 @@
+import unittest
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from src.dataflow.context import estimate_tokens, pack_context
+
+PAGE = " ".join(f"Sentence {i} explains one rule of the Khoury co-op program in plain words." for i in range(60))
+
+
+def split_page(url="https://www.khoury.northeastern.edu/coop", start_index=True):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=80, add_start_index=start_index)
+    chunks = splitter.split_documents([Document(page_content=PAGE, metadata={"url": url})])
+    for chunk in chunks:
+        chunk.metadata["token_count"] = estimate_tokens(chunk.page_content)
+    return chunks
+
+
+class TestPackContext(unittest.TestCase):
+
+    def test_neighbouring_chunks_are_merged(self):
+        chunks = split_page()
+        docs, stats = pack_context([chunks[3], chunks[2], chunks[4]])
+        self.assertEqual(len(docs), 1)
+        self.assertIn(docs[0].page_content, PAGE)
+        self.assertTrue(docs[0].page_content.startswith(chunks[2].page_content))
+        self.assertTrue(docs[0].page_content.endswith(chunks[4].page_content))
+        self.assertLess(stats["tokens_out"], stats["tokens_in"])
+
+    def test_merge_without_start_index_uses_the_text_overlap(self):
+        chunks = split_page(start_index=False)
+        docs, _ = pack_context([chunks[5], chunks[6]])
+        self.assertEqual(len(docs), 1)
+        self.assertIn(docs[0].page_content, PAGE)
+
+    def test_a_later_chunk_can_bridge_two_passages(self):
+        chunks = split_page()
+        docs, _ = pack_context([chunks[1], chunks[3], chunks[2]])
+        self.assertEqual(len(docs), 1)
+
+    def test_other_pages_and_gaps_stay_separate(self):
+        chunks = split_page()
+        other = split_page(url="https://www.khoury.northeastern.edu/other")
+        docs, _ = pack_context([chunks[1], other[2], chunks[8]], dedup_threshold=1.1)
+        self.assertEqual(len(docs), 3)
+        self.assertEqual([d.metadata["url"] for d in docs], [chunks[1].metadata["url"], other[2].metadata["url"],
+                                                             chunks[8].metadata["url"]])
+
+    def test_near_duplicates_are_dropped(self):
+        doc = Document(page_content="Co-op lasts six months and is paid.", metadata={"url": "a"})
+        copy = Document(page_content="co-op lasts six months and is paid.", metadata={"url": "b"})
+        docs, _ = pack_context([doc, copy, doc])
+        self.assertEqual(docs[0].page_content, doc.page_content)
+        self.assertEqual(len(docs), 1)
+
+    def test_budget_is_filled_in_rank_order(self):
+        docs = [Document(page_content=" ".join([f"w{i}"] * n), metadata={"url": str(i), "token_count": n})
+                for i, n in enumerate([60, 50, 30, 20])]
+        packed, stats = pack_context(docs, token_budget=100)
+        # 60 fits, 50 does not, 30 does, 20 would exceed
+        self.assertEqual([d.metadata["url"] for d in packed], ["0", "2"])
+        self.assertEqual(stats["tokens_out"], 90)
+
+    def test_best_passage_is_kept_even_over_budget(self):
+        doc = Document(page_content="long " * 50, metadata={"url": "a", "token_count": 50})
+        packed, _ = pack_context([doc], token_budget=10)
+        self.assertEqual(len(packed), 1)
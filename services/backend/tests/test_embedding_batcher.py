@@ -0,0 +1,80 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.embeddings import Embeddings
+from src.dataflow.embedding_batcher import BatchingEmbeddings
+from src.utils.deadline import DeadlineExceeded, deadline
+
+
+class RecordingEncoder(Embeddings):
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def embed_documents(self, texts):
+        self.started.set()
+        self.release.wait(1)
+        self.calls.append(list(texts))
+        if "boom" in texts:
+            raise RuntimeError("encoder failed")
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class TestBatchingEmbeddings(unittest.TestCase):
+
+    def test_concurrent_queries_share_one_call(self):
+        encoder = RecordingEncoder()
+        batcher = BatchingEmbeddings(encoder, max_batch_size=8, max_wait_ms=50)
+        texts = ["a" * n for n in range(1, 9)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = [pool.submit(batcher.embed_query, text) for text in texts]
+            encoder.release.set()
+            results = [f.result() for f in futures]
+        # every caller gets the vector for its own text
+        self.assertEqual(results, [[float(len(text))] for text in texts])
+        self.assertLess(len(encoder.calls), len(texts))
+        self.assertTrue(all(len(call) <= 8 for call in encoder.calls))
+
+    def test_error_reaches_every_caller_in_the_batch(self):
+        encoder = RecordingEncoder()
+        encoder.release.set()
+        batcher = BatchingEmbeddings(encoder, max_batch_size=4, max_wait_ms=0)
+        with self.assertRaises(RuntimeError):
+            batcher.embed_query("boom")
+        # the worker keeps serving after a failed batch
+        self.assertEqual(batcher.embed_query("ok"), [2.0])
+
+    def test_lone_query_does_not_wait_for_the_window(self):
+        encoder = RecordingEncoder()
+        encoder.release.set()
+        batcher = BatchingEmbeddings(encoder, max_batch_size=8, max_wait_ms=1000)
+        start = time.monotonic()
+        self.assertEqual(batcher.embed_query("abc"), [3.0])
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_stuck_encoder_fails_the_request_at_its_deadline(self):
+        encoder = RecordingEncoder()
+        batcher = BatchingEmbeddings(encoder, max_batch_size=1, max_wait_ms=0, timeout=30)
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            # the worker is busy with this one until release
+            first = pool.submit(batcher.embed_query, "first")
+            encoder.started.wait(1)
+            with deadline(0.1):
+                with self.assertRaises(DeadlineExceeded):
+                    batcher.embed_query("abandoned")
+            self.assertLess(time.monotonic() - start, 0.5)
+            encoder.release.set()
+            self.assertEqual(first.result(), [5.0])
+        # the abandoned text is never encoded
+        self.assertEqual(batcher.embed_query("next"), [4.0])
+        self.assertEqual(encoder.calls, [["first"], ["next"]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from src.dataflow import rag_model
+
+
+class TestIndexHotSwap(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with patch.dict(os.environ, {"INIT_ON_START": "lazy", "INDEX_POLL_SECONDS": "0"}):
+            import main
+        cls.main = main
+        cls.client = main.app.test_client()
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        # FAISS_INDEX_FOLDER is both the bucket prefix and the local folder
+        cwd = os.getcwd()
+        os.chdir(tmp.name)
+        self.addCleanup(os.chdir, cwd)
+        self.bucket_dir = os.path.join(tmp.name, "bucket")
+        self.embeddings = DeterministicFakeEmbedding(size=16)
+        self.publish("v1")
+        for target in (patch.dict(os.environ, {"LOCAL_BUCKET_DIR": self.bucket_dir}),
+                       patch.object(rag_model, "FAISS_INDEX_FOLDER", "faiss_index"),
+                       patch.object(rag_model, "pipeline", None),
+                       patch.object(rag_model, "answer_cache", None),
+                       patch.dict(rag_model._readiness, {"status": "not_started", "error": None}),
+                       patch.dict(rag_model._index_state, {"reloads": 0, "last_error": None}),
+                       patch.dict(rag_model._watcher, {"thread": None, "pid": None}),
+                       patch.object(self.main, "ADMIN_TOKEN", None)):
+            target.start()
+            self.addCleanup(target.stop)
+        retriever = rag_model.build_retriever(self.embeddings, rag_model.download_index())
+        rag_model.init(retriever=retriever, llm=FakeListChatModel(responses=["ok"]), tracking_enabled=False)
+
+    def publish(self, tag):
+        """Build an index whose chunks all mention tag and upload it to the local bucket."""
+        folder = os.path.join(self.bucket_dir, "faiss_index")
+        texts = [f"{tag} chunk {i}" for i in range(20)]
+        FAISS.from_texts(texts, self.embeddings).save_local(folder)
+        # a new generation even on coarse mtime clocks
+        for filename in os.listdir(folder):
+            path = os.path.join(folder, filename)
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000 * len(tag)))
+
+    def answer_tags(self, retriever):
+        return {doc.page_content.split()[0] for doc in retriever.invoke("which version?")}
+
+    def test_new_version_is_swapped_in(self):
+        old = rag_model.get_pipeline().retriever
+        self.assertEqual(self.answer_tags(old), {"v1"})
+        self.assertEqual(rag_model.reload_index()["reloads"], 0)
+
+        self.publish("v22")
+        status = rag_model.reload_index()
+        new = rag_model.get_pipeline().retriever
+        self.assertEqual(status["reloads"], 1)
+        self.assertNotEqual(new.index_version, old.index_version)
+        self.assertEqual(status["index_version"], new.index_version)
+        self.assertEqual(self.answer_tags(new), {"v22"})
+        # a request that still holds the old retriever finishes on the old index
+        old.cache.clear()
+        self.assertEqual(self.answer_tags(old), {"v1"})
+
+    def test_mixed_build_is_not_swapped_in(self):
+        from src.dataflow.index_store import BUILD_MANIFEST_FILE
+        from src.utils.local_bucket import file_md5
+        version = rag_model.get_pipeline().retriever.index_version
+        self.publish("v22")
+        folder = os.path.join(self.bucket_dir, "faiss_index")
+        files = {name: {"md5_hash": file_md5(os.path.join(folder, name)), "size": os.path.getsize(os.path.join(folder, name))}
+                 for name in os.listdir(folder)}
+        # a manifest whose counts disagree with the files, as if they came from another build
+        with open(os.path.join(folder, BUILD_MANIFEST_FILE), "w") as f:
+            json.dump({"files": files, "counts": {"vectors": 21}}, f)
+        with self.assertRaises(ValueError):
+            rag_model.reload_index()
+        self.assertEqual(rag_model.get_pipeline().retriever.index_version, version)
+        self.assertIn("different builds", rag_model.index_status()["last_error"])
+
+    def test_failed_reload_keeps_serving(self):
+        version = rag_model.get_pipeline().retriever.index_version
+        with patch.object(rag_model, "download_index", side_effect=IOError("bucket unreachable")):
+            with self.assertRaises(IOError):
+                rag_model.reload_index()
+        self.assertEqual(rag_model.get_pipeline().retriever.index_version, version)
+        self.assertEqual(rag_model.index_status()["last_error"], "bucket unreachable")
+
+    def test_admin_endpoint(self):
+        response = self.client.get("/NuBot/admin/index")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["index_version"], rag_model.get_pipeline().retriever.index_version)
+        response = self.client.post("/NuBot/admin/index")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["reloads"], 1)
+        with patch.object(self.main, "ADMIN_TOKEN", "secret"):
+            self.assertEqual(self.client.post("/NuBot/admin/index").status_code, 401)
+            response = self.client.get("/NuBot/admin/index", headers={"X-Admin-Token": "secret"})
+            self.assertEqual(response.status_code, 200)
+
+    def test_watcher_picks_up_new_index(self):
+        version = rag_model.get_pipeline().retriever.index_version
+        rag_model.start_index_watcher(interval=0.05)
+        self.publish("v333")
+        deadline = time.monotonic() + 10
+        while rag_model.get_pipeline().retriever.index_version == version and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.answer_tags(rag_model.get_pipeline().retriever), {"v333"})
+        # stops on its next tick
+        rag_model._watcher["thread"] = None
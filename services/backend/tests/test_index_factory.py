@@ -0,0 +1,101 @@
+import tempfile
+import unittest
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.dataflow.index_factory import (build_index, index_spec, read_index_params, rebuild_vector_store_index,
+                                        save_index_params)
+from src.dataflow.index_store import load_vector_store
+
+
+class TestIndexFactory(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.vectors = rng.standard_normal((4000, 32)).astype(np.float32)
+        self.queries = self.vectors[:50] + 0.01 * rng.standard_normal((50, 32)).astype(np.float32)
+        flat = faiss.IndexFlatL2(32)
+        flat.add(self.vectors)
+        self.truth = flat.search(self.queries, 10)[1]
+
+    def recall(self, index):
+        found = index.search(self.queries, 10)[1]
+        return np.mean([len(set(a) & set(b)) / 10 for a, b in zip(found, self.truth)])
+
+    def test_index_types(self):
+        for index_type, kwargs, expected in (("Flat", {}, faiss.IndexFlat),
+                                             ("IVF", {"nprobe": 64}, faiss.IndexIVFFlat),
+                                             ("HNSW", {"ef_search": 128}, faiss.IndexHNSWFlat)):
+            index, params = build_index(self.vectors, index_type=index_type, **kwargs)
+            self.assertIsInstance(index, expected)
+            self.assertEqual(params["ntotal"], 4000)
+            self.assertGreater(self.recall(index), 0.95, index_type)
+
+    def test_nlist_defaults_to_what_training_can_fill(self):
+        self.assertEqual(index_spec("IVF", 4000), "IVF102,Flat")
+        self.assertEqual(index_spec("IVF", 100), "IVF2,Flat")
+        with self.assertRaises(ValueError):
+            index_spec("LSH", 100)
+
+    def test_compressed_storage(self):
+        sizes = {}
+        for storage, min_recall in (("float32", 0.99), ("fp16", 0.99), ("sq8", 0.9), ("pq", 0.1)):
+            index, params = build_index(self.vectors, storage=storage)
+            self.assertEqual(params["storage"], storage)
+            self.assertGreater(self.recall(index), min_recall, storage)
+            sizes[storage] = faiss.serialize_index(index).size
+        self.assertLess(sizes["fp16"], sizes["float32"] * 0.55)
+        self.assertLess(sizes["sq8"], sizes["float32"] * 0.3)
+        self.assertLess(sizes["pq"], sizes["sq8"])
+
+    def test_rerank_recovers_exact_order(self):
+        for index_type in ("Flat", "IVF", "HNSW"):
+            index, params = build_index(self.vectors, index_type=index_type, storage="sq8", rerank=True,
+                                        nprobe=64, ef_search=128)
+            self.assertIsInstance(index, faiss.IndexRefineFlat)
+            self.assertTrue(params["factory"].endswith(",RFlat"))
+            self.assertEqual(params["search"]["k_factor_rf"], 4)
+            self.assertGreater(self.recall(index), 0.95, index_type)
+        pq, _ = build_index(self.vectors, storage="pq")
+        reranked, _ = build_index(self.vectors, storage="pq", rerank=True, k_factor=16)
+        self.assertGreater(self.recall(reranked), self.recall(pq) + 0.3)
+
+    def test_storage_specs(self):
+        self.assertEqual(index_spec("Flat", 4000, storage="pq", dimension=384), "PQ48x8")
+        self.assertEqual(index_spec("IVF", 4000, storage="sq8", dimension=384, rerank=True), "IVF102,SQ8,RFlat")
+        self.assertEqual(index_spec("HNSW", 4000, storage="fp16", dimension=384), "HNSW32,SQfp16")
+        # float32 is already exact, nothing to rerank
+        self.assertEqual(index_spec("HNSW", 4000, rerank=True), "HNSW32")
+        with self.assertRaises(ValueError):
+            index_spec("Flat", 4000, storage="pq", dimension=384, pq_m=50)
+        with self.assertRaises(ValueError):
+            index_spec("Flat", 4000, storage="int4", dimension=384)
+
+    def test_saved_knobs_are_applied_on_load(self):
+        embeddings = DeterministicFakeEmbedding(size=16)
+        vector_store = FAISS.from_texts([f"chunk {i}" for i in range(500)], embeddings)
+        params = rebuild_vector_store_index(vector_store, index_type="IVF", nlist=8, nprobe=3)
+        # positions are kept, so ids still line up with the docstore
+        self.assertEqual(vector_store.similarity_search("chunk 7", k=1)[0].page_content, "chunk 7")
+        with tempfile.TemporaryDirectory() as folder:
+            vector_store.save_local(folder)
+            save_index_params(folder, params)
+            for mode in ("memory", "mmap"):
+                loaded = load_vector_store(folder, embeddings, mode=mode)
+                self.assertEqual(faiss.extract_index_ivf(loaded.index).nprobe, 3)
+            loaded = load_vector_store(folder, embeddings, search_params={"nprobe": 8, "efSearch": 99})
+            self.assertEqual(faiss.extract_index_ivf(loaded.index).nprobe, 8)
+
+    def test_reranked_index_loads_mmapped(self):
+        embeddings = DeterministicFakeEmbedding(size=16)
+        vector_store = FAISS.from_texts([f"chunk {i}" for i in range(500)], embeddings)
+        params = rebuild_vector_store_index(vector_store, storage="sq8", rerank=True, k_factor=2)
+        with tempfile.TemporaryDirectory() as folder:
+            vector_store.save_local(folder)
+            save_index_params(folder, params)
+            self.assertEqual(read_index_params(folder)["storage"], "sq8")
+            loaded = load_vector_store(folder, embeddings, mode="mmap", search_params={"k_factor_rf": 8})
+            self.assertIsInstance(loaded.index, faiss.IndexRefineFlat)
+            self.assertEqual(loaded.index.k_factor, 8)
+            self.assertEqual(loaded.similarity_search("chunk 7", k=1)[0].page_content, "chunk 7")
@@ -0,0 +1,157 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from src.dataflow.index_store import (BUILD_MANIFEST_FILE, MANIFEST_FILE, check_index_counts, load_vector_store,
+                                     manifest_version, read_manifest, sync_index)
+from src.utils.local_bucket import LocalBucket, LocalBlob, file_md5
+
+
+class TestSyncIndex(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.bucket_dir = os.path.join(tmp.name, "bucket")
+        self.local_dir = os.path.join(tmp.name, "faiss_index")
+        self.bucket = LocalBucket(self.bucket_dir)
+        self.upload("index.faiss", b"vectors-v1")
+        self.upload("index.pkl", b"docstore-v1")
+
+    def upload(self, filename, content):
+        path = os.path.join(self.bucket_dir, "faiss_index", filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+        # make sure the generation changes even on coarse mtime clocks
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def publish_manifest(self, *filenames):
+        """Upload a build manifest listing filenames as they are in the bucket now, like the Prefect flow does."""
+        files = {}
+        for filename in filenames:
+            path = os.path.join(self.bucket_dir, "faiss_index", filename)
+            files[filename] = {"md5_hash": file_md5(path), "size": os.path.getsize(path)}
+        self.upload(BUILD_MANIFEST_FILE, json.dumps({"files": files, "counts": {}}).encode())
+
+    def read_local(self, filename):
+        with open(os.path.join(self.local_dir, filename), "rb") as f:
+            return f.read()
+
+    def test_cold_then_warm(self):
+        _, downloaded = sync_index(self.bucket, "faiss_index", self.local_dir)
+        self.assertEqual(sorted(downloaded), ["index.faiss", "index.pkl"])
+        self.assertEqual(self.read_local("index.pkl"), b"docstore-v1")
+        _, downloaded = sync_index(self.bucket, "faiss_index", self.local_dir)
+        self.assertEqual(downloaded, [])
+
+    def test_only_changed_files_are_downloaded(self):
+        manifest, _ = sync_index(self.bucket, "faiss_index", self.local_dir)
+        self.upload("index.faiss", b"vectors-v2")
+        new_manifest, downloaded = sync_index(self.bucket, "faiss_index", self.local_dir)
+        self.assertEqual(downloaded, ["index.faiss"])
+        self.assertEqual(self.read_local("index.faiss"), b"vectors-v2")
+        self.assertNotEqual(manifest_version(manifest), manifest_version(new_manifest))
+
+    def test_identical_files_without_manifest_are_kept(self):
+        sync_index(self.bucket, "faiss_index", self.local_dir)
+        os.remove(os.path.join(self.local_dir, MANIFEST_FILE))
+        _, downloaded = sync_index(self.bucket, "faiss_index", self.local_dir)
+        self.assertEqual(downloaded, [])
+
+    def test_removed_blob_is_removed_locally(self):
+        sync_index(self.bucket, "faiss_index", self.local_dir)
+        os.remove(os.path.join(self.bucket_dir, "faiss_index", "index.pkl"))
+        sync_index(self.bucket, "faiss_index", self.local_dir)
+        self.assertFalse(os.path.exists(os.path.join(self.local_dir, "index.pkl")))
+
+    def test_failed_download_keeps_previous_files(self):
+        sync_index(self.bucket, "faiss_index", self.local_dir)
+        self.upload("index.faiss", b"vectors-v2")
+        self.upload("index.pkl", b"docstore-v2")
+
+        def truncated(blob, filename):
+            with open(filename, "wb") as f:
+                f.write(b"partial")
+
+        with patch.object(LocalBlob, "download_to_filename", truncated):
+            with self.assertRaises(IOError):
+                sync_index(self.bucket, "faiss_index", self.local_dir)
+        self.assertEqual(self.read_local("index.faiss"), b"vectors-v1")
+        self.assertEqual(self.read_local("index.pkl"), b"docstore-v1")
+        self.assertEqual(sorted(os.listdir(self.local_dir)), [MANIFEST_FILE, "index.faiss", "index.pkl"])
+        self.assertIn("index.faiss", read_manifest(self.local_dir))
+
+    def test_incomplete_upload_is_not_synced(self):
+        self.publish_manifest("index.faiss", "index.pkl")
+        sync_index(self.bucket, "faiss_index", self.local_dir)
+        # the next build has uploaded its vectors but not yet its docstore and manifest
+        self.upload("index.faiss", b"vectors-v2")
+        with self.assertRaises(IOError):
+            sync_index(self.bucket, "faiss_index", self.local_dir)
+        self.assertEqual(self.read_local("index.faiss"), b"vectors-v1")
+        self.upload("index.pkl", b"docstore-v2")
+        self.publish_manifest("index.faiss", "index.pkl")
+        _, downloaded = sync_index(self.bucket, "faiss_index", self.local_dir)
+        self.assertEqual(sorted(downloaded), [BUILD_MANIFEST_FILE, "index.faiss", "index.pkl"])
+        self.assertEqual(self.read_local("index.pkl"), b"docstore-v2")
+
+    def test_blobs_left_out_of_the_build_are_not_synced(self):
+        self.upload("partitions.json", b"{}")
+        sync_index(self.bucket, "faiss_index", self.local_dir)
+        self.publish_manifest("index.faiss", "index.pkl")
+        manifest, _ = sync_index(self.bucket, "faiss_index", self.local_dir)
+        self.assertNotIn("partitions.json", manifest)
+        self.assertFalse(os.path.exists(os.path.join(self.local_dir, "partitions.json")))
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class TestLoadVectorStore(unittest.TestCase):
+
+    def setUp(self):
+        from langchain_community.vectorstores import FAISS
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.folder = tmp.name
+        self.embeddings = DeterministicFakeEmbedding(size=16)
+        self.texts = [f"chunk about topic {i}" for i in range(50)]
+        FAISS.from_texts(self.texts, self.embeddings, metadatas=[{"url": f"https://example.edu/{i}"} for i in range(50)]).save_local(self.folder)
+
+    def test_mmap_matches_memory(self):
+        memory = load_vector_store(self.folder, self.embeddings, mode="memory")
+        mmap = load_vector_store(self.folder, self.embeddings, mode="mmap")
+        for text in self.texts[:5]:
+            expected = memory.similarity_search(text, k=3)
+            found = mmap.similarity_search(text, k=3)
+            self.assertEqual([(d.page_content, d.metadata) for d in found], [(d.page_content, d.metadata) for d in expected])
+
+    def test_docstore_is_rebuilt_for_a_new_index(self):
+        from langchain_community.vectorstores import FAISS
+        load_vector_store(self.folder, self.embeddings, mode="mmap")
+        stat = os.stat(os.path.join(self.folder, "index.pkl"))
+        FAISS.from_texts(["replacement chunk"], self.embeddings).save_local(self.folder)
+        # the new pickle must look newer than the converted docstore
+        os.utime(os.path.join(self.folder, "index.pkl"), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        store = load_vector_store(self.folder, self.embeddings, mode="mmap")
+        self.assertEqual(store.similarity_search("anything", k=1)[0].page_content, "replacement chunk")
+
+    def test_files_of_different_builds_are_refused(self):
+        from src.dataflow.lexical import build_bm25_index, open_bm25_index
+        store = load_vector_store(self.folder, self.embeddings, mode="mmap")
+        build_bm25_index(self.texts, os.path.join(self.folder, "bm25.idx"))
+        check_index_counts(store, open_bm25_index(self.folder), counts={"vectors": 50})
+        build_bm25_index(self.texts[:40], os.path.join(self.folder, "bm25.idx"))
+        with self.assertRaisesRegex(ValueError, "bm25"):
+            check_index_counts(store, open_bm25_index(self.folder))
+        with self.assertRaisesRegex(ValueError, BUILD_MANIFEST_FILE):
+            check_index_counts(store, counts={"vectors": 60})
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            load_vector_store(self.folder, self.embeddings, mode="gpu")
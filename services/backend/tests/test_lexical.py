@@ -0,0 +1,119 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.dataflow import lexical
+from src.dataflow.lexical import Bm25Index, build_bm25_index, open_bm25_index, reciprocal_rank_fusion, tokenize
+from src.dataflow.retrieval import Retriever
+
+TEXTS = [
+    "CS 5200 Database Management Systems covers SQL, schema design and transactions.",
+    "CS5800 Algorithms is a core course for the MS in Computer Science.",
+    "Professor Jane Doe teaches machine learning and advises co-op students.",
+    "Co-op lasts six months; students apply through the NUworks portal.",
+    "The Khoury graduate handbook lists every database and systems elective.",
+]
+
+
+class TestBm25Index(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "bm25.idx")
+        build_bm25_index(TEXTS, self.path)
+        self.index = Bm25Index(self.path)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_course_codes_match_with_or_without_space(self):
+        self.assertIn("cs5200", tokenize("cs 5200"))
+        self.assertEqual(self.index.search("CS5200", k=1), [0])
+        self.assertEqual(self.index.search("what is cs 5800?", k=1), [1])
+
+    def test_ranks_by_bm25(self):
+        self.assertEqual(self.index.search("jane doe", k=3), [2])
+        hits = self.index.search("database systems", k=3)
+        self.assertEqual(sorted(hits), [0, 4])
+        self.assertEqual(len(self.index), len(TEXTS))
+
+    def test_unknown_and_stopword_queries_find_nothing(self):
+        self.assertEqual(self.index.search("quantum basketweaving"), [])
+        self.assertEqual(self.index.search("what is the"), [])
+
+    def test_mapping_survives_a_newer_index_renamed_over_it(self):
+        build_bm25_index(["nothing in common"], self.path)
+        self.assertEqual(self.index.search("jane", k=1), [2])
+        self.assertEqual(len(Bm25Index(self.path)), 1)
+
+    def test_missing_file_means_no_lexical_index(self):
+        self.assertIsNone(open_bm25_index(os.path.join(self.folder.name, "missing")))
+
+    def test_reciprocal_rank_fusion(self):
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]], k=3)
+        # c is in both lists; b and d tie at rank 2 and b was seen first
+        self.assertEqual(fused, ["c", "a", "b"])
+
+
+def load_prefect_lexical():
+    """The Prefect flow's copy of lexical.py, which builds the indexes the backend serves."""
+    path = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, os.pardir, "prefectWorkflows", "dataflow",
+                        "lexical.py")
+    spec = importlib.util.spec_from_file_location("prefect_lexical", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class TestCommonTerms(unittest.TestCase):
+    """A term in more documents than max_postings; later (shorter) documents weigh more."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "bm25.idx")
+        self.texts = ["library " + "hours " * (1200 - i) for i in range(1200)]
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_index_built_by_the_prefect_flow_returns_the_best_documents(self):
+        load_prefect_lexical().build_bm25_index(self.texts, self.path)
+        index = Bm25Index(self.path)
+        self.assertTrue(index.meta["sorted"])
+        expected = index.search("library", k=5, max_postings=len(self.texts))
+        self.assertEqual(index.search("library", k=5), expected)
+        self.assertEqual(expected, [1199, 1198, 1197, 1196, 1195])
+
+    def test_unsorted_index_is_not_cut(self):
+        build_bm25_index(self.texts, self.path)
+        index = Bm25Index(self.path)
+        expected = index.search("library", k=5)
+        # rewrite it as older builds did: postings in document order, no "sorted" flag
+        order = np.concatenate([lo + np.argsort(index.docs[lo:hi], kind="stable")
+                                for lo, hi in zip(index.offsets[:-1], index.offsets[1:])])
+        arrays = {"term_hashes": index.term_hashes, "offsets": index.offsets, "docs": index.docs[order],
+                  "weights": index.weights[order]}
+        meta = {name: value for name, value in index.meta.items() if name != "sorted"}
+        lexical._write(self.path, meta, arrays)
+        self.assertEqual(Bm25Index(self.path).search("library", k=5, max_postings=10), expected)
+
+
+class TestHybridRetriever(unittest.TestCase):
+
+    def test_exact_term_is_fused_into_dense_results(self):
+        embeddings = DeterministicFakeEmbedding(size=16)
+        texts = TEXTS + [f"filler chunk {i}" for i in range(30)]
+        vector_store = FAISS.from_texts(texts, embeddings)
+        dense = Retriever(vector_store, embeddings, k=3)
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "bm25.idx")
+            build_bm25_index(texts, path)
+            hybrid = Retriever(vector_store, embeddings, k=3, lexical=Bm25Index(path))
+            self.assertNotEqual(dense.invoke("CS 5200")[0].page_content, TEXTS[0])
+            self.assertEqual(hybrid.invoke("CS 5200")[0].page_content, TEXTS[0])
+            batched = hybrid.invoke_batch(["CS 5200", "jane doe"])
+            self.assertEqual(batched[0][0].page_content, TEXTS[0])
+            self.assertIn(TEXTS[2], [d.page_content for d in batched[1]])
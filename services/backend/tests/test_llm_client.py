@@ -0,0 +1,224 @@
+import asyncio
+import os
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from benchmarks.fake_llm_server import FakeLLMServer
+from src.dataflow import rag_model
+from src.dataflow.llm_client import HttpChatModel, ResilientChatModel
+from src.dataflow.retrieval import Retriever
+from src.utils.deadline import DeadlineExceeded, deadline
+
+
+class TestResilientChatModel(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeLLMServer(latency_ms=10, seed=0).start()
+        self.addCleanup(self.server.stop)
+
+    def llm(self, **kwargs):
+        return ResilientChatModel(inner=HttpChatModel(endpoint=self.server.url, model="fake", timeout=5), **kwargs)
+
+    def test_calls_reuse_pooled_connections(self):
+        llm = self.llm()
+        answers = [llm.invoke(f"question {i}").content for i in range(5)]
+        self.assertEqual(answers, [f"answer to question {i}" for i in range(5)])
+        self.assertEqual(len(self.server.peers), 1)
+
+    def test_retryable_errors_are_retried(self):
+        self.server.script = [503, 429]
+        llm = self.llm(max_retries=2, backoff_base=0.01)
+        self.assertEqual(llm.invoke("hi").content, "answer to hi")
+        self.assertEqual(llm.stats()["retries"], 2)
+        self.assertEqual(self.server.requests, 3)
+
+    def test_client_errors_and_exhausted_retries_raise(self):
+        self.server.script = [400]
+        with self.assertRaises(Exception):
+            self.llm().invoke("hi")
+        self.assertEqual(self.server.requests, 1)
+        self.server.script = [503, 503]
+        llm = self.llm(max_retries=1, backoff_base=0.01)
+        with self.assertRaises(Exception):
+            llm.invoke("hi")
+        self.assertEqual(llm.stats()["errors"], 1)
+
+    def test_deadline_stops_a_slow_call(self):
+        self.server.latency_ms = 2000
+        llm = self.llm()
+        start = time.perf_counter()
+        with deadline(0.3), self.assertRaises(DeadlineExceeded):
+            llm.invoke("hi")
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(llm.stats()["deadline_exceeded"], 1)
+
+    def test_hedged_request_cuts_the_tail(self):
+        llm = self.llm(hedge=True, hedge_min_delay=0.02)
+        for i in range(30):
+            llm.invoke(f"warm {i}")
+        # one request in 25 now stalls for 1.5 s; its hedge is answered at normal speed
+        self.server.jitter_ms, self.server.slow_rate, self.server.slow_ms = 10, 0.04, 1500
+        with ThreadPoolExecutor(4) as pool:
+            def timed(i):
+                start = time.perf_counter()
+                llm.invoke(f"question {i}")
+                return time.perf_counter() - start
+            latencies = list(pool.map(timed, range(100)))
+        stats = llm.stats()
+        self.assertGreater(stats["hedge_wins"], 0)
+        # only a request whose hedge stalls as well can still be slow
+        self.assertLessEqual(sum(latency > 1.0 for latency in latencies), 1)
+        self.assertLess(stats["hedges"], 30)
+
+    def test_stream_is_forwarded(self):
+        chunks = [chunk.content for chunk in self.llm().stream("one two")]
+        self.assertEqual("".join(chunks).split(), ["answer", "to", "one", "two"])
+
+    def test_async_calls_share_a_pool_and_are_retried(self):
+        self.server.script = [503]
+        llm = self.llm(backoff_base=0.01)
+
+        async def run():
+            answers = await asyncio.gather(*[llm.ainvoke(f"question {i}") for i in range(10)])
+            chunks = [chunk.content async for chunk in llm.astream("one two")]
+            return [answer.content for answer in answers], chunks
+
+        answers, chunks = asyncio.run(run())
+        self.assertEqual(answers, [f"answer to question {i}" for i in range(10)])
+        self.assertEqual("".join(chunks).split(), ["answer", "to", "one", "two"])
+        self.assertEqual(llm.stats()["retries"], 1)
+        self.assertLessEqual(len(self.server.peers), 11)
+
+    def test_async_deadline_cancels_the_attempt(self):
+        self.server.latency_ms = 2000
+        llm = self.llm()
+
+        async def run():
+            with deadline(0.3):
+                await llm.ainvoke("hi")
+
+        start = time.perf_counter()
+        with self.assertRaises(DeadlineExceeded):
+            asyncio.run(run())
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(llm.stats()["deadline_exceeded"], 1)
+
+
+class StallingChatModel(BaseChatModel):
+    """Answers after delay; a stream sends "one" after first_delay and "two" after next_delay, then records its close."""
+
+    delay: float = 0.0
+    first_delay: float = 0.0
+    next_delay: float = 0.0
+    closed: list = []
+
+    @property
+    def _llm_type(self):
+        return "stalling"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="done"))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        try:
+            time.sleep(self.first_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content="one"))
+            time.sleep(self.next_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content="two"))
+        finally:
+            self.closed.append(True)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        try:
+            await asyncio.sleep(self.first_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content="one"))
+            await asyncio.sleep(self.next_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content="two"))
+        finally:
+            self.closed.append(True)
+
+
+class TestResilientTimeouts(unittest.TestCase):
+
+    def test_own_timeout_holds_under_a_longer_request_deadline(self):
+        llm = ResilientChatModel(inner=StallingChatModel(delay=3), timeout=0.3)
+        start = time.perf_counter()
+        with deadline(60), self.assertRaises(DeadlineExceeded):
+            llm.invoke("hi")
+        self.assertLess(time.perf_counter() - start, 1.0)
+
+    def test_stream_given_up_before_its_first_chunk_is_closed(self):
+        inner = StallingChatModel(first_delay=0.5, closed=[])
+        llm = ResilientChatModel(inner=inner, timeout=0.2)
+        with self.assertRaises(DeadlineExceeded):
+            list(llm.stream("hi"))
+        self.assertEqual(inner.closed, [])
+        time.sleep(0.5)
+        self.assertEqual(inner.closed, [True])
+
+    def test_stream_stalling_after_its_first_chunk_hits_the_deadline(self):
+        inner = StallingChatModel(next_delay=2, closed=[])
+        llm = ResilientChatModel(inner=inner, timeout=0.3)
+        chunks, start = [], time.perf_counter()
+        with self.assertRaises(DeadlineExceeded):
+            for chunk in llm.stream("hi"):
+                chunks.append(chunk.content)
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(chunks, ["one"])
+        self.assertEqual(llm.stats()["deadline_exceeded"], 1)
+
+    def test_async_stream_stalling_after_its_first_chunk_hits_the_deadline(self):
+        inner = StallingChatModel(next_delay=2, closed=[])
+        llm = ResilientChatModel(inner=inner, timeout=0.3)
+        chunks = []
+
+        async def run():
+            async for chunk in llm.astream("hi"):
+                chunks.append(chunk.content)
+
+        start = time.perf_counter()
+        with self.assertRaises(DeadlineExceeded):
+            asyncio.run(run())
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(chunks, ["one"])
+        self.assertEqual(inner.closed, [True])
+
+
+class TestRequestDeadline(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with patch.dict(os.environ, {"INIT_ON_START": "lazy"}):
+            import main
+        cls.client = main.app.test_client()
+
+    def setUp(self):
+        from langchain_core.prompts import PromptTemplate
+        self.server = FakeLLMServer(latency_ms=1500).start()
+        self.addCleanup(self.server.stop)
+        embeddings = DeterministicFakeEmbedding(size=16)
+        vector_store = FAISS.from_texts([f"chunk {i}" for i in range(20)], embeddings)
+        for target in (patch.object(rag_model, "pipeline", None),
+                       patch.object(rag_model, "answer_cache", None),
+                       patch.object(rag_model, "get_prompt", lambda: PromptTemplate.from_template("{context}\n{question}")),
+                       patch.dict(rag_model._readiness, {"status": "not_started", "error": None})):
+            target.start()
+            self.addCleanup(target.stop)
+        llm = ResilientChatModel(inner=HttpChatModel(endpoint=self.server.url, model="fake"))
+        rag_model.init(retriever=Retriever(vector_store, embeddings, k=3, index_version="v1"), llm=llm, tracking_enabled=False)
+
+    def test_header_sets_the_request_deadline(self):
+        start = time.perf_counter()
+        response = self.client.post("/NuBot/", json={"query": "slow question"}, headers={"X-Request-Timeout": "0.3"})
+        self.assertLess(time.perf_counter() - start, 1.2)
+        self.assertIn("deadline", response.json["details"])
+        self.assertEqual(rag_model.cacheStats()["llm"]["deadline_exceeded"], 1)
+        response = self.client.post("/NuBot/", json={"query": "slow question"})
+        self.assertEqual(response.json, "answer to slow question")
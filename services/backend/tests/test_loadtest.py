@@ -0,0 +1,32 @@
+import json
+import os
+import tempfile
+import unittest
+from benchmarks import loadtest
+
+
+class TestLoadTest(unittest.TestCase):
+
+    def test_small_run_saves_per_stage_percentiles(self):
+        with tempfile.TemporaryDirectory() as folder:
+            args = loadtest.parse_args(["--concurrency", "1", "3", "--requests", "12", "--warmup", "2",
+                                        "--chunks", "300", "--sites", "3", "--dimension", "32", "--encoder-ms", "0",
+                                        "--llm-latency-ms", "5", "--llm-jitter-ms", "0", "--output-dir", folder])
+            path = loadtest.run(args)
+            with open(path) as f:
+                result = json.load(f)
+        self.assertEqual([level["concurrency"] for level in result["levels"]], [1, 3])
+        self.assertEqual(result["config"]["chunks"], 300)
+        for level in result["levels"]:
+            self.assertEqual(level["requests"], 12)
+            self.assertEqual(level["errors"], 0)
+            self.assertGreater(level["throughput_rps"], 0)
+            latency = level["latency_ms"]
+            for stage in ("client_total", "server_total", "encode", "search", "prompt", "llm"):
+                self.assertLessEqual(latency[stage]["p50"], latency[stage]["p99"])
+            self.assertEqual(latency["server_total"]["count"], 12)
+            self.assertGreaterEqual(latency["client_total"]["p50"], latency["llm"]["p50"])
+
+
+if __name__ == "__main__":
+    unittest.main()
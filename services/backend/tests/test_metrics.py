@@ -0,0 +1,127 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.dataflow import rag_model
+from src.dataflow.retrieval import Retriever
+from src.utils.metrics import Counter, Gauge, Histogram, Registry
+from helpers import EchoChatModel, sample
+
+
+class TestMetricTypes(unittest.TestCase):
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = Registry()
+        latency = Histogram("latency_seconds", "Latency", ["stage"], registry=registry, buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            latency.observe(value, "encode")
+        text = registry.render()
+        self.assertIn("# TYPE latency_seconds histogram", text)
+        self.assertEqual(sample(text, "latency_seconds_bucket", stage="encode", le="0.1"), 2)
+        self.assertEqual(sample(text, "latency_seconds_bucket", stage="encode", le="1"), 3)
+        self.assertEqual(sample(text, "latency_seconds_bucket", stage="encode", le="+Inf"), 4)
+        self.assertAlmostEqual(sample(text, "latency_seconds_sum", stage="encode"), 3.65)
+        self.assertEqual(sample(text, "latency_seconds_count", stage="encode"), 4)
+
+    def test_counters_gauges_and_label_escaping(self):
+        registry = Registry()
+        hits = Counter("hits_total", "Hits", ["cache"], registry=registry)
+        version = Gauge("index_info", "Version", ["version"], registry=registry)
+        hits.inc("answer")
+        hits.inc("answer", amount=2)
+        version.set(1, 'v"1')
+        text = registry.render()
+        self.assertEqual(sample(text, "hits_total", cache="answer"), 3)
+        self.assertIn('index_info{version="v\\"1"} 1', text)
+
+    def test_other_workers_snapshots_are_added(self):
+        with tempfile.TemporaryDirectory() as folder:
+            registry = Registry(directory=folder)
+            errors = Counter("errors_total", "Errors", registry=registry)
+            in_flight = Gauge("in_flight", "In flight", registry=registry, multiprocess="sum")
+            errors.inc()
+            in_flight.inc()
+            dead_pid = 2 ** 22 + 1
+            for pid in (os.getppid(), dead_pid):
+                with open(os.path.join(folder, f"{pid}.json"), "w") as f:
+                    json.dump({"errors_total": [[[], 2]], "in_flight": [[[], 3]]}, f)
+            text = registry.render()
+        self.assertEqual(sample(text, "errors_total"), 5)
+        # the dead worker's requests are not in flight any more
+        self.assertEqual(sample(text, "in_flight"), 4)
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with patch.dict(os.environ, {"INIT_ON_START": "lazy"}):
+            import main
+        cls.client = main.app.test_client()
+
+    def setUp(self):
+        from langchain_core.prompts import PromptTemplate
+        embeddings = DeterministicFakeEmbedding(size=16)
+        vector_store = FAISS.from_texts([f"chunk {i}" for i in range(20)], embeddings)
+        for target in (patch.object(rag_model, "pipeline", None),
+                       patch.object(rag_model, "answer_cache", None),
+                       patch.object(rag_model, "get_prompt", lambda: PromptTemplate.from_template("{context}\n{question}")),
+                       patch.dict(rag_model._readiness, {"status": "not_started", "error": None})):
+            target.start()
+            self.addCleanup(target.stop)
+        rag_model.init(retriever=Retriever(vector_store, embeddings, k=3, index_version="v7"), llm=EchoChatModel(),
+                       tracking_enabled=False)
+
+    def metrics(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        return response.get_data(as_text=True)
+
+    def test_stages_requests_and_cache_hits(self):
+        before = self.metrics()
+        for query in ("Who teaches CS 5200?", "who teaches cs 5200?", "Where is the library?"):
+            self.client.post("/NuBot/", json={"query": query})
+        after = self.metrics()
+
+        def delta(name, **labels):
+            return sample(after, name, **labels) - sample(before, name, **labels)
+
+        for stage in ("encode", "search", "prompt", "llm"):
+            # the paraphrase is answered from the answer cache
+            self.assertEqual(delta("nubot_stage_seconds_count", stage=stage), 2)
+        self.assertEqual(delta("nubot_request_seconds_count", endpoint="/NuBot/"), 3)
+        self.assertGreaterEqual(delta("nubot_request_seconds_sum", endpoint="/NuBot/"), 0.04)
+        self.assertEqual(delta("nubot_cache_lookups_total", cache="answer", result="hit"), 1)
+        self.assertEqual(delta("nubot_cache_lookups_total", cache="answer", result="miss"), 2)
+        self.assertEqual(delta("nubot_cache_lookups_total", cache="retrieval", result="miss"), 2)
+        self.assertEqual(sample(after, "nubot_requests_in_flight"), 0)
+        self.assertEqual(sample(after, "nubot_index_vectors"), 20)
+        self.assertEqual(sample(after, "nubot_index_info", version="v7"), 1)
+
+    def test_errors_are_counted_per_endpoint(self):
+        before = self.metrics()
+        response = self.client.post("/NuBot/", json={"query": "boom"})
+        self.assertIn("llm failed", response.json["details"])
+        stream = self.client.post("/NuBot/stream", json={"query": "boom"})
+        self.assertIn("event: error", stream.get_data(as_text=True))
+        stream.close()
+        after = self.metrics()
+        for endpoint in ("/NuBot/", "/NuBot/stream"):
+            self.assertEqual(sample(after, "nubot_request_errors_total", endpoint=endpoint) -
+                             sample(before, "nubot_request_errors_total", endpoint=endpoint), 1)
+        self.assertEqual(sample(after, "nubot_requests_in_flight"), 0)
+
+    def test_stream_is_timed_until_its_last_event(self):
+        before = self.metrics()
+        stream = self.client.post("/NuBot/stream", json={"query": "Who teaches CS 5200?"}, buffered=False)
+        self.assertEqual(sample(self.metrics(), "nubot_requests_in_flight"), 1)
+        self.assertIn("event: done", stream.get_data(as_text=True))
+        stream.close()
+        after = self.metrics()
+        self.assertEqual(sample(after, "nubot_requests_in_flight"), 0)
+        self.assertGreaterEqual(sample(after, "nubot_request_seconds_sum", endpoint="/NuBot/stream") -
+                                sample(before, "nubot_request_seconds_sum", endpoint="/NuBot/stream"), 0.02)
@@ -0,0 +1,96 @@
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+HAS_ONNX = all(importlib.util.find_spec(name) for name in ("onnxruntime", "onnx"))
+# a local copy of all-MiniLM-L6-v2 (a folder saved with save_pretrained) runs the parity tests offline
+PARITY_MODEL = os.getenv("ONNX_PARITY_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+NO_TORCH = """
+import os, sys
+os.environ["INIT_ON_START"] = "lazy"
+import main
+from src.dataflow import rag_model, onnx_encoder, index_store, retrieval, embedding_batcher, lexical, partitions
+from src.dataflow import pipeline, answer_cache, llm_client
+from langchain_community.vectorstores import FAISS
+if len(sys.argv) > 1:
+    rag_model.load_embeddings().embed_query("Who teaches CS 5200?")
+print("torch" in sys.modules)
+"""
+
+QUERIES = ["When is the co-op application deadline?", "Who teaches CS 5200 Database Management?",
+           "How do I apply for graduate housing in Boston?", "What are the prerequisites for the MS in Data Science?",
+           "Khoury advising office hours", "spring registration", "Is there a TA position for algorithms?",
+           "a much longer question that keeps going " * 40]
+
+SUBJECTS = ["co-op", "housing", "registration", "advising", "the library", "TA positions", "CS 5200", "data science"]
+PASSAGES = [f"{subject}: {detail} for {group} students" for subject in SUBJECTS
+            for detail in ("deadlines and forms", "office hours and contacts", "fees and funding", "eligibility rules",
+                           "how to apply online", "common questions")
+            for group in ("graduate", "undergraduate", "international", "part-time")]
+
+
+def imports_torch(*args, env=None):
+    out = subprocess.run([sys.executable, "-c", NO_TORCH, *args], env=dict(os.environ, **(env or {})),
+                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         check=True, capture_output=True, text=True).stdout
+    return out.strip().splitlines()[-1] == "True"
+
+
+class TestServingWithoutTorch(unittest.TestCase):
+
+    def test_serving_modules_do_not_import_torch(self):
+        self.assertFalse(imports_torch())
+
+
+@unittest.skipUnless(HAS_ONNX, "onnxruntime and onnx are not installed")
+class TestOnnxParity(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        from src.dataflow.onnx_encoder import export_onnx_encoder
+        cls.tmp = tempfile.TemporaryDirectory()
+        try:
+            cls.folder = export_onnx_encoder(cls.tmp.name, model_name=PARITY_MODEL)
+        except OSError as e:
+            cls.tmp.cleanup()
+            raise unittest.SkipTest(f"{PARITY_MODEL} is not available: {e}")
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        cls.reference = HuggingFaceEmbeddings(model_name=PARITY_MODEL, encode_kwargs={"normalize_embeddings": True})
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_int8_vectors_match_the_torch_encoder(self):
+        from src.dataflow.onnx_encoder import OnnxEmbeddings
+        reference = np.array(self.reference.embed_documents(QUERIES))
+        onnx = OnnxEmbeddings(self.folder)
+        batched = np.array(onnx.embed_documents(QUERIES))
+        single = np.array([onnx.embed_query(query) for query in QUERIES])
+        self.assertEqual(batched.shape, reference.shape)
+        # unit vectors like the torch encoder's, so the same index and L2 distances apply
+        np.testing.assert_allclose(np.linalg.norm(batched, axis=1), 1.0, atol=1e-5)
+        self.assertGreaterEqual((batched * reference).sum(axis=1).min(), 0.99)
+        # padding a query into a batch barely changes its vector; dynamic int8 quantization scales
+        # activations per batch, so the padded rows move it by a few 1e-4, not by float rounding only
+        self.assertGreaterEqual((batched * single).sum(axis=1).min(), 0.9999)
+
+    def test_int8_search_finds_the_same_passages(self):
+        from src.dataflow.onnx_encoder import OnnxEmbeddings
+        onnx = OnnxEmbeddings(self.folder)
+        k = 10
+        found = []
+        for encoder in (self.reference, onnx):
+            passages = np.array(encoder.embed_documents(PASSAGES))
+            queries = np.array(encoder.embed_documents(QUERIES))
+            found.append(np.argsort(-(queries @ passages.T), axis=1)[:, :k])
+        recall = np.mean([len(set(expected) & set(got)) / k for expected, got in zip(*found)])
+        self.assertGreaterEqual(recall, 0.9)
+
+    def test_onnx_backend_does_not_import_torch(self):
+        self.assertFalse(imports_torch("embed", env={"EMBEDDING_BACKEND": "onnx", "ONNX_ENCODER_DIR": self.folder}))
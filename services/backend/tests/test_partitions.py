@@ -0,0 +1,60 @@
+import tempfile
+import unittest
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.dataflow.index_factory import build_partitions
+from src.dataflow.partitions import load_partitions, site_keywords
+from src.dataflow.retrieval import Retriever
+
+SITES = ["www.khoury.northeastern.edu", "catalog.northeastern.edu", "coop.northeastern.edu"]
+
+
+class TestPartitions(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.centers = rng.standard_normal((len(SITES), 16)).astype(np.float32) * 4
+        pairs, metadatas = [], []
+        for s, site in enumerate(SITES):
+            for i in range(40 if s < 2 else 5):
+                pairs.append((f"{site} page {i}", (self.centers[s] + rng.standard_normal(16)).tolist()))
+                metadatas.append({"url": f"https://{site}/page{i}"})
+        self.vector_store = FAISS.from_embeddings(pairs, DeterministicFakeEmbedding(size=16), metadatas=metadatas)
+        self.folder = tempfile.TemporaryDirectory()
+        meta = build_partitions(self.vector_store, self.folder.name)
+        self.assertEqual([p["ntotal"] for p in meta["partitions"]], [40, 5, 40])
+        self.index = load_partitions(self.folder.name)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_site_keywords_drop_shared_labels(self):
+        self.assertEqual(site_keywords(SITES), [{"khoury"}, {"catalog"}, {"coop"}])
+
+    def test_centroid_route_matches_full_search(self):
+        query = self.centers[0] + 0.5
+        _, positions = self.index.search(query, 5)
+        _, expected = self.vector_store.index.search(query[None, :], 5)
+        self.assertEqual(positions.tolist(), expected.tolist())
+        self.assertEqual(self.index.stats()["routed"]["centroid"], 1)
+        docs = Retriever(self.vector_store, k=5, partitions=self.index).get_documents(
+            [self.vector_store.index_to_docstore_id[p] for p in positions[0]])
+        self.assertTrue(all("khoury" in doc.metadata["url"] for doc in docs))
+
+    def test_site_named_in_question_wins(self):
+        chosen, how = self.index.route(self.centers[0], "when does the coop cycle start")
+        self.assertEqual((chosen, how), ([self.index.sites.index("coop.northeastern.edu")], "keyword"))
+
+    def test_ambiguous_and_short_routes_search_everything(self):
+        chosen, how = self.index.route(self.index.centroids[0] + self.index.centroids[2])
+        self.assertEqual((len(chosen), how), (3, "fallback"))
+        # the coop partition only has 5 chunks, the other partitions fill up k=8
+        _, positions = self.index.search(self.centers[2], 8, questions=["coop"])
+        self.assertEqual((positions[0] != -1).sum(), 8)
+        self.assertEqual(self.index.stats()["routed"]["fallback"], 1)
+
+    def test_retriever_reports_routing(self):
+        retriever = Retriever(self.vector_store, k=3, partitions=self.index)
+        retriever.search_ids(np.vstack([self.centers[0], self.centers[1]]), questions=[None, "catalog"])
+        self.assertEqual(retriever.stats()["routing"]["routed"], {"keyword": 1, "centroid": 1, "fallback": 0})
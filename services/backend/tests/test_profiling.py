@@ -0,0 +1,118 @@
+import contextvars
+import os
+import pstats
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.dataflow import rag_model
+from src.dataflow.retrieval import Retriever
+from src.utils.profiling import Profiler, record_stage
+from helpers import EchoChatModel
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.profiler = Profiler(self.tmp.name, keep=2)
+
+    def test_profile_collects_stages_from_threads_that_copy_the_context(self):
+        with self.profiler.profile("request", query="q") as request_profile:
+            record_stage("encode", 0.01)
+            context = contextvars.copy_context()
+            worker = threading.Thread(target=context.run, args=(record_stage, "llm", 0.02))
+            worker.start()
+            worker.join()
+            sum(range(10000))
+        self.assertIsNotNone(self.profiler.path(request_profile.id, ".json"))
+        summary = request_profile.summary()
+        self.assertEqual(summary["query"], "q")
+        self.assertEqual(summary["stages"]["encode"], {"seconds": 0.01, "calls": 1})
+        self.assertEqual(summary["stages"]["llm"]["calls"], 1)
+        self.assertIn("function calls", summary["top_functions"])
+        pstats.Stats(self.profiler.path(request_profile.id, ".prof"))
+        # outside a profile stage timings go nowhere
+        record_stage("encode", 1.0)
+        self.assertEqual(request_profile.stages["encode"]["calls"], 1)
+
+    def test_disabled_profile_writes_nothing_and_old_profiles_are_pruned(self):
+        with self.profiler.profile("request", enabled=False) as request_profile:
+            self.assertIsNone(request_profile)
+        self.assertEqual(self.profiler.list(), [])
+        ids = []
+        for _ in range(3):
+            with self.profiler.profile("request") as request_profile:
+                ids.append(request_profile.id)
+            time.sleep(0.01)
+        self.assertEqual(len(self.profiler.list()), 2)
+        self.assertEqual(len(os.listdir(self.tmp.name)), 4)
+        self.assertIsNone(self.profiler.path("../../etc/passwd", ".json"))
+
+    def test_one_profiled_request_at_a_time(self):
+        with self.profiler.profile("first") as first:
+            with self.profiler.profile("second") as second:
+                self.assertIsNotNone(first)
+                self.assertIsNone(second)
+        self.assertEqual(self.profiler.stats()["skipped_busy"], 1)
+
+
+class TestProfiledRequest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with patch.dict(os.environ, {"INIT_ON_START": "lazy"}):
+            import main
+        cls.main = main
+        cls.client = main.app.test_client()
+
+    def setUp(self):
+        from langchain_core.prompts import PromptTemplate
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        embeddings = DeterministicFakeEmbedding(size=16)
+        vector_store = FAISS.from_texts([f"chunk {i}" for i in range(20)], embeddings)
+        for target in (patch.object(rag_model, "pipeline", None),
+                       patch.object(rag_model, "answer_cache", None),
+                       patch.object(self.main, "profiler", Profiler(self.tmp.name)),
+                       patch.object(rag_model, "get_prompt", lambda: PromptTemplate.from_template("{context}\n{question}")),
+                       patch.dict(rag_model._readiness, {"status": "not_started", "error": None})):
+            target.start()
+            self.addCleanup(target.stop)
+        rag_model.init(retriever=Retriever(vector_store, embeddings, k=3, index_version="v1"), llm=EchoChatModel(),
+                       tracking_enabled=False)
+
+    def test_header_profiles_the_request(self):
+        response = self.client.post("/NuBot/", json={"query": "Who teaches CS 5200?"}, headers={"X-Profile": "1"})
+        self.assertEqual(response.json, "answer to Who teaches CS 5200?")
+        profile_id = response.headers["X-Profile-Id"]
+        self.assertEqual(self.client.get("/NuBot/admin/profiles").json["profiles"], [profile_id])
+        summary = self.client.get(f"/NuBot/admin/profiles/{profile_id}").json
+        self.assertEqual(summary["query"], "Who teaches CS 5200?")
+        self.assertEqual(set(summary["stages"]), {"encode", "search", "prompt", "llm"})
+        self.assertGreaterEqual(summary["stages"]["llm"]["seconds"], 0.02)
+        self.assertGreaterEqual(summary["seconds"], sum(stage["seconds"] for stage in summary["stages"].values()))
+        download = self.client.get(f"/NuBot/admin/profiles/{profile_id}/download")
+        self.assertEqual(download.status_code, 200)
+        with open(os.path.join(self.tmp.name, "downloaded.prof"), "wb") as f:
+            f.write(download.data)
+        self.assertGreater(pstats.Stats(f.name).total_calls, 0)
+        self.assertEqual(self.client.get("/NuBot/admin/profiles/nope").status_code, 404)
+
+    def test_requests_are_not_profiled_by_default(self):
+        response = self.client.post("/NuBot/", json={"query": "Who teaches CS 5200?"})
+        self.assertNotIn("X-Profile-Id", response.headers)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_header_needs_the_admin_token_when_one_is_set(self):
+        with patch.object(self.main, "ADMIN_TOKEN", "secret"):
+            response = self.client.post("/NuBot/", json={"query": "hi"}, headers={"X-Profile": "1"})
+            self.assertNotIn("X-Profile-Id", response.headers)
+            response = self.client.post("/NuBot/", json={"query": "hi"},
+                                        headers={"X-Profile": "1", "X-Admin-Token": "secret"})
+            self.assertIn("X-Profile-Id", response.headers)
+            self.assertEqual(self.client.get("/NuBot/admin/profiles").status_code, 401)
@@ -0,0 +1,62 @@
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import patch
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from src.dataflow import rag_model
+from test_stream import StubRetriever
+
+
+class TestLazyInit(unittest.TestCase):
+
+    def test_import_has_no_heavy_side_effects(self):
+        code = ("import sys, main; "
+                "heavy = [m for m in ('torch', 'faiss', 'mlflow', 'google.cloud.storage', 'langgraph') if m in sys.modules]; "
+                "print(','.join(heavy))")
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                env={**os.environ, "INIT_ON_START": "lazy"}, check=True)
+        self.assertEqual(result.stdout.strip(), "")
+
+
+class TestReadiness(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with patch.dict(os.environ, {"INIT_ON_START": "lazy"}):
+            import main
+        cls.client = main.app.test_client()
+
+    def setUp(self):
+        # start every test from an uninitialized module
+        for target in (patch.object(rag_model, "pipeline", None),
+                       patch.dict(rag_model._readiness, {"status": "not_started", "error": None})):
+            target.start()
+            self.addCleanup(target.stop)
+
+    def test_not_ready_until_init(self):
+        self.assertEqual(self.client.get("/ready").status_code, 503)
+        rag_model.init(retriever=StubRetriever(), llm=FakeListChatModel(responses=["Co-op is paid work."]),
+                       tracking_enabled=False)
+        response = self.client.get("/ready")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["status"], "ready")
+
+    def test_failed_init_is_reported(self):
+        with patch.object(rag_model, "get_llm", side_effect=RuntimeError("no api key")):
+            with self.assertRaises(RuntimeError):
+                rag_model.init(retriever=StubRetriever(), tracking_enabled=False)
+        response = self.client.get("/ready")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json["error"], "no api key")
+
+    def test_answer_after_init(self):
+        rag_model.init(retriever=StubRetriever(), llm=FakeListChatModel(responses=["Co-op is paid work."]),
+                       tracking_enabled=False)
+        with patch.object(rag_model, "answer_cache", None):
+            response = self.client.post("/NuBot/", json={"query": "what is co-op?"})
+        self.assertEqual(response.json, "Co-op is paid work.")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.dataflow.retrieval import Retriever
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    calls: int = 0
+    batch_calls: int = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return super().embed_query(text)
+
+    def embed_documents(self, texts):
+        self.batch_calls += 1
+        return [super(CountingEmbeddings, self).embed_query(text) for text in texts]
+
+
+class TestRetriever(unittest.TestCase):
+
+    def setUp(self):
+        self.embeddings = CountingEmbeddings(size=16)
+        texts = [f"chunk about topic {i}" for i in range(20)]
+        self.vector_store = FAISS.from_texts(texts, self.embeddings, metadatas=[{"url": f"u{i}"} for i in range(20)])
+        self.retriever = Retriever(self.vector_store, self.embeddings, k=5, index_version="v1")
+        self.embeddings.calls = 0
+        self.embeddings.batch_calls = 0
+
+    def test_matches_similarity_search(self):
+        expected = self.vector_store.similarity_search("chunk about topic 3", k=5)
+        docs = self.retriever.invoke("chunk about topic 3")
+        self.assertEqual([d.page_content for d in docs], [d.page_content for d in expected])
+
+    def test_repeat_question_skips_encoder_and_search(self):
+        first = self.retriever.invoke("Chunk about   topic 3")
+        self.vector_store.index.reset()  # a second search would now return nothing
+        second = self.retriever.invoke("chunk about topic 3")
+        self.assertEqual(self.embeddings.calls, 1)
+        self.assertEqual([d.page_content for d in first], [d.page_content for d in second])
+        self.assertEqual(self.retriever.stats()["hits"], 1)
+        self.assertEqual(self.retriever.stats()["hit_ratio"], 0.5)
+
+    def test_embed_query_is_reused_by_invoke(self):
+        self.retriever.embed_query("chunk about topic 7")
+        self.retriever.invoke("chunk about topic 7")
+        self.assertEqual(self.embeddings.calls, 1)
+
+    def test_entries_from_other_index_version_are_ignored(self):
+        self.retriever.invoke("chunk about topic 3")
+        self.retriever.index_version = "v2"
+        self.retriever.invoke("chunk about topic 3")
+        self.assertEqual(self.embeddings.calls, 2)
+
+    def test_invoke_batch_matches_invoke(self):
+        questions = [f"chunk about topic {i}" for i in (1, 4, 9)]
+        batched = self.retriever.invoke_batch(questions)
+        self.assertEqual(self.embeddings.batch_calls, 1)
+        self.assertEqual(self.embeddings.calls, 0)
+        fresh = Retriever(self.vector_store, self.embeddings, k=5, index_version="v1")
+        for question, docs in zip(questions, batched):
+            self.assertEqual([d.page_content for d in docs], [d.page_content for d in fresh.invoke(question)])
+
+    def test_invoke_batch_searches_only_uncached_questions(self):
+        self.retriever.invoke("chunk about topic 1")
+        self.retriever.embed_query("chunk about topic 2")
+        searched = []
+        search_ids = self.retriever.search_ids
+        self.retriever.search_ids = lambda matrix, k=None, questions=None: (searched.append(len(matrix))
+                                                                            or search_ids(matrix, k, questions))
+        self.retriever.invoke_batch(["chunk about topic 1", "chunk about topic 2", "chunk about topic 3"])
+        # topic 2 only needs the search, topic 3 the encoder and the search
+        self.assertEqual(searched, [2])
+        self.assertEqual(self.embeddings.calls, 2)
+        self.assertEqual(self.embeddings.batch_calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
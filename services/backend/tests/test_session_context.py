@@ -0,0 +1,202 @@
+import asyncio
+import os
+import unittest
+import zlib
+from unittest.mock import patch
+import httpx
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from src.dataflow import rag_model
+from src.dataflow.index_factory import rebuild_vector_store_index
+from src.dataflow.retrieval import Retriever
+from src.dataflow.session_context import SessionStore
+from src.utils import metrics
+from src.utils.singleflight import AsyncSingleFlight, SingleFlight
+from helpers import sample
+
+TOPICS = ["library", "housing", "registration", "parking"]
+
+
+class TopicEmbeddings(Embeddings):
+    """Texts that start with the same word point the same way; the rest of the text moves them a little."""
+
+    def embed_query(self, text):
+        topic = np.random.default_rng(zlib.crc32(text.split()[0].encode())).normal(size=16)
+        detail = np.random.default_rng(zlib.crc32(text.encode())).normal(size=16)
+        return list(topic + 0.3 * detail)
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSessionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.store = SessionStore(max_sessions=2, ttl=60, max_chunks=4, threshold=0.8, timer=self.timer)
+        self.vectors = np.eye(4, dtype=np.float32)
+
+    def test_follow_up_is_ranked_among_previous_candidates(self):
+        self.store.remember("s1", [1, 1, 0, 0], "v1", ["a", "b", "c", "d"], self.vectors)
+        self.assertEqual(self.store.lookup("s1", lambda: [1, 1.2, 0, 0], "v1", k=2), ("b", "a"))
+        self.assertEqual(self.store.stats()["hits"], 1)
+
+    def test_other_topic_version_or_session_is_a_miss(self):
+        self.store.remember("s1", [1, 0, 0, 0], "v1", ["a", "b"], self.vectors[:2])
+        self.assertIsNone(self.store.lookup("s1", lambda: [0, 1, 0, 0], "v1", k=2))
+        self.assertIsNone(self.store.lookup("s1", lambda: [1, 0, 0, 0], "v2", k=2))
+        self.assertIsNone(self.store.lookup("s2", lambda: [1, 0, 0, 0], "v1", k=2))
+        self.assertEqual(self.store.stats()["misses"], 3)
+
+    def test_sessions_expire_and_least_recent_is_evicted(self):
+        self.store.remember("s1", [1, 0, 0, 0], "v1", ["a"], self.vectors[:1])
+        self.timer.now = 50
+        # a hit keeps the session for another ttl
+        self.assertIsNotNone(self.store.lookup("s1", lambda: [1, 0, 0, 0], "v1", k=1))
+        self.timer.now = 100
+        self.assertIsNotNone(self.store.lookup("s1", lambda: [1, 0, 0, 0], "v1", k=1))
+        self.timer.now = 200
+        self.assertIsNone(self.store.lookup("s1", lambda: [1, 0, 0, 0], "v1", k=1))
+        for session_id in ("s2", "s3", "s4"):
+            self.store.remember(session_id, [1, 0, 0, 0], "v1", ["a"], self.vectors[:1])
+        self.assertIsNone(self.store.lookup("s2", lambda: [1, 0, 0, 0], "v1", k=1))
+        self.assertEqual(self.store.stats()["sessions"], 2)
+
+    def test_memory_per_session_is_capped(self):
+        self.store.remember("s1", [1, 0, 0, 0], "v1", [f"id{i}" for i in range(50)], np.ones((50, 4)))
+        self.assertEqual(self.store.stats()["vector_bytes"], 4 * 4 * 4)
+        self.assertEqual(self.store.lookup("s1", lambda: [1, 0, 0, 0], "v1", k=10), ("id0", "id1", "id2", "id3"))
+
+    def test_without_vectors_the_previous_order_is_kept(self):
+        self.store.remember("s1", [1, 0, 0, 0], "v1", ["a", "b", "c"])
+        self.assertEqual(self.store.lookup("s1", lambda: [1, 0.1, 0, 0], "v1", k=2), ("a", "b"))
+
+
+class TestSessionRetrieval(unittest.TestCase):
+
+    def setUp(self):
+        self.embeddings = TopicEmbeddings()
+        texts = [f"{topic} chunk {i}" for topic in TOPICS for i in range(10)]
+        # unit vectors, so the L2 order of the index is the cosine order of the session candidates
+        self.vector_store = FAISS.from_texts(texts, self.embeddings, normalize_L2=True)
+        self.sessions = SessionStore(max_chunks=12, threshold=0.8)
+        self.retriever = Retriever(self.vector_store, self.embeddings, k=5, index_version="v1", sessions=self.sessions)
+
+    def contents(self, docs):
+        return [doc.page_content for doc in docs]
+
+    def test_follow_up_skips_the_index_search(self):
+        before = metrics.REGISTRY.render()
+        first = self.retriever.invoke("library opening hours", session_id="s1")
+        self.assertEqual(self.contents(first),
+                         self.contents(self.vector_store.similarity_search("library opening hours", k=5)))
+        expected = self.contents(self.vector_store.similarity_search("library hours on sunday", k=5))
+        self.vector_store.index.reset()  # a second search would now return nothing
+        follow_up = self.retriever.invoke("library hours on sunday", session_id="s1")
+        self.assertEqual(self.contents(follow_up), expected)
+        self.assertEqual(self.retriever.invoke("library hours on sunday", session_id="s2"), [])
+        after = metrics.REGISTRY.render()
+        for result, count in (("hit", 1), ("miss", 2)):
+            self.assertEqual(sample(after, "nubot_cache_lookups_total", cache="session", result=result)
+                             - sample(before, "nubot_cache_lookups_total", cache="session", result=result), count)
+
+    def test_first_questions_of_sessions_share_the_cached_search(self):
+        searches = []
+        search = self.retriever._search
+        self.retriever._search = lambda *args: searches.append(args) or search(*args)
+        for session_id in ("s1", "s2", "s3", None):
+            self.retriever.invoke("library opening hours", session_id=session_id)
+        self.assertEqual(len(searches), 1)
+        self.assertEqual(self.retriever.stats()["hits"], 3)
+        # each session now has the candidates of that search
+        self.vector_store.index.reset()
+        self.assertEqual(len(self.retriever.invoke("library hours on sunday", session_id="s3")), 5)
+
+    def test_new_topic_searches_again(self):
+        self.retriever.invoke("library opening hours", session_id="s1")
+        docs = self.retriever.invoke("parking permits for students", session_id="s1")
+        self.assertTrue(all(text.startswith("parking") for text in self.contents(docs)))
+        self.assertEqual(self.sessions.stats()["misses"], 2)
+
+    def test_index_without_stored_vectors_reuses_previous_chunks(self):
+        rebuild_vector_store_index(self.vector_store, index_type="IVF", nlist=2, nprobe=2)
+        first = self.retriever.invoke("housing application deadline", session_id="s1")
+        follow_up = self.retriever.invoke("housing deadline for transfers", session_id="s1")
+        self.assertEqual(self.contents(follow_up), self.contents(first))
+        self.assertEqual(self.sessions.stats()["vector_bytes"], 0)
+
+
+class TestSessionApi(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with patch.dict(os.environ, {"INIT_ON_START": "lazy"}):
+            import asgi
+            import main
+        cls.asgi = asgi
+        cls.flask = main.app.test_client()
+
+    def setUp(self):
+        from langchain_core.prompts import PromptTemplate
+        embeddings = TopicEmbeddings()
+        vector_store = FAISS.from_texts([f"{topic} chunk {i}" for topic in TOPICS for i in range(10)], embeddings,
+                                        normalize_L2=True, metadatas=[{"url": f"https://example.edu/{i}"} for i in range(40)])
+        for target in (patch.object(rag_model, "pipeline", None),
+                       patch.object(rag_model, "answer_cache", None),
+                       patch.object(rag_model, "_inflight", SingleFlight(timeout=5)),
+                       patch.object(rag_model, "_ainflight", AsyncSingleFlight(timeout=5)),
+                       patch.object(rag_model, "get_prompt", lambda: PromptTemplate.from_template("{context}\n{question}")),
+                       patch.dict(rag_model._readiness, {"status": "not_started", "error": None})):
+            target.start()
+            self.addCleanup(target.stop)
+        self.sessions = SessionStore(threshold=0.8)
+        rag_model.init(retriever=Retriever(vector_store, embeddings, k=3, index_version="v1", sessions=self.sessions),
+                       llm=FakeListChatModel(responses=["It is open until midnight."]), tracking_enabled=False)
+
+    def test_flask_follow_ups_reuse_the_session(self):
+        for query in ("library opening hours", "library hours on sunday"):
+            response = self.flask.post("/NuBot/", json={"query": query, "session_id": "s1"})
+            self.assertEqual(response.json, "It is open until midnight.")
+        self.flask.post("/NuBot/", json={"query": "library hours on sunday"})
+        stats = self.flask.get("/NuBot/stats").json["session_context"]
+        self.assertEqual((stats["hits"], stats["misses"], stats["sessions"]), (1, 1, 1))
+
+    def test_sessions_without_candidates_share_one_coalescing_key(self):
+        current = rag_model.get_pipeline()
+        self.assertEqual(rag_model._coalesce_key(current, "library opening hours", "s1"),
+                         rag_model._coalesce_key(current, "library opening hours", None))
+        rag_model.generateResponse("library opening hours", session_id="s1")
+        self.assertEqual(rag_model._coalesce_key(current, "library hours on sunday", "s1")[-1], "s1")
+
+    def test_answers_from_session_candidates_stay_out_of_the_answer_cache(self):
+        from src.dataflow.answer_cache import create_answer_cache
+        cache = create_answer_cache("memory", threshold=0.99)
+        with patch.object(rag_model, "answer_cache", cache):
+            rag_model.generateResponse("library opening hours", session_id="s1")
+            rag_model.generateResponse("library hours on sunday", session_id="s1")
+        self.assertEqual(self.sessions.stats()["hits"], 1)
+        self.assertEqual(len(cache.backend), 1)
+
+    def test_asgi_stream_follow_up_reuses_the_session(self):
+        async def run():
+            transport = httpx.ASGITransport(app=self.asgi.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                for query in ("housing application deadline", "housing deadline for transfers"):
+                    response = await client.post("/NuBot/stream", json={"query": query, "session_id": "s1"})
+                    self.assertIn("event: done", response.text)
+        asyncio.run(run())
+        self.assertEqual(self.sessions.stats()["hits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
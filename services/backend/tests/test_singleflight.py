@@ -0,0 +1,242 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import SimpleChatModel
+from src.dataflow import rag_model
+from src.dataflow.retrieval import Retriever
+from src.utils.deadline import DeadlineExceeded, deadline, remaining
+from src.utils.singleflight import AsyncSingleFlight, SingleFlight
+
+llm_calls = []
+
+
+class SlowChatModel(SimpleChatModel):
+    """Takes 200 ms per answer, fails on "boom" and when the request deadline is sooner."""
+
+    @property
+    def _llm_type(self):
+        return "slow"
+
+    def _call(self, messages, *args, **kwargs):
+        prompt = messages[-1].content
+        llm_calls.append(prompt)
+        left = remaining(0.2)
+        time.sleep(max(0.0, min(0.2, left)))
+        if left < 0.2:
+            raise DeadlineExceeded("LLM call did not finish within the request deadline")
+        if "boom" in prompt:
+            raise RuntimeError("llm failed")
+        return "answer to " + prompt.splitlines()[-1]
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def run_together(self, fns):
+        with ThreadPoolExecutor(len(fns)) as pool:
+            futures = [pool.submit(fn) for fn in fns]
+            return [future.exception() or future.result() for future in futures]
+
+    def test_concurrent_callers_share_one_call(self):
+        flight, calls = SingleFlight(), []
+
+        def work():
+            calls.append(1)
+            time.sleep(0.1)
+            return "result"
+
+        results = self.run_together([lambda: flight.do("q", work)] * 5)
+        self.assertEqual(results, ["result"] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats(), {"in_flight": 0, "leaders": 1, "coalesced": 4, "timeouts": 0, "errors": 0,
+                                          "retries": 0})
+        # nothing is remembered once the call is done
+        self.assertEqual(flight.do("q", work), "result")
+        self.assertEqual(len(calls), 2)
+
+    def test_error_reaches_every_waiter(self):
+        flight = SingleFlight()
+
+        def fail():
+            time.sleep(0.1)
+            raise ValueError("bad")
+
+        results = self.run_together([lambda: flight.do("q", fail)] * 3)
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(flight.stats()["errors"], 1)
+
+    def test_waiters_time_out_but_the_leader_finishes(self):
+        flight, release = SingleFlight(timeout=0.05), threading.Event()
+
+        def slow():
+            release.wait(5)
+            return "late"
+
+        with ThreadPoolExecutor(2) as pool:
+            leader = pool.submit(flight.do, "q", slow)
+            time.sleep(0.02)
+            with self.assertRaises(TimeoutError):
+                flight.do("q", slow)
+            release.set()
+            self.assertEqual(leader.result(), "late")
+        self.assertEqual(flight.stats()["timeouts"], 1)
+
+    def test_waiters_with_time_left_retry_after_the_leader_ran_out_of_its_own(self):
+        flight, calls = SingleFlight(), []
+
+        def work():
+            calls.append(1)
+            time.sleep(0.1)
+            if len(calls) == 1:
+                raise DeadlineExceeded("leader deadline")
+            return "result"
+
+        with ThreadPoolExecutor(3) as pool:
+            leader = pool.submit(flight.do, "q", work, timeout=0.05, retry_on=(DeadlineExceeded,))
+            time.sleep(0.02)
+            waiters = [pool.submit(flight.do, "q", work, timeout=5, retry_on=(DeadlineExceeded,)) for _ in range(2)]
+            self.assertIsInstance(leader.exception(), DeadlineExceeded)
+            self.assertEqual([waiter.result() for waiter in waiters], ["result"] * 2)
+        # the two waiters share the second call
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(flight.stats()["retries"], 2)
+        # without retry_on the leader's failure is everyone's
+        calls.clear()
+        results = self.run_together([lambda: flight.do("q", work)] * 2)
+        self.assertTrue(all(isinstance(result, DeadlineExceeded) for result in results))
+
+    def test_different_keys_do_not_wait_for_each_other(self):
+        flight = SingleFlight()
+        start = time.perf_counter()
+        self.run_together([lambda i=i: flight.do(i, lambda: time.sleep(0.1)) for i in range(4)])
+        self.assertLess(time.perf_counter() - start, 0.35)
+        self.assertEqual(flight.stats()["coalesced"], 0)
+
+
+class TestAsyncSingleFlight(unittest.TestCase):
+
+    def test_concurrent_coroutines_share_one_call(self):
+        flight, calls = AsyncSingleFlight(), []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def run():
+            return await asyncio.gather(*[flight.do("q", work) for _ in range(5)], flight.do("other", work))
+
+        self.assertEqual(asyncio.run(run()), ["result"] * 6)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(flight.stats(), {"in_flight": 0, "leaders": 2, "coalesced": 4, "timeouts": 0, "errors": 0,
+                                          "retries": 0})
+
+    def test_cancelled_leader_does_not_cancel_the_waiters(self):
+        flight = AsyncSingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def run():
+            leader = asyncio.ensure_future(flight.do("q", work))
+            await asyncio.sleep(0)
+            waiter = asyncio.ensure_future(flight.do("q", work))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await waiter
+
+        self.assertEqual(asyncio.run(run()), "result")
+
+    def test_waiter_times_out_and_errors_are_shared(self):
+        flight = AsyncSingleFlight(timeout=0.02)
+
+        async def fail():
+            await asyncio.sleep(0.05)
+            raise ValueError("bad")
+
+        async def run():
+            return await asyncio.gather(flight.do("q", fail), flight.do("q", fail), flight.do("q", fail, timeout=1),
+                                        return_exceptions=True)
+
+        leader, timed_out, waiter = asyncio.run(run())
+        self.assertIsInstance(leader, ValueError)
+        self.assertIsInstance(timed_out, TimeoutError)
+        self.assertIsInstance(waiter, ValueError)
+        self.assertEqual(flight.stats()["timeouts"], 1)
+        self.assertEqual(flight.stats()["errors"], 1)
+
+    def test_waiters_with_time_left_retry_after_the_leader_ran_out_of_its_own(self):
+        flight, calls = AsyncSingleFlight(), []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            if len(calls) == 1:
+                raise DeadlineExceeded("leader deadline")
+            return "result"
+
+        async def run():
+            return await asyncio.gather(flight.do("q", work, timeout=0.02, retry_on=(DeadlineExceeded,)),
+                                        flight.do("q", work, timeout=1, retry_on=(DeadlineExceeded,)),
+                                        flight.do("q", work, timeout=1, retry_on=(DeadlineExceeded,)),
+                                        return_exceptions=True)
+
+        leader, *waiters = asyncio.run(run())
+        self.assertIsInstance(leader, DeadlineExceeded)
+        self.assertEqual(waiters, ["result"] * 2)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(flight.stats()["retries"], 2)
+
+
+class TestCoalescedResponses(unittest.TestCase):
+
+    def setUp(self):
+        from langchain_core.prompts import PromptTemplate
+        embeddings = DeterministicFakeEmbedding(size=16)
+        vector_store = FAISS.from_texts([f"chunk {i}" for i in range(20)], embeddings)
+        llm_calls.clear()
+        for target in (patch.object(rag_model, "pipeline", None),
+                       patch.object(rag_model, "answer_cache", None),
+                       patch.object(rag_model, "_inflight", SingleFlight(timeout=5)),
+                       patch.object(rag_model, "get_prompt", lambda: PromptTemplate.from_template("{context}\n{question}")),
+                       patch.dict(rag_model._readiness, {"status": "not_started", "error": None})):
+            target.start()
+            self.addCleanup(target.stop)
+        rag_model.init(retriever=Retriever(vector_store, embeddings, k=3, index_version="v1"),
+                       llm=SlowChatModel(), tracking_enabled=False)
+
+    def ask_together(self, queries):
+        with ThreadPoolExecutor(len(queries)) as pool:
+            futures = [pool.submit(rag_model.generateResponse, query) for query in queries]
+            return [future.exception() or future.result() for future in futures]
+
+    def test_same_question_runs_the_llm_once(self):
+        answers = self.ask_together(["When is registration?", "when is  REGISTRATION?", "When is registration?",
+                                     "Who teaches CS 5200?"])
+        self.assertEqual(answers[:3], ["answer to When is registration?"] * 3)
+        self.assertEqual(len(llm_calls), 2)
+        self.assertEqual(rag_model.cacheStats()["coalescing"]["coalesced"], 2)
+
+    def test_llm_error_is_raised_to_every_caller(self):
+        answers = self.ask_together(["boom"] * 3)
+        self.assertTrue(all(isinstance(a, Exception) and "llm failed" in str(a) for a in answers))
+        self.assertEqual(len(llm_calls), 1)
+
+    def test_short_deadline_of_one_caller_does_not_fail_the_others(self):
+        def ask(seconds):
+            with deadline(seconds):
+                return rag_model.generateResponse("When is registration?")
+
+        with ThreadPoolExecutor(3) as pool:
+            leader = pool.submit(ask, 0.05)
+            time.sleep(0.02)
+            waiters = [pool.submit(ask, 5) for _ in range(2)]
+            self.assertIn("deadline", str(leader.exception()))
+            self.assertEqual([waiter.result() for waiter in waiters], ["answer to When is registration?"] * 2)
+        # the leader's call, then one call for both waiters
+        self.assertEqual(len(llm_calls), 2)
@@ -0,0 +1,90 @@
+import json
+import os
+import time
+import unittest
+from unittest.mock import patch
+from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import PromptTemplate
+from src.dataflow.pipeline import RagPipeline
+
+TOKEN_DELAY = 0.05
+
+
+class SlowFakeChatModel(GenericFakeChatModel):
+    """Local fake chat model that emits one token every TOKEN_DELAY seconds."""
+
+    def _stream(self, *args, **kwargs):
+        for chunk in super()._stream(*args, **kwargs):
+            time.sleep(TOKEN_DELAY)
+            yield chunk
+
+
+class StubRetriever:
+    index_version = "test"
+
+    def invoke(self, question):
+        return [Document(page_content="Khoury College offers co-op.",
+                         metadata={"url": "https://www.khoury.northeastern.edu/", "title": "Khoury"})]
+
+
+def make_pipeline(answer):
+    llm = SlowFakeChatModel(messages=iter([AIMessage(content=answer)]))
+    prompt = PromptTemplate.from_template("{context}\n{question}")
+    return RagPipeline(StubRetriever(), llm, prompt)
+
+
+class TestStreamEndpoint(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with patch.dict(os.environ, {"INIT_ON_START": "lazy"}):
+            import main
+        cls.main = main
+        cls.client = main.app.test_client()
+
+    def read_events(self, answer):
+        pipeline = make_pipeline(answer)
+        with patch.object(self.main, "streamResponse", pipeline.stream):
+            start = time.perf_counter()
+            response = self.client.post("/NuBot/stream", json={"query": "what is co-op?"}, buffered=False)
+            chunks = []
+            first_byte = None
+            for chunk in response.response:
+                if first_byte is None:
+                    first_byte = time.perf_counter() - start
+                chunks.append(chunk.decode() if isinstance(chunk, bytes) else chunk)
+            total = time.perf_counter() - start
+        events = []
+        for block in "".join(chunks).strip().split("\n\n"):
+            event_line, data_line = block.split("\n")
+            events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+        return response, events, first_byte, total
+
+    def test_metadata_first_then_tokens(self):
+        response, events, _, _ = self.read_events("Co-op is paid work experience")
+        self.assertEqual(response.mimetype, "text/event-stream")
+        self.assertEqual(events[0][0], "metadata")
+        self.assertEqual(events[0][1][0]["url"], "https://www.khoury.northeastern.edu/")
+        self.assertEqual(events[-1][0], "done")
+        tokens = "".join(data for event, data in events if event == "token")
+        self.assertEqual(tokens, "Co-op is paid work experience")
+
+    def test_time_to_first_byte(self):
+        answer = " ".join(["token"] * 10)
+        _, events, first_byte, total = self.read_events(answer)
+        token_events = [e for e in events if e[0] == "token"]
+        # 10 words + 9 spaces -> 19 chunks at TOKEN_DELAY each
+        self.assertGreaterEqual(total, len(token_events) * TOKEN_DELAY)
+        # Metadata must arrive before the model has produced its first token
+        self.assertLess(first_byte, TOKEN_DELAY)
+        print(f"\nstream TTFB {first_byte * 1000:.1f} ms, full answer {total * 1000:.1f} ms")
+
+    def test_missing_query(self):
+        response = self.client.post("/NuBot/stream", json={})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
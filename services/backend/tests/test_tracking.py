@@ -0,0 +1,105 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.prompts import PromptTemplate
+from src.dataflow.pipeline import RagPipeline
+from src.utils import tracking
+from test_stream import StubRetriever
+
+
+class RecordingSink:
+    def __init__(self):
+        self.batches = []
+
+    def write(self, traces):
+        self.batches.append(list(traces))
+
+    @property
+    def traces(self):
+        return [trace for batch in self.batches for trace in batch]
+
+
+class BlockedSink:
+    """A tracking server that does not answer until released."""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def write(self, traces):
+        self.release.wait()
+
+
+class TestBufferedTracker(unittest.TestCase):
+
+    def configure(self, sink, **kwargs):
+        target = patch.object(tracking, "tracker", tracking.BufferedTracker(sink, **kwargs))
+        tracker = target.start()
+        self.addCleanup(target.stop)
+        return tracker
+
+    def test_pipeline_stages_end_up_in_one_run(self):
+        sink = RecordingSink()
+        tracker = self.configure(sink, flush_seconds=0.01)
+        pipeline = RagPipeline(StubRetriever(), FakeListChatModel(responses=["Co-op is paid work."]),
+                               PromptTemplate.from_template("{context}\n{question}"))
+        with tracking.trace("RAG_Pipeline", description="test"):
+            tracking.log_param("query", "what is co-op?")
+            pipeline.invoke("what is co-op?")
+        self.assertTrue(tracker.flush(timeout=5))
+        [trace] = sink.traces
+        self.assertEqual(trace.run_name, "RAG_Pipeline")
+        self.assertEqual(trace.tags, {"description": "test"})
+        self.assertEqual(trace.params["query"], "what is co-op?")
+        self.assertEqual(trace.params["retrieved_docs_count"], "1")
+        self.assertIn("retrieval_time", trace.metrics)
+        self.assertIn("generation_time", trace.metrics)
+        self.assertIn("retrieved_docs.json", trace.artifacts)
+
+    def test_failed_block_is_recorded(self):
+        sink = RecordingSink()
+        tracker = self.configure(sink, flush_seconds=0.01)
+        with self.assertRaises(RuntimeError):
+            with tracking.trace("RAG_Pipeline"):
+                raise RuntimeError("llm timeout")
+        tracker.flush(timeout=5)
+        self.assertEqual(sink.traces[0].status, "FAILED")
+        self.assertEqual(sink.traces[0].params["error"], "llm timeout")
+
+    def test_traces_are_flushed_in_batches(self):
+        sink = RecordingSink()
+        tracker = self.configure(sink, batch_size=10, flush_seconds=0.5)
+        for i in range(25):
+            with tracking.trace("RAG_Pipeline"):
+                tracking.log_metric("i", i)
+        tracker.flush(timeout=5)
+        self.assertEqual(len(sink.traces), 25)
+        self.assertLessEqual(len(sink.batches), 4)
+
+    def test_slow_server_drops_instead_of_blocking(self):
+        sink = BlockedSink()
+        self.addCleanup(sink.release.set)
+        tracker = self.configure(sink, max_queue=5, batch_size=1, flush_seconds=0)
+        start = time.perf_counter()
+        for _ in range(50):
+            with tracking.trace("RAG_Pipeline"):
+                pass
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertGreater(tracker.dropped, 0)
+        self.assertLessEqual(tracker.submitted, 6)
+
+    def test_sample_rate(self):
+        sink = RecordingSink()
+        tracker = self.configure(sink, sample_rate=0.0)
+        with tracking.trace("RAG_Pipeline") as trace:
+            tracking.log_param("query", "not recorded")
+        self.assertIsNone(trace)
+        self.assertEqual(tracker.sampled_out, 1)
+        self.assertEqual(tracker.submitted, 0)
+
+    def test_no_tracker_is_a_no_op(self):
+        with patch.object(tracking, "tracker", None):
+            with tracking.trace("RAG_Pipeline") as trace:
+                tracking.log_metric("retrieval_time", 0.1)
+        self.assertIsNone(trace)
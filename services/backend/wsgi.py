@@ -1,6 +1,4 @@
-from main import create_app
-
-app = create_app()
+from main import app
 
 if __name__ == "__main__":
     app.run()
@@ -3,10 +3,88 @@ import requests
 import os
 from dotenv import load_dotenv
 import uuid
+from backend_client import BackendError, ask, create_session
 
 load_dotenv(override=True)
 
 API_URL = os.getenv('API_URL')
+# "true": answers are shown token by token as the backend's /stream route sends them
+STREAM_ANSWERS = os.getenv('STREAM_ANSWERS', 'true').lower() == 'true'
+# seconds to connect to the backend, and to wait for its answer (between two tokens when streaming)
+CONNECT_TIMEOUT = float(os.getenv('CONNECT_TIMEOUT', 5))
+READ_TIMEOUT = float(os.getenv('READ_TIMEOUT', 60))
+# keep-alive connections to the backend, shared by every browser session of this Streamlit server
+POOL_SIZE = int(os.getenv('POOL_SIZE', 10))
+# messages drawn on each rerun (0: all) and messages kept per browser session
+HISTORY_WINDOW = int(os.getenv('HISTORY_WINDOW', 20))
+HISTORY_LIMIT = int(os.getenv('HISTORY_LIMIT', 200))
+
+
+@st.cache_resource
+def backend_session():
+    """One pooled session per server process instead of a new connection per question."""
+    return create_session(pool_size=POOL_SIZE)
+
+
+def render_message(sender, message):
+    if sender == "user":
+        st.markdown(f"🧑‍💻 **You**: {message}")
+    else:
+        st.markdown(f"🤖 **NuBot**: {message}")
+
+
+def render_history(history):
+    """Draw the last HISTORY_WINDOW messages; a rerun costs the same however long the chat gets."""
+    window = history[-HISTORY_WINDOW:] if HISTORY_WINDOW else history
+    if len(history) > len(window):
+        st.caption(f"{len(history) - len(window)} earlier messages not shown")
+    for sender, message in window:
+        render_message(sender, message)
+
+
+def answer(query):
+    """Ask the backend, drawing the answer while it arrives; returns the reply to keep in the history."""
+    placeholder = st.empty()
+    reply = ""
+    try:
+        for piece in ask(backend_session(), API_URL, query, st.session_state.session_id,
+                         timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), stream=STREAM_ANSWERS):
+            reply += piece
+            placeholder.markdown(f"🤖 **NuBot**: {reply}▌")
+    except BackendError as e:
+        reply = f"Sorry, I encountered an error: {e}"
+        st.error(str(e))
+    # requests' JSON decode error is a RequestException as well, so this comes first
+    except ValueError as e:
+        reply = "Sorry, I received an invalid response format."
+        st.error(f"Failed to parse response: {str(e)}")
+    except requests.exceptions.RequestException as e:
+        error_msg = f"Request failed: {e}"
+        reply = f"Sorry, I encountered a connection error: {error_msg}"
+        st.error(error_msg)
+    placeholder.markdown(f"🤖 **NuBot**: {reply}")
+    return reply
+
+
+@st.fragment
+def chat():
+    """Input, history and answers; sending a question reruns only this part of the page."""
+    # Input field and send button
+    query = st.text_input("Type your message here")
+
+    if st.button("Send"):
+        if query:
+            # Store the user query immediately
+            st.session_state.chat_history.append(["user", query])
+            render_history(st.session_state.chat_history)
+            st.session_state.chat_history.append(["bot", answer(query)])
+            del st.session_state.chat_history[:-HISTORY_LIMIT]
+            return
+        st.warning("Please enter a query")
+
+    # Display chat history
+    render_history(st.session_state.chat_history)
+
 
 # Initialize session state for chat history
 if "session_id" not in st.session_state:
@@ -33,49 +111,4 @@ with col2:
     st.markdown("<h1 style='text-align: center;'>🤖 NuBot</h1>", unsafe_allow_html=True)
     st.markdown("<p style='text-align: center;'>Your assistant for all things Northeastern!</p>", unsafe_allow_html=True)
 
-    # Input field and send button
-    query = st.text_input("Type your message here")
-
-    if st.button("Send"):
-        if query:
-            try:
-                # Store the user query immediately
-                st.session_state.chat_history.append(["user", query])
-                
-                # Make API request
-                response = requests.post(API_URL, json={"query": query, "session_id": st.session_state.session_id})
-                if response.status_code == 200:
-                    # Try different possible formats for the response
-                    try:
-                        response_data = response.json()
-                        # Check if response is directly a string
-                        if isinstance(response_data, str):
-                            bot_reply = response_data
-                        # Check if response has a 'response' field
-                        elif isinstance(response_data, dict) and "response" in response_data:
-                            bot_reply = response_data["response"]
-                        # Just take the raw JSON as a fallback
-                        else:
-                            bot_reply = str(response_data)
-                    except Exception as e:
-                        bot_reply = "Sorry, I received an invalid response format."
-                        st.error(f"Failed to parse response: {str(e)}")
-                    
-                    st.session_state.chat_history.append(["bot", bot_reply])
-                else:
-                    error_msg = f"Error {response.status_code}: {response.text}"
-                    st.session_state.chat_history.append(["bot", f"Sorry, I encountered an error: {error_msg}"])
-                    st.error(error_msg)
-            except requests.exceptions.RequestException as e:
-                error_msg = f"Request failed: {e}"
-                st.session_state.chat_history.append(["bot", f"Sorry, I encountered a connection error: {error_msg}"])
-                st.error(error_msg)
-        else:
-            st.warning("Please enter a query")
-
-    # Display chat history
-    for sender, message in st.session_state.chat_history:
-        if sender == "user":
-            st.markdown(f"🧑‍💻 **You**: {message}")
-        else:
-            st.markdown(f"🤖 **NuBot**: {message}")
\ No newline at end of file
+    chat()
@@ -0,0 +1,91 @@
+# HTTP client for the NuBot backend, free of Streamlit so the app and the benchmarks share it.
+import json
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class BackendError(Exception):
+    """The backend answered with an error status or an error event."""
+
+
+def create_session(pool_size=10, retries=2):
+    """requests.Session that keeps up to pool_size connections to the backend alive.
+
+    Only failures to connect are retried: a question that reached the backend
+    may already be running there and is not sent twice.
+    """
+    session = requests.Session()
+    retry = Retry(total=retries, connect=retries, read=False, status=False, backoff_factor=0.2)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def stream_url(api_url):
+    """The backend's Server-Sent Events route next to the query route (.../NuBot/ -> .../NuBot/stream)."""
+    return api_url.rstrip("/") + "/stream"
+
+
+def reply_text(response_data):
+    """Answer text of a JSON reply: the string itself, its "response" field, or the raw JSON."""
+    if isinstance(response_data, str):
+        return response_data
+    if isinstance(response_data, dict) and "response" in response_data:
+        return response_data["response"]
+    return str(response_data)
+
+
+def iter_events(chunks):
+    """(event, data) pairs from the bytes of a text/event-stream body, as soon as each event is complete."""
+    buffer = b""
+    for chunk in chunks:
+        buffer += chunk.replace(b"\r\n", b"\n")
+        while b"\n\n" in buffer:
+            block, buffer = buffer.split(b"\n\n", 1)
+            event, data = "message", []
+            for line in block.decode("utf-8").split("\n"):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data.append(line[len("data:"):].strip())
+            if data:
+                yield event, json.loads("\n".join(data))
+
+
+def ask(session, api_url, query, session_id, timeout, stream=True):
+    """Yield the answer to query in pieces.
+
+    With stream, the question goes to the backend's stream route and the answer
+    arrives token by token; a backend without that route (404), or any JSON
+    reply, gives the whole answer as one piece. timeout is requests' (connect,
+    read) pair; the read part also bounds the wait between two tokens and is
+    sent as X-Request-Timeout so the backend gives up no later than we do.
+    Raises BackendError, ValueError for a reply that is not JSON, and
+    requests.RequestException when the backend cannot be reached.
+    """
+    body = {"query": query, "session_id": session_id}
+    headers = {"X-Request-Timeout": str(timeout[1])}
+    response = None
+    if stream:
+        response = session.post(stream_url(api_url), json=body, headers=headers, timeout=timeout, stream=True)
+        if response.status_code == 404:
+            response.close()
+            response = None
+    if response is None:
+        response = session.post(api_url, json=body, headers=headers, timeout=timeout)
+    with response:
+        if response.status_code != 200:
+            raise BackendError(f"Error {response.status_code}: {response.text}")
+        if not response.headers.get("Content-Type", "").startswith("text/event-stream"):
+            yield reply_text(response.json())
+            return
+        # chunk_size=None hands over each chunk as it arrives instead of waiting for a full buffer
+        for event, data in iter_events(response.iter_content(chunk_size=None)):
+            if event == "token":
+                yield data
+            elif event == "error":
+                raise BackendError(data.get("details") or data.get("error"))
+            elif event == "done":
+                return
@@ -0,0 +1,60 @@
+"""Time of one rerun of the chat page against the length of the chat history.
+
+Run from services/frontend:
+    python -m benchmarks.bench_render --lengths 10 100 500 2000 2>/dev/null
+
+(stderr only carries Streamlit's "missing ScriptRunContext" warnings, which
+AppTest logs for session_state set before a run.)
+
+app.py runs under Streamlit's AppTest, which executes the script and builds
+every element the browser would receive, with chat_history preset to the given
+number of messages (no backend call is made). Two setups:
+
+  full        HISTORY_WINDOW=0, every message drawn on every rerun (the old page)
+  windowed    the last --window messages drawn
+"""
+import argparse
+import os
+import statistics
+import time
+from streamlit.testing.v1 import AppTest
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "app.py")
+
+
+def history(length):
+    return [["user" if i % 2 == 0 else "bot", f"message {i} " + "about the Khoury course catalog " * 4]
+            for i in range(length)]
+
+
+def rerun_ms(length, window, runs):
+    """Median milliseconds of a rerun with length messages, and the number of markdown elements drawn."""
+    os.environ["HISTORY_WINDOW"] = str(window)
+    os.environ["HISTORY_LIMIT"] = str(max(length, 1))
+    app = AppTest.from_file(APP, default_timeout=60)
+    app.session_state["session_id"] = "bench"
+    app.session_state["started"] = True
+    app.session_state["chat_history"] = history(length)
+    # the first run also imports the script's modules
+    app.run()
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        app.run()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), len(app.markdown)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 50, 200, 1000])
+    parser.add_argument("--window", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'messages':>8} {'full ms':>9} {'elements':>9} {'windowed ms':>12} {'elements':>9} {'speedup':>8}")
+    for length in args.lengths:
+        full_ms, full_elements = rerun_ms(length, 0, args.runs)
+        windowed_ms, windowed_elements = rerun_ms(length, args.window, args.runs)
+        print(f"{length:>8} {full_ms:>9.1f} {full_elements:>9} {windowed_ms:>12.1f} {windowed_elements:>9} "
+              f"{full_ms / windowed_ms:>7.1f}x")